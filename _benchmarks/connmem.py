@@ -0,0 +1,31 @@
+# Small script to measure the memory taken by Connection objects (before synapses exist).
+# Usage: python connmem.py [n_connections] (requires NEURON and neurodamus mods loaded)
+# Compare the output of different neurodamus versions to get the per-connection savings.
+
+import sys
+import tracemalloc
+
+from neurodamus.connection_manager import ConnectionSet
+from neurodamus.utils.memory import get_mem_usage_kb
+
+
+def main(n_conns=1000000, conns_per_tgid=100):
+    pop = ConnectionSet(1, 0)
+    pop.get_or_create_connection(0, 0)  # Initialize hoc helpers outside the measurement
+
+    tracemalloc.start()
+    start_rss = get_mem_usage_kb()
+    for i in range(1, n_conns):
+        pop.get_or_create_connection(i % conns_per_tgid, i // conns_per_tgid)
+    rss_kb = get_mem_usage_kb() - start_rss
+    py_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    n_conns -= 1
+    print("Connections: %d" % n_conns)
+    print("Python allocated: %.1f bytes/connection" % (py_bytes / n_conns))
+    print("Process RSS:      %.1f bytes/connection" % (rss_kb * 1024 / n_conns))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
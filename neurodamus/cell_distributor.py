@@ -136,6 +136,7 @@ class CellManagerBase(_CellManager):
         self._local_nodes = None
         self._total_cells = 0   # total cells in target, being simulated
         self._gid2cell = {}
+        self._dynamics_params = None  # (sorted raw gids, {param name: values})
 
         self._global_seed = 0
         self._ionchannel_seed = 0
@@ -407,6 +408,43 @@ class CellManagerBase(_CellManager):
     def get_cellref(self, gid):
         return self._gid2cell[gid]._cellref
 
+    def _store_dynamics_params(self):
+        """Keeps the nodes dynamics params (threshold, holding current...) of the local cells
+        in arrays sorted by gid, so that they remain available in bulk after cell info is cleared
+        """
+        if not len(self._local_nodes):
+            return
+        gids, infos = zip(*self._local_nodes.items())
+        if any(info is None for info in infos):
+            return
+        params = {
+            "threshold_current": [info.threshold_current for info in infos],
+            "holding_current": [info.holding_current for info in infos],
+        }
+        if all("input_resistance" in info.extra_attrs for info in infos):
+            params["input_resistance"] = [info.extra_attrs["input_resistance"] for info in infos]
+        gids = numpy.array(gids, dtype="int64")
+        order = numpy.argsort(gids, kind="stable")
+        self._dynamics_params = (gids[order], {name: numpy.array(values, dtype=float)[order]
+                                               for name, values in params.items()})
+
+    def get_dynamics_params(self, name, gids):
+        """Bulk lookup of a nodes dynamics param for the given (final) local gids
+
+        Returns: A numpy array of values, or None when the param is not available
+        """
+        if self._dynamics_params is None:
+            return None
+        sorted_gids, params = self._dynamics_params
+        values = params.get(name)
+        if values is None:
+            return None
+        raw_gids = numpy.asarray(gids, dtype="int64") - self._local_nodes.offset
+        idx = numpy.searchsorted(sorted_gids, raw_gids)
+        if (idx >= len(sorted_gids)).any() or (sorted_gids[idx] != raw_gids).any():
+            return None  # not all cells are local
+        return values[idx]
+
     def record_spikes(self, gids=None, append_spike_vecs=None):
         """Setup recording of spike events (crossing of threshold) for cells on this node
         """
@@ -479,6 +517,23 @@ class GlobalCellManager(_CellManager):
         manager = self._find_manager(gid)
         return manager.get_cell(gid)
 
+    def get_dynamics_params(self, name, gids):
+        """Bulk lookup of a nodes dynamics param, dispatching gids to their cell managers
+
+        Returns: A numpy array of values, or None when the param is not available for all gids
+        """
+        gids = numpy.asarray(gids, dtype="int64")
+        offsets = [manager.local_nodes.offset for manager in self._cell_managers]
+        manager_idx = numpy.maximum(numpy.searchsorted(offsets, gids, side="right") - 1, 0)
+        values = numpy.empty(len(gids), dtype=float)
+        for i in numpy.unique(manager_idx):
+            mask = manager_idx == i
+            manager_values = self._cell_managers[i].get_dynamics_params(name, gids[mask])
+            if manager_values is None:
+                return None
+            values[mask] = manager_values
+        return values
+
     def get_cellref(self, gid):
         """Retrieve a cell object given its gid.
         Note that this function handles multisplit cases incl converting to an
@@ -583,6 +638,8 @@ class CellDistributor(CellManagerBase):
                     CellType.morpho_extension, conf.MorphologyPath)
         if dry_run_stats_obj is None:
             super()._instantiate_cells(CellType, **opts)
+            if CellType is Cell_V6:
+                self._store_dynamics_params()
         else:
             cur_metypes_mem = dry_run_stats_obj.metype_memory
             memory_dict = self._instantiate_cells_dry(CellType, cur_metypes_mem, **opts)
@@ -872,6 +929,19 @@ class LoadBalance:
                 if children_count > 0:
                     fp.write("\n")
 
+    @classmethod
+    def load_cell_complexities(cls, nodes_path, target_str):
+        """Reads the cell complexities of a previous load balance of a target, if existing
+
+        Returns: A dict gid -> complexity, or None if there's no complexity file
+        """
+        cx_filename = cls._loadbal_dir(nodes_path) / (cls._cx_filename_tpl % target_str)
+        if not cx_filename.is_file():
+            return None
+        with open(cx_filename, "r") as f:
+            cx_saved = cls._read_msdat(f)
+        return {gid: float(lines[0].split()[1]) for gid, lines in cx_saved.items()}
+
     @staticmethod
     def _read_msdat(fp):
         """read load balancing info from an input stream
@@ -55,6 +55,30 @@ def neurodamus(args=None):
         --enable-shm=[ON, OFF]  Enables the use of /dev/shm for coreneuron_input [default: ON]
         --model-stats           Show model stats in CoreNEURON simulations [default: False]
         --dry-run               Dry-run simulation to estimate memory usage [default: False]
+        --nodesets-cache        Persist materialized node sets in <OutputRoot>/nodesets_cache
+                                for reuse in later runs [default: False]
+        --parallel-spikes       Write Sonata spikes with h5py, each rank writing its own part of
+                                the file, instead of gathering them [default: False]
+        --trace-timers          Record the timers of all ranks as nested spans, written as a
+                                Chrome trace to <OutputRoot>/timeit_trace.json [default: False]
+        --memory-profile        Record the memory usage of every stage in all ranks, written as a
+                                report to <OutputRoot>/memory_profile.json. The Python heap is
+                                traced with tracemalloc, which slows down Python allocations
+                                (model building) and adds some memory per object [default: False]
+        --dry-run-cache=<PATH>  Dry-run: Keep the measured cell and synapse statistics in a cache
+                                dir, so that later dry runs only measure what is new
+        --model-cache=<PATH>    Keep CoreNEURON datasets in a cache dir, keyed by a fingerprint of
+                                the model, so that identical models are not built again
+        --model-cache-no-dir-scan
+                                Model cache: Don't scan the files in the emodel templates dir
+                                for the fingerprint, which only includes its path [default: False]
+        --cleanup-mode=[sync, parallel, background]
+                                How to delete the CoreNEURON data at the end [default: sync]
+                                - sync: rank 0 deletes the data while the others wait
+                                - parallel: the data is moved to a trash dir and all ranks delete
+                                    a subset of the files
+                                - background: the data is moved to a trash dir and deleted by a
+                                    detached process, not waited for
     """
     options = docopt_sanitize(docopt(neurodamus.__doc__, args))
     config_file = options.pop("ConfigFile")
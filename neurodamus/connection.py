@@ -45,8 +45,10 @@ class ConnectionBase:
     """
     __slots__ = ("sgid", "tgid", "locked", "_disabled", "_synapse_params",
                  "_netcons", "_synapses", "_delay_vec", "_delayweight_vec",
-                 "weight_factor", "syndelay_override", "_syn_offset",
-                 "_src_pop_id", "_dst_pop_id")
+                 "weight_factor", "syndelay_override", "_syn_offset", "_pop_ids")
+
+    _pop_ids_cache = {}
+    """Shared (src, dst) population id pairs, so that connections don't hold one each"""
 
     def __init__(self,
                  sgid, tgid,
@@ -72,20 +74,20 @@ class ConnectionBase:
         self.locked = False
         self._disabled = False
         self._syn_offset = synapses_offset
-        self._src_pop_id = src_pop_id
-        self._dst_pop_id = dst_pop_id
+        pop_ids = (src_pop_id, dst_pop_id)
+        self._pop_ids = self._pop_ids_cache.setdefault(pop_ids, pop_ids)
         self._synapse_params = None
         # Initialized in specific routines
         self._netcons = None
         self._synapses = ()
-        self._delay_vec = Nd.Vector()
-        self._delayweight_vec = Nd.Vector()
+        # Rarely used. Allocated on first delayed weight
+        self._delay_vec = None
+        self._delayweight_vec = None
 
     synapse_params = property(lambda self: self._synapse_params)
     synapses = property(lambda self: self._synapses)
     synapses_offset = property(lambda self: self._syn_offset)
-    population_id = property(lambda self: (self._src_pop_id,
-                                           self._dst_pop_id))
+    population_id = property(lambda self: self._pop_ids)
 
     # Subclasses must implement instantiation of their connections in the simulator
     def finalize(self, cell, base_seed=0, *args, **kw):
@@ -120,6 +122,9 @@ class ConnectionBase:
            delay: the delay time for the new weight
            weight: the weight to adjust to at this time
         """
+        if self._delay_vec is None:
+            self._delay_vec = Nd.Vector()
+            self._delayweight_vec = Nd.Vector()
         self._delay_vec.append(delay)
         self._delayweight_vec.append(weight)
 
@@ -196,6 +201,47 @@ class Connection(ConnectionBase):
         cls.ConnUtils = h.ConnectionUtils()
         cls._pc = Nd.pc
 
+    @classmethod
+    def measure_synapse_memory(cls, helper_name, with_minis=False, n_synapses=1000):
+        """Measures the average memory (KB) taken by a synapse of the given helper (dry-run)
+
+        Synapses are instantiated on a test section with the respective NetCon and, optionally,
+        spont minis (InhPoissonStim and NetCon), i.e. what finalize creates for a synapse.
+        """
+        from .io.synapse_reader import SynapseParameters
+        from .utils.memory import get_mem_usage_kb
+        cls._init_hmod()
+        if helper_name in ("AMPANMDAHelper", "GABAABHelper"):
+            add_params = (0, 0)
+        else:
+            mod_override = helper_name[:-len("Helper")]
+            add_params = (0, 0, compat.Map({"ModOverride": mod_override}).hoc_map)
+        helper_cls = getattr(Nd.require(helper_name), helper_name)
+
+        params = SynapseParameters.create_array(n_synapses)
+        params.synType = 0 if helper_name == "GABAABHelper" else 100
+        params.weight = 1.0
+        params.U, params.D, params.F, params.DTC = 0.5, 600, 20, 1.7
+        params.delay = 1.0
+        params.nrrp = 1
+        params.u_hill_coefficient = 1.0
+        sec = Nd.h.Section(name="dry_run_synapses")
+        tbins_vec, rate_vec = Nd.Vector(1, 0.0), Nd.Vector(1, 0.01)
+
+        start_memory = get_mem_usage_kb()
+        objects = []
+        with Nd.section_in_stack(sec):
+            for syn_i in range(n_synapses):
+                syn_helper = helper_cls(0, params[syn_i], 0.5, syn_i, 0, *add_params)
+                objects += (syn_helper, Nd.NetCon(None, syn_helper.synapse))
+                if with_minis:
+                    ips = Nd.InhPoissonStim(0.5, sec=sec)
+                    ips.setTbins(tbins_vec)
+                    ips.setRate(rate_vec)
+                    objects += (ips, Nd.NetCon(ips, syn_helper.synapse, sec=sec))
+        memory_per_synapse = max(0, (get_mem_usage_kb() - start_memory) / n_synapses)
+        return memory_per_synapse
+
     # -
     def __init__(self,
                  sgid, tgid, src_pop_id=0, dst_pop_id=0,
@@ -222,7 +268,7 @@ class Connection(ConnectionBase):
         self._synapse_sections = []
         self._synapse_points_x = compat.array("d")
         self._synapse_ids = compat.array("i")  # replaced by np.array for bulk add syn
-        self._configurations = [configuration] if configuration is not None else []
+        self._configurations = [configuration] if configuration is not None else ()
         self._conductances_bk = None  # Store for re-enabling
         # Artificial stimulus sources
         self._spont_minis = None
@@ -234,6 +280,8 @@ class Connection(ConnectionBase):
         All commands are executed on synapse creation
         """
         if configuration is not None:
+            if not self._configurations:
+                self._configurations = []  # Shared empty tuple until first configuration
             self._configurations.append(configuration)
 
     def override_mod(self, mod_override):
@@ -333,10 +381,21 @@ class Connection(ConnectionBase):
             tvec: time for spike events from the sgid
             start_delay: When the events may start to be delivered
         """
+        return self.add_replay_vector(Nd.Vector(tvec[tvec >= start_delay]))
+
+    def add_replay_vector(self, hoc_tvec):
+        """ Replay the spikes of a hoc time Vector on the synapses of this connection.
+
+        The Vector may be shared among all the connections of the same source gid, therefore
+        it must not be modified other than sorting.
+
+        Args:
+            hoc_tvec: A hoc Vector with the spike times from the sgid
+        """
         assert self._netcons is None, "Replay must be setup prior to finalize()"
-        hoc_tvec = Nd.Vector(tvec[tvec >= start_delay])
         logging.debug("Replaying %d spikes on %d - %d", hoc_tvec.size(), self.sgid, self.tgid)
-        logging.debug(" > First replay event for connection at %f", hoc_tvec.x[0])
+        if hoc_tvec.size():
+            logging.debug(" > First replay event for connection at %f", hoc_tvec.x[0])
 
         if self._replay is None:
             self._replay = ReplayStim()
@@ -366,6 +425,7 @@ class Connection(ConnectionBase):
         self._netcons = []
         self._init_artificial_stims(cell, replay_mode)
         n_syns = 0
+        minis_synapses = []  # Minis are created in batch, once all synapses exist
         for syn_i, sec in self.sections_with_synapses:
             x = self._synapse_points_x[syn_i]
             syn_params = self._synapse_params[syn_i]
@@ -382,7 +442,7 @@ class Connection(ConnectionBase):
                 self._attach_source_cell(syn_obj, syn_params)
 
             if self._spont_minis is not None:
-                self._spont_minis.create_on(self, sec, x, syn_obj, syn_params, base_seed)
+                minis_synapses.append((sec, x, syn_obj, syn_params))
 
             if self._replay is not None:
                 self._replay.create_on(self, sec, syn_obj, syn_params)
@@ -399,6 +459,9 @@ class Connection(ConnectionBase):
 
                 syn_obj.setup_delay_vecs(self._delay_vec, self._delayweight_vec)
 
+        if minis_synapses:
+            self._spont_minis.create_on_synapses(self, minis_synapses, base_seed)
+
         # Apply configurations to the synapses
         # Set global options in mod overrides
         for mod_override in self._mod_overrides:
@@ -410,6 +473,17 @@ class Connection(ConnectionBase):
         self._configure_synapses()
         return n_syns
 
+    def release_synapse_params(self):
+        """Drops the Python-side synapse parameters and locations, once instantiated.
+
+        Synapses, netcons, replay and minis are kept, as well as the configurations, so that
+        they can still be updated. However the connection can no longer be (re)finalized.
+        """
+        self._synapse_params = None
+        self._synapse_sections = []
+        self._synapse_points_x = compat.array("d")
+        self._synapse_ids = compat.array("i")
+
     def _init_artificial_stims(self, cell, replay_mode=ReplayMode.AS_REQUIRED):
         shall_create_replay = (
             replay_mode == ReplayMode.COMPLETE or
@@ -430,7 +504,7 @@ class Connection(ConnectionBase):
             self._spont_minis = None
 
         # Delayed vecs: release if not used, sort if over 1 value
-        total_delays = self._delay_vec.size()
+        total_delays = self._delay_vec.size() if self._delay_vec is not None else 0
         if total_delays == 0:
             self._delay_vec = None
             self._delayweight_vec = None
@@ -474,10 +548,10 @@ class Connection(ConnectionBase):
             self._mod_overrides.add(mod_override)
             override_helper = mod_override + "Helper"
             helper_cls = getattr(Nd.h, override_helper)
-            add_params = (self._src_pop_id, self._dst_pop_id, self._mod_override)
+            add_params = (*self._pop_ids, self._mod_override)
         else:
             helper_cls = self._GABAAB_Helper if is_inh else self._AMPANMDA_Helper
-            add_params = (self._src_pop_id, self._dst_pop_id)
+            add_params = self._pop_ids
 
         syn_helper = helper_cls(self.tgid, params_obj, x, syn_id, base_seed, *add_params)
 
@@ -648,21 +722,35 @@ class ArtificialStim:
 class SpontMinis(ArtificialStim):
     """A class creating/holding spont minis of a connection
     """
-    __slots__ = ("_rng_info", "_keep_alive", "rate_vec")
+    __slots__ = ("_keep_alive", "rate_vec")
 
     tbins_vec = None
     """Neurodamus uses a constant rate, so tbin is always containing only 0
     """  # Nd.Vector must be called later to avoid init Neuron on import
 
+    _rng_info = None
+    """The RNGSettings object. Initialized on first use"""
+
+    _shared_rate_vecs = {}
+    """Rate vectors, shared among all minis with the same rate"""
+
     @classmethod
     def _cls_init(cls):
         cls.tbins_vec = Nd.Vector(1)
         cls.tbins_vec.x[0] = 0.0
+        cls._rng_info = Nd.RNGSettings()
+
+    @classmethod
+    def shared_rate_vec(cls, rate):
+        """Get the (shared) rate vector for a given rate. It must not be modified"""
+        rate_vec = cls._shared_rate_vecs.get(rate)
+        if rate_vec is None:
+            rate_vec = cls._shared_rate_vecs[rate] = Nd.Vector(1, rate)
+        return rate_vec
 
     def __init__(self, minis_spont_rate):
         super().__init__()
         self.tbins_vec or self._cls_init()
-        self._rng_info = Nd.RNGSettings()
         self._keep_alive = []
         self.rate_vec = None
 
@@ -676,70 +764,95 @@ class SpontMinis(ArtificialStim):
         if rate < 0:
             raise ValueError("Spont minis rate cannot be negative %g" % rate)
 
-        # Check if initialized. Dont recreate in order to enable in-simulation udates
-        if self.rate_vec is None:
-            self.rate_vec = Nd.Vector(1)
-        self.rate_vec.x[0] = rate
+        if self.rate_vec is None or not self.netstims:
+            self.rate_vec = self.shared_rate_vec(rate)
+        elif self.rate_vec is self._shared_rate_vecs.get(self.rate_vec[0]):
+            # In-simulation update. Stims get their own vector, not to change other minis
+            self.rate_vec = Nd.Vector(1, rate)
+            self._update_stims_rate(self.rate_vec)
+        else:
+            self.rate_vec.x[0] = rate
 
     rate = property(get_rate, set_rate)
 
+    def _update_stims_rate(self, rate_vec):
+        for ips in self.netstims:
+            ips.setRate(rate_vec)
+
     def has_data(self):
         return self.rate_vec is not None
 
-    def create_on(self, conn, sec, position, syn_obj, syn_params, base_seed, _rate_vec=None):
+    def create_on(self, conn, sec, position, syn_obj, syn_params, base_seed):
         """Inserts a SpontMini stim into the given synapse
         """
-        rate_vec = _rate_vec or self.rate_vec  # allow override (private API)
-        if GlobalConfig.debug_conn in ([conn.tgid], [conn.sgid, conn.tgid]):
-            log_all(logging.DEBUG, "Creating Spont Minis on %d-%d, Rate: %f",
-                    conn.sgid, conn.tgid, rate_vec[0])
+        self.create_on_synapses(conn, [(sec, position, syn_obj, syn_params)], base_seed)
 
-        ips = Nd.InhPoissonStim(position, sec=sec)
-        ips.setTbins(self.tbins_vec)
-        ips.setRate(rate_vec)
+    def create_on_synapses(self, conn, synapses, base_seed, _rate_vecs=None):
+        """Inserts SpontMini stims into several synapses of a connection.
+
+        RNG settings are read once and the seeds of all synapses computed together.
+
+        Args:
+            conn: The connection the synapses belong to
+            synapses: A list of tuples (section, position, syn_obj, syn_params)
+            base_seed: base seed to adjust the RNGs
+            _rate_vecs: (Private API) The rate vector for each synapse [default: self.rate_vec]
+        """
+        rate_vecs = _rate_vecs or [self.rate_vec] * len(synapses)
+        log_debug = GlobalConfig.debug_conn in ([conn.tgid], [conn.sgid, conn.tgid])
         # In Neuron we can limit the duration of the Minis since InhPoissonStim's are
         # recreated on restore. CoreNeuron reuses them and we dont know final duration
-        if SimConfig.use_neuron:
-            ips.duration = Nd.tstop
-
-        # A simple NetCon will do, as the synapse and cell are local.
-        netcon = Nd.NetCon(ips, syn_obj, sec=sec)
-        netcon.delay = 0.1
-        netcon.weight[0] = syn_params.weight * conn.weight_factor
-        conn.netcon_set_type(netcon, syn_obj, NetConType.NC_SPONTMINI)
-        self._store(ips, netcon)
+        duration = Nd.tstop if SimConfig.use_neuron else None
 
+        rng_info = self._rng_info
+        rng_mode = rng_info.getRNGMode()
+        rng_seed = rng_info.getMinisSeed()
         src_pop_id, dst_pop_id = conn.population_id
-        rng_mode = self._rng_info.getRNGMode()
-        rng_seed = self._rng_info.getMinisSeed()
         tgid_seed = conn.tgid + 250
+        syn_ids = numpy.array([syn_obj.synapseID for _, _, syn_obj, _ in synapses])
 
-        if rng_mode == self._rng_info.RANDOM123:
+        if rng_mode == rng_info.RANDOM123:
             seed2 = (src_pop_id * 65536 + dst_pop_id + rng_seed)
-            ips.setRNGs(syn_obj.synapseID + 200, tgid_seed, seed2 + 300,
-                        syn_obj.synapseID + 200, tgid_seed, seed2 + 350)
+            rng_ids = (syn_ids + 200).tolist()
         else:
-            seed2 = src_pop_id * 16777216
-            exprng = Nd.Random()
-            if rng_mode == self._rng_info.COMPATIBILITY:
-                exprng.MCellRan4(syn_obj.synapseID * 100000 + 200,
-                                 tgid_seed + base_seed + rng_seed)
-            else:  # if ( rngIndo.getRNGMode()== rng_info.UPMCELLRAN4 ):
-                exprng.MCellRan4(syn_obj.synapseID * 1000 + 200,
-                                 seed2 + tgid_seed + base_seed + rng_seed)
-
-            exprng.negexp(1)
-            uniformrng = Nd.Random()
-            if rng_mode == self._rng_info.COMPATIBILITY:
-                uniformrng.MCellRan4(syn_obj.synapseID * 100000 + 300,
-                                     tgid_seed + base_seed + rng_seed)
+            high_index = tgid_seed + base_seed + rng_seed
+            if rng_mode == rng_info.COMPATIBILITY:
+                exp_low_index = syn_ids * 100000 + 200
             else:  # if ( rngIndo.getRNGMode()== rng_info.UPMCELLRAN4 ):
-                uniformrng.MCellRan4(syn_obj.synapseID * 1000 + 300,
-                                     seed2 + tgid_seed + base_seed + rng_seed)
-
-            uniformrng.uniform(0.0, 1.0)
-            ips.setRNGs(exprng, uniformrng)
-            self._keep_alive += (exprng, uniformrng)
+                exp_low_index = syn_ids * 1000 + 200
+                high_index += src_pop_id * 16777216
+            rng_ids = zip(exp_low_index.tolist(), (exp_low_index + 100).tolist())
+
+        for (sec, position, syn_obj, syn_params), rate_vec, rng_id in zip(synapses, rate_vecs,
+                                                                           rng_ids):
+            if log_debug:
+                log_all(logging.DEBUG, "Creating Spont Minis on %d-%d, Rate: %f",
+                        conn.sgid, conn.tgid, rate_vec[0])
+
+            ips = Nd.InhPoissonStim(position, sec=sec)
+            ips.setTbins(self.tbins_vec)
+            ips.setRate(rate_vec)
+            if duration is not None:
+                ips.duration = duration
+
+            # A simple NetCon will do, as the synapse and cell are local.
+            netcon = Nd.NetCon(ips, syn_obj, sec=sec)
+            netcon.delay = 0.1
+            netcon.weight[0] = syn_params.weight * conn.weight_factor
+            conn.netcon_set_type(netcon, syn_obj, NetConType.NC_SPONTMINI)
+            self._store(ips, netcon)
+
+            if rng_mode == rng_info.RANDOM123:
+                ips.setRNGs(rng_id, tgid_seed, seed2 + 300, rng_id, tgid_seed, seed2 + 350)
+            else:
+                exprng = Nd.Random()
+                exprng.MCellRan4(rng_id[0], high_index)
+                exprng.negexp(1)
+                uniformrng = Nd.Random()
+                uniformrng.MCellRan4(rng_id[1], high_index)
+                uniformrng.uniform(0.0, 1.0)
+                ips.setRNGs(exprng, uniformrng)
+                self._keep_alive += (exprng, uniformrng)
 
     def __bool__(self):
         """object is considered False in case rate is not positive"""
@@ -753,22 +866,30 @@ class SpontMinis(ArtificialStim):
 class InhExcSpontMinis(SpontMinis):
     """Extends SpontMinis to handle two spont rates: Inhibitory & Excitatory
     """
+    __slots__ = ("rate_vec_exc", "_exc_stims")
 
     rate_vec_inh = property(lambda self: self.rate_vec)
     """The inhibitory spont rate vector (alias to base class .rate_vec)"""
 
     def __init__(self, spont_rate_inh, spont_rate_exc):
         super().__init__(spont_rate_inh or None)  # positive rate, otherwise None
-        self.rate_vec_exc = None
-        if spont_rate_exc:
-            self.rate_vec_exc = Nd.Vector(1)
-            self.rate_vec_exc.x[0] = spont_rate_exc
-
-    def create_on(self, conn, sec, position, syn_obj, syn_params, *args):
-        rate_vec = self.rate_vec if syn_params.synType < 100 else self.rate_vec_exc
-        if rate_vec:
-            # there's a spont rate for this kind of synapse
-            super().create_on(conn, sec, position, syn_obj, syn_params, *args, _rate_vec=rate_vec)
+        self.rate_vec_exc = self.shared_rate_vec(spont_rate_exc) if spont_rate_exc else None
+        self._exc_stims = bytearray()  # Whether each stim is excitatory, for rate updates
+
+    def create_on_synapses(self, conn, synapses, base_seed):
+        rate_vecs = [self.rate_vec if syn_params.synType < 100 else self.rate_vec_exc
+                     for _, _, _, syn_params in synapses]
+        # Only synapses for which there's a spont rate
+        selected = [i for i, rate_vec in enumerate(rate_vecs) if rate_vec is not None]
+        if selected:
+            super().create_on_synapses(conn, [synapses[i] for i in selected], base_seed,
+                                       _rate_vecs=[rate_vecs[i] for i in selected])
+            self._exc_stims.extend(synapses[i][3].synType >= 100 for i in selected)
+
+    def _update_stims_rate(self, rate_vec):
+        for ips, is_exc in zip(self.netstims, self._exc_stims):
+            if not is_exc:
+                ips.setRate(rate_vec)
 
     def has_data(self):
         return self.rate_vec is not None or self.rate_vec_exc is not None
@@ -810,12 +931,13 @@ class ReplayStim(ArtificialStim):
         return nc
 
     def add_spikes(self, hoc_tvec):
-        """Appends replay spikes from a time vector to the main replay vector
+        """Appends replay spikes from a time vector to the main replay vector.
+        Vectors may be shared among connections, so we copy before appending
         """
         if self.time_vec is None:
             self.time_vec = hoc_tvec
         else:
-            self.time_vec.append(hoc_tvec)
+            self.time_vec = self.time_vec.c().append(hoc_tvec)
         self.time_vec.sort()
 
     def has_data(self):
@@ -19,7 +19,7 @@ from .io.synapse_reader import SynapseReader
 from .target_manager import TargetManager, TargetSpec
 from .utils import compat, bin_search, dict_filter_map
 from .utils.logging import VERBOSE_LOGLEVEL, log_verbose, log_all
-from .utils.memory import DryRunStats
+from .utils.memory import DryRunStats, MemoryProfiler
 from .utils.timeit import timeit
 from .utils.pyutils import gen_ranges
 
@@ -236,6 +236,17 @@ class ConnectionManagerBase(object):
     CONNECTIONS_TYPE = None
     """The type of connections subclasses handle"""
 
+    MEMORY_SAMPLE_INTERVAL = 10000
+    """Record memory usage (if profiling) every such number of finalized tgids"""
+
+    requires_finalized_params = False
+    """Whether finalizing requires the synapse params of (other) already finalized connections
+    (e.g. to attach to existing synapses), in which case these can't be released"""
+
+    release_params_on_finalize = False
+    """Drop the synapse params of each tgid connections right after instantiating them.
+    Meant for CoreNEURON, where these are not required once the model is built"""
+
     # Set depending Classes, customizable
     ConnectionSet = ConnectionSet
     SynapseReader = SynapseReader
@@ -278,6 +289,7 @@ class ConnectionManagerBase(object):
         # An internal var to enable collection of synapse statistics to a Counter
         self._dry_run_stats: DryRunStats = kw.get("dry_run_stats")
         self._dry_run_counted_cells = set()
+        self._dry_run_gid_counts = None  # synapse counts per gid, shared with the dry-run cache
 
     def __str__(self):
         return "<{:s} | {:s} -> {:s}>".format(
@@ -312,6 +324,9 @@ class ConnectionManagerBase(object):
                 n_files = 1
 
         self._synapse_reader = self._open_synapse_file(synapse_file, edge_population, n_files)
+        if self._dry_run_stats is not None:
+            self._dry_run_gid_counts = self._dry_run_stats.synapse_gid_counts(synapse_file,
+                                                                              edge_population)
         if self._load_offsets:
             if not self._synapse_reader.has_property("synapse_index"):
                 raise Exception("Synapse offsets required but not available. "
@@ -411,6 +426,18 @@ class ConnectionManagerBase(object):
         return chain.from_iterable(
             pop.all_connections() for pop in self._populations.values())
 
+    def get_source_gids(self, raw_gids=True):
+        """The sorted unique source gids of all the local connections
+
+        Args:
+            raw_gids: Whether to return raw gids, i.e. without the source population offset
+        """
+        sgids = numpy.fromiter((conn.sgid for conn in self.all_connections()), dtype="int64")
+        sgids = numpy.unique(sgids)
+        if raw_gids:
+            sgids -= self.src_pop_offset
+        return sgids.astype("uint32")
+
     @property
     def connection_count(self):
         return self._total_connections
@@ -537,7 +564,7 @@ class ConnectionManagerBase(object):
         if SimConfig.dry_run:
             counts = self._get_conn_stats(self._src_target_filter, None)
             log_all(VERBOSE_LOGLEVEL, "[Rank %d] Synapse count: %d", MPI.rank, sum(counts.values()))
-            self._dry_run_stats.synapse_counts += counts
+            self._dry_run_stats.add_synapse_counts(counts)
             return
 
         conn_options = {'weight_factor': weight_factor}
@@ -579,7 +606,7 @@ class ConnectionManagerBase(object):
             counts = self._get_conn_stats(src_target, dst_target)
             count_sum = sum(counts.values())
             log_all(VERBOSE_LOGLEVEL, "%s -> %s: %d", pop.src_name, conn_destination, count_sum)
-            self._dry_run_stats.synapse_counts += counts
+            self._dry_run_stats.add_synapse_counts(counts, mod_override)
             return
 
         for sgid, tgid, syns_params, extra_params, offset in \
@@ -728,6 +755,7 @@ class ConnectionManagerBase(object):
         Note:
           - _src target is not considered so we count all inbound synapses
           -  We will only consider gids which have not been accounted for yet.
+          - Samples prefer cells counted before (possibly by a previous dry run, as cached)
         """
         BLOCK_BASE_SIZE = 5000
         SAMPLES_PER_BLOCK = 100
@@ -767,11 +795,13 @@ class ConnectionManagerBase(object):
             for start, stop, in gen_ranges(me_gids_count, BLOCK_BASE_SIZE, block_increase_rate=1.1):
                 logging.debug("Processing range %d:%d", start, stop)
                 block_len = stop - start
-                sample = me_gids[start:(start + SAMPLES_PER_BLOCK)]
+                sample = self._dry_run_sample(me_gids[start:stop], SAMPLES_PER_BLOCK)
                 sample_len = len(sample)
                 if not sample_len:
                     continue
-                sample_counts = self._synapse_reader.get_counts(sample, group_by="syn_type_id")
+                sample_counts = Counter()
+                for gid in sample.tolist():
+                    sample_counts.update(self._dry_run_gid_counts[gid])
                 logging.debug("Gids: %s... Types: %s", sample[:10], sample_counts)
                 logging.debug("Average syn/cell: %.2f", sum(sample_counts.values()) / sample_len)
                 sampled_gids_count += sample_len
@@ -787,9 +817,22 @@ class ConnectionManagerBase(object):
             log_all(VERBOSE_LOGLEVEL, "%s: Average syns/cell: %.1f, Estimated total: %d ",
                     metype, me_estimated_sum / me_gids_count, me_estimated_sum)
             local_counter.update(metype_estimate)
+            self._dry_run_stats.metype_synapse_counts[metype] += me_estimated_sum
 
         return local_counter
 
+    def _dry_run_sample(self, gids, sample_size):
+        """Selects a sample of the gids, preferring those whose counts are known already.
+        The synapse counts of the remaining sampled gids are read and stored.
+        """
+        gid_counts = self._dry_run_gid_counts
+        is_known = numpy.fromiter((gid in gid_counts for gid in gids.tolist()), bool, len(gids))
+        known = gids[is_known][:sample_size]
+        new_gids = gids[~is_known][:sample_size - len(known)]
+        if len(new_gids):
+            gid_counts.update(self._synapse_reader.get_counts_per_node(new_gids, "syn_type_id"))
+        return numpy.concatenate((known, new_gids))
+
     # -
     def get_target_connections(self, src_target_name,
                                      dst_target_name,
@@ -1069,9 +1112,17 @@ class ConnectionManagerBase(object):
             logging.info(" * Connections among %s -> %s, attach src: %s",
                          pop.src_name or "(base)", pop.dst_name or "(base)", attach_src)
 
-            for tgid, conns in ProgressBar.iter(pop.items(), name="Pop:" + str(popid)):
+            stage_name = "Finalize {} {}".format(_conn_type, popid)
+            for i, (tgid, conns) in enumerate(ProgressBar.iter(pop.items(),
+                                                               name="Pop:" + str(popid))):
                 n_created_conns += self._finalize_conns(
                     tgid, conns, base_seed, sim_corenrn, **conn_params)
+                if self.release_params_on_finalize:
+                    for conn in conns:
+                        conn.release_synapse_params()
+                if i % self.MEMORY_SAMPLE_INTERVAL == 0:
+                    MemoryProfiler.record(stage_name)
+            MemoryProfiler.record(stage_name)
 
         all_ranks_total = MPI.allreduce(n_created_conns, MPI.SUM)
         logging.info(" => Created %d %s", all_ranks_total, _conn_type)
@@ -1265,13 +1316,35 @@ class SynapseRuleManager(ConnectionManagerBase):
             log_verbose("Restore: Delivering events only after t=%.4f", start_delay)
 
         src_pop_offset = self.src_pop_offset
-
-        for conn in self.get_target_connections(src_target_name, dst_target_name):
-            raw_sgid = conn.sgid - src_pop_offset
-            if raw_sgid not in spike_manager:
-                continue
-            conn.replay(spike_manager[raw_sgid], start_delay)
-            replayed_count += 1
+        conns = list(self.get_target_connections(src_target_name, dst_target_name))
+        spike_map = spike_manager.get_map()
+        spike_gids = spike_map.keys()
+
+        if conns and len(spike_gids):
+            # Match all connections sgids against the spike map keys in a single search
+            raw_sgids = numpy.fromiter((conn.sgid for conn in conns), "int64", len(conns))
+            raw_sgids -= src_pop_offset
+            key_idxs = numpy.searchsorted(spike_gids, raw_sgids)
+            key_idxs[key_idxs == len(spike_gids)] = 0  # arbitrarily change to valid pos
+            has_spikes = spike_gids[key_idxs] == raw_sgids
+
+            # Connections from the same sgid share a single (read-only) time Vector
+            conn_idxs = has_spikes.nonzero()[0]
+            uniq_keys, vec_idxs = numpy.unique(key_idxs[conn_idxs], return_inverse=True)
+            shared_tvecs = []
+            for key_i in uniq_keys:
+                tvec = spike_map.get_index(key_i)
+                tvec = numpy.sort(tvec[tvec >= start_delay])
+                shared_tvecs.append(Nd.Vector(tvec) if tvec.size else None)
+
+            for conn_i, vec_i in zip(conn_idxs, vec_idxs):
+                hoc_tvec = shared_tvecs[vec_i]
+                if hoc_tvec is None:
+                    continue  # No events left after start_delay
+                conns[conn_i].add_replay_vector(hoc_tvec)
+                replayed_count += 1
+            log_verbose("Replay: %d time vectors shared by %d connections",
+                        len(shared_tvecs), replayed_count)
 
         total_replays = MPI.allreduce(replayed_count, MPI.SUM)
         if MPI.rank == 0:
@@ -107,6 +107,46 @@ class _MPI(object):
                 reduce_f(aggregated_object, obj)
         return aggregated_object
 
+    def py_broadcast_call(self, f, root=0):
+        """Runs f in the root rank and broadcasts the result to all ranks.
+
+        Errors in f are shared through the same collective, so that they are raised in all
+        ranks (OtherRankError in non-root ranks) instead of leaving those waiting forever
+        """
+        return self._root_call_collective(f, lambda obj: self.py_broadcast(obj, root), root)
+
+    def py_scatter_call(self, f, root=0):
+        """Runs f in the root rank, scattering the returned list (one item per rank).
+
+        Errors in f are raised in all ranks, like in `py_broadcast_call`
+        """
+        def scatter(result_error):
+            objs, error_msg = result_error
+            if self.rank == root:
+                objs = ([(obj, None) for obj in objs] if error_msg is None
+                        else [(None, error_msg)] * self.size)
+            return self.py_scatter(objs, root)
+
+        result = self._root_call_collective(f, scatter, root)
+        return result[0] if self.size == 1 else result
+
+    def _root_call_collective(self, f, collective, root):
+        """Runs f in the root rank and shares (result, error message) with the collective"""
+        result = error = error_msg = None
+        if self.rank == root:
+            try:
+                result = f()
+            except Exception as e:
+                error = e
+                error_msg = "%s: %s" % (type(e).__name__, e)
+        if self.size > 1:
+            result, error_msg = collective((result, error_msg))
+        if error is not None:
+            raise error
+        if error_msg is not None:
+            raise OtherRankError("Rank %d raised an error: %s" % (root, error_msg))
+        return result
+
 
 MPI = _MPI()
 """A singleton of MPI runtime information"""
@@ -1,7 +1,6 @@
 import os
 import psutil
-import subprocess
-import numpy as np
+import socket
 
 class SHMUtil:
     """Helper class for the SHM file transfer mechanism of CoreNEURON.
@@ -10,70 +9,29 @@ class SHMUtil:
     nnodes = -1
 
     @staticmethod
-    def __set_node_info(MPI):  # TODO: Replace with MPI SHM communicator
-        shmdir = SHMUtil.get_datadir_shm("/.__pydamus_nodeinfo_sync")
-        path = os.path.join(shmdir, str(MPI.rank))
+    def _set_node_info(MPI):
+        """Groups the ranks per node, by hostname, with a single collective.
 
-        # Create SHM folder and files to sync the process count per node
-        try:
-            os.makedirs(shmdir, exist_ok=True)
-            os.close(os.open(path, os.O_CREAT))
-        except FileExistsError:
-            pass  # Ignore if we have already created the files
-
-        MPI.barrier()
-
-        # Get a filelist sorted by rank ID and store the local node info
-        listdir = sorted(os.listdir(shmdir), key=int)
-        rank0_node = int(listdir[0])
-        nranks_node = len(listdir)
-
-        # Calculate node ID based on the entries that contain a process count
-        node_info = MPI.py_gather((nranks_node if MPI.rank == rank0_node else 0), 0)
-        if MPI.rank == 0:
-            node_info[0] = 0
-            for i in range(1, MPI.size):
-                node_info[i] = node_info[i-1] + int(node_info[i] > 0)
-
-        # At this point, the node ID for the rank and # nodes are determined
-        SHMUtil.node_id = MPI.py_scatter(node_info, 0)
-        SHMUtil.nnodes = MPI.py_broadcast((node_info[-1] + 1) if MPI.rank == 0 else 0, 0)
-
-        subprocess.call(['/bin/rm', '-rf', shmdir])
-
-    @staticmethod
-    def _get_approximate_node_rss():
-        """Reliable, but imprecise estimate of the nodewide RSS.
-
-        Note: This estimate must work even if MPI ranks can't be associated with
-        a physical node.
+        Node IDs follow the order of the first rank in each node.
         """
-        vm = psutil.virtual_memory()
-        return (vm.total - vm.available)
-
-    @staticmethod
-    def is_node_id_known():
-        """Can MPI ranks be associated with physical nodes?"""
-        return SHMUtil.get_datadir_shm() is not None
+        hostname = socket.gethostname()
+        hostnames = MPI.py_allgather(hostname) if MPI.size > 1 else [hostname]
+        node_ids = {}
+        for host in hostnames:
+            node_ids.setdefault(host, len(node_ids))
 
+        SHMUtil.node_id = node_ids[hostname]
+        SHMUtil.nnodes = len(node_ids)
 
     @staticmethod
     def get_nodewise_rss():
         """For each node the sum of the RSS of all MPI ranks on that node.
-
-        If MPI ranks can't be associated with a node, return `None`.
         """
-
         from . import MPI, Neuron
 
-        # If we do not have the SHM environment, we can't even know
-        # how many nodes there are. Just return `None`.
-        if not SHMUtil.is_node_id_known():
-            return None
-
         # Define the node ID for the rank and number of nodes
         if SHMUtil.nnodes < 0:
-            SHMUtil.__set_node_info(MPI)
+            SHMUtil._set_node_info(MPI)
 
         # Aggregate the individual memory consumption per node
         process = psutil.Process(os.getpid())
@@ -86,10 +44,6 @@ class SHMUtil:
 
     @staticmethod
     def get_node_rss():
-        # If we do not have the SHM environment, ignore and return an estimate
-        if not SHMUtil.is_node_id_known():
-            return SHMUtil._get_approximate_node_rss()
-
         # Return the consumption estimated for the node
         rss = SHMUtil.get_nodewise_rss()
         return rss[SHMUtil.node_id]
@@ -2,11 +2,15 @@
 Runtime configuration
 """
 from __future__ import absolute_import
+import fcntl
+import hashlib
+import json
 import logging
 import os
 import os.path
 import re
 from collections import defaultdict
+from contextlib import suppress
 from enum import Enum
 
 from ..io.config_parser import BlueConfig
@@ -19,6 +23,9 @@ from ._shmutils import SHMUtil
 EXCEPTION_NODE_FILENAME = ".exception_node"
 """A file which controls which rank shows exception"""
 
+MODEL_CACHE_MARKER = "model_fingerprint.json"
+"""The file marking a complete CoreNEURON dataset in the model cache, with the fingerprint data"""
+
 
 class LogLevel:
     ERROR_ONLY = 0
@@ -76,6 +83,14 @@ class CliOptions(ConfigT):
     model_stats = False
     simulator = None
     dry_run = False
+    nodesets_cache = False
+    parallel_spikes = False
+    trace_timers = False
+    memory_profile = False
+    dry_run_cache = None
+    model_cache = None
+    model_cache_no_dir_scan = False
+    cleanup_mode = "sync"
 
     # Restricted Functionality support, mostly for testing
 
@@ -235,6 +250,13 @@ class _SimConfig(object):
     spike_location = "soma"
     spike_threshold = -30
     dry_run = False
+    nodesets_cache_dir = None
+    dry_run_cache_dir = None
+    model_cache_entry = None
+    model_cache_hit = False
+    model_cache_data = None  # The fingerprint data (rank 0), stored along the entry
+    model_cache_lock = None  # Lock file (rank 0) held while the entry is checked/built
+    noise_rng_skip_ahead = False
 
     _validators = []
     _requisitors = []
@@ -766,6 +788,20 @@ def _randomize_gaba_risetime(config: _SimConfig, run_conf):
     h.randomize_Gaba_risetime = randomize_risetime
 
 
+@SimConfig.validator
+def _noise_rng_skip_ahead(config: _SimConfig, run_conf):
+    """Noise stimuli reposition their (counter-based) RNG streams past the numbers used
+    before their delay, instead of drawing them. Since normal variates don't take a fixed
+    number of positions, this gives a different (still independent) noise sequence for each
+    (stimulus, gid). Disabled by default to keep the exact legacy sequences.
+    """
+    skip_ahead = str(run_conf.get("NoiseRNGSkipAhead", "False"))
+    if skip_ahead not in ("True", "False", "0", "1", "true", "false"):
+        raise ConfigurationError("NoiseRNGSkipAhead must be either True or False")
+    config.noise_rng_skip_ahead = skip_ahead in ("True", "1", "true")
+    log_verbose("noise_rng_skip_ahead = %s", config.noise_rng_skip_ahead)
+
+
 @SimConfig.validator
 def _current_dir(config: _SimConfig, run_conf):
     curdir = run_conf.get("CurrentDir")
@@ -834,6 +870,22 @@ def _output_root(config: _SimConfig, run_conf):
     config.output_root = output_path
 
 
+@SimConfig.validator
+def _nodesets_cache(config: _SimConfig, run_conf):
+    """Persist materialized node sets next to the output, so that later runs reuse them"""
+    if config.cli_options.nodesets_cache:
+        config.nodesets_cache_dir = os.path.join(config.output_root, "nodesets_cache")
+        log_verbose("Node sets cache dir = %s", config.nodesets_cache_dir)
+
+
+@SimConfig.validator
+def _dry_run_cache(config: _SimConfig, run_conf):
+    """Keep dry-run statistics in a cache dir, reused among dry runs of the same circuit"""
+    if config.cli_options.dry_run_cache:
+        config.dry_run_cache_dir = os.path.abspath(config.cli_options.dry_run_cache)
+        log_verbose("Dry-run cache dir = %s", config.dry_run_cache_dir)
+
+
 @SimConfig.validator
 def _check_save(config: _SimConfig, run_conf):
     cli_args = config.cli_options
@@ -900,6 +952,186 @@ def _coreneuron_params(config: _SimConfig, run_conf):
     config.coreneuron_datadir = coreneuron_datadir
 
 
+_MODEL_INDEPENDENT_RUN_KEYS = (
+    "Duration", "OutputRoot", "SpikesFile", "SpikesSortOrder", "KeepModelData", "Save",
+    "SaveTime", "Restore", "ReportingBufferSize", "FlushBufferScalar", "prCellGid", "CurrentDir",
+    "ForwardSkip", "_hoc"
+)
+"""Run settings which don't change the CoreNEURON dataset, only the simulation config"""
+
+_MECH_LIB_ENV_VARS = ("NRNMECH_LIB_PATH", "BGLIBPY_MOD_LIBRARY_PATH")
+"""Env vars pointing to the mechanism libraries"""
+
+
+def _loaded_mech_libs():
+    """The mechanism libraries loaded in the process.
+
+    Besides those from the env vars, the libnrnmech mapped in memory (e.g. loaded by `special`
+    from the current dir) and the executable itself, for mechanisms built into it
+    """
+    libs = set()
+    for env_var in _MECH_LIB_ENV_VARS:
+        libs.update(os.path.abspath(lib.strip())
+                    for lib in os.environ.get(env_var, "").split(":") if lib.strip())
+    with suppress(OSError):
+        with open("/proc/self/maps") as maps:
+            for line in maps:
+                fields = line.split(maxsplit=5)
+                if len(fields) == 6 and "nrnmech" in os.path.basename(fields[5].strip()):
+                    libs.add(fields[5].strip())
+        libs.add(os.path.realpath("/proc/self/exe"))
+    return sorted(lib for lib in libs if os.path.isfile(lib))
+
+
+_MODEL_CODE_DIR_KEYS = ("METypePath",)
+"""Circuit entries of the (small) code dirs, e.g. emodel templates, whose files are all scanned"""
+
+
+def _path_signature(path):
+    """The signature of a file: [size, mtime].
+
+    Directories (e.g. of emodel templates) don't change their mtime when a file is edited
+    in place, so their signature is [n_files, digest of all files signatures]
+    """
+    if not os.path.isdir(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+    digest = hashlib.sha256()
+    n_files = 0
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            with suppress(OSError):
+                st = os.stat(file_path)
+                digest.update("{}:{}:{}\n".format(os.path.relpath(file_path, path),
+                                                   st.st_size, st.st_mtime_ns).encode())
+                n_files += 1
+    return [n_files, digest.hexdigest()[:16]]
+
+
+def _circuit_data_files(circuit):
+    """The files identifying the data of a circuit: its nodes, edges and start.target"""
+    files = []
+    circuit_path = circuit.get("CircuitPath")
+    if isinstance(circuit_path, str) and os.path.isdir(circuit_path):
+        files.append(os.path.join(circuit_path, "start.target"))
+        if isinstance(circuit.get("CellLibraryFile"), str):
+            files.append(os.path.join(circuit_path, circuit["CellLibraryFile"]))
+    nrn_path = circuit.get("nrnPath")
+    if isinstance(nrn_path, str) and os.path.isdir(nrn_path):  # Edge files (e.g. nrn.h5.*)
+        files.extend(entry.path for entry in os.scandir(nrn_path)
+                     if ".h5" in entry.name or entry.name.endswith(".sonata"))
+    return [f for f in files if os.path.isfile(f)]
+
+
+def model_fingerprint(config: _SimConfig, run_conf):
+    """Computes the fingerprint of everything affecting the model built for CoreNEURON.
+
+    It includes the circuits, targets, connection blocks, seeds, stimuli (instantiated in the
+    model) and modifications, the number of ranks and the loaded mechanism libraries. Files
+    they refer to are included by signature (size and mtime), as well as the nodes and edges
+    files in circuit dirs. Other dirs are only included by path, except the code dirs (emodel
+    templates), whose files are all scanned unless disabled with model_cache_no_dir_scan.
+    Reports, replay spikes and run-time settings are excluded since they are written to
+    separate config files.
+
+    Returns: A tuple (fingerprint, fingerprint_data)
+    """
+    from ._neurodamus import MPI
+    from .. import __version__
+
+    def as_plain(obj):
+        if isinstance(obj, ConfigT):
+            obj = obj.all
+        elif hasattr(obj, "hname") and obj.hname().startswith("Map"):
+            obj = compat.Map(obj)
+        elif hasattr(obj, "s"):
+            return obj.s
+        if isinstance(obj, (dict, compat.Map)):
+            return {str(key): as_plain(val) for key, val in obj.items() if key != "_hoc"}
+        if isinstance(obj, (list, tuple)):
+            return [as_plain(val) for val in obj]
+        return obj if isinstance(obj, (int, float, bool, type(None))) else str(obj)
+
+    replay_stims = {name for name, stim in as_plain(config.stimuli).items()
+                    if stim.get("Pattern") == "SynapseReplay"}
+    data = {
+        "run": {key: as_plain(val) for key, val in run_conf.items()
+                if key not in _MODEL_INDEPENDENT_RUN_KEYS},
+        "circuits": {name: as_plain(circuit) for name, circuit in
+                     [("", config.base_circuit), *config.extra_circuits.items()]},
+        "projections": as_plain(config.projections),
+        "connections": as_plain(config.connections),
+        "stimuli": {name: stim for name, stim in as_plain(config.stimuli).items()
+                    if name not in replay_stims},
+        "injects": {name: inject for name, inject in as_plain(config.injects).items()
+                    if inject.get("Stimulus") not in replay_stims},
+        "configures": as_plain(config.configures),
+        "modifications": as_plain(config.modifications),
+        "cli": {opt: getattr(config.cli_options, opt)
+                for opt in ("lb_mode", "modelbuilding_steps", "experimental_stims")},
+        "mpi_size": MPI.size,
+        "neurodamus": __version__,
+        "mech_libs": _loaded_mech_libs(),
+    }
+
+    circuits = data["circuits"].values()
+    code_dirs = set() if config.cli_options.model_cache_no_dir_scan else {
+        circuit.get(key) for circuit in circuits for key in _MODEL_CODE_DIR_KEYS
+    }
+
+    def file_signatures(obj, signatures):
+        if isinstance(obj, (dict, list)):
+            for val in (obj.values() if isinstance(obj, dict) else obj):
+                file_signatures(val, signatures)
+        elif isinstance(obj, str) and os.path.isabs(obj) and os.path.exists(obj):
+            if not os.path.isdir(obj) or obj in code_dirs:
+                signatures[obj] = _path_signature(obj)
+        return signatures
+
+    signatures = file_signatures(data, {})
+    for circuit in circuits:
+        signatures.update((f, _path_signature(f)) for f in _circuit_data_files(circuit))
+    data["files"] = signatures
+    serialized = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()[:16], data
+
+
+@SimConfig.validator
+def _model_cache(config: _SimConfig, run_conf):
+    """Place the CoreNEURON dataset in the model cache, in an entry for the model fingerprint"""
+    cache_dir = config.cli_options.model_cache
+    if not cache_dir:
+        return
+    if not config.use_coreneuron or config.restore:
+        logging.warning("Model cache is only available for CoreNEURON, not restoring. Ignored")
+        return
+    from ._neurodamus import MPI
+    fingerprint = None
+    if MPI.rank == 0:
+        fingerprint, config.model_cache_data = model_fingerprint(config, run_conf)
+    if MPI.size > 1:
+        fingerprint = MPI.py_broadcast(fingerprint, 0)
+    config.model_cache_entry = os.path.join(os.path.abspath(cache_dir), fingerprint)
+    config.coreneuron_datadir = os.path.join(config.model_cache_entry, "coreneuron_input")
+
+    # Concurrent jobs with the same model must not build the same entry. The first builds
+    # while holding the lock, the others wait and then find it complete
+    if MPI.rank == 0:
+        os.makedirs(cache_dir, exist_ok=True)
+        config.model_cache_lock = open(config.model_cache_entry + ".lock", "w")
+        try:
+            fcntl.flock(config.model_cache_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logging.info("Model cache entry %s locked by another job. Waiting...", fingerprint)
+            fcntl.flock(config.model_cache_lock, fcntl.LOCK_EX)
+    if MPI.size > 1:
+        MPI.barrier()
+    log_verbose("Model fingerprint: %s. CoreNEURON data dir: %s",
+                fingerprint, config.coreneuron_datadir)
+
+
 @SimConfig.validator
 def _check_model_build_mode(config: _SimConfig, run_conf):
     user_config = config.cli_options
@@ -923,15 +1155,20 @@ def _check_model_build_mode(config: _SimConfig, run_conf):
     # It's a CoreNeuron run. We have to check if build_model is AUTO or OFF
     core_data_location = config.coreneuron_datadir
 
-    try:
-        # Ensure that 'sim.conf' and 'files.dat' exist, and that '/dev/shm' was not used
-        with open(os.path.join(config.output_root, "sim.conf"), 'r') as f:
-            core_data_exists = (
-                "datpath='/dev/shm/" not in f.read()
-                and os.path.isfile(os.path.join(core_data_location, "files.dat"))
-            )
-    except FileNotFoundError:
-        core_data_exists = False
+    if config.model_cache_entry:
+        # Cache entries are complete once the marker is written
+        core_data_exists = os.path.isfile(
+            os.path.join(config.model_cache_entry, MODEL_CACHE_MARKER))
+    else:
+        try:
+            # Ensure that 'sim.conf' and 'files.dat' exist, and that '/dev/shm' was not used
+            with open(os.path.join(config.output_root, "sim.conf"), 'r') as f:
+                core_data_exists = (
+                    "datpath='/dev/shm/" not in f.read()
+                    and os.path.isfile(os.path.join(core_data_location, "files.dat"))
+                )
+        except FileNotFoundError:
+            core_data_exists = False
 
     if config.build_model in (None, "AUTO"):
         # If enable-shm option is given we have to rebuild the model and delete any previous files
@@ -958,6 +1195,10 @@ def _check_model_build_mode(config: _SimConfig, run_conf):
 
     if not config.build_model and not core_data_exists:
         raise ConfigurationError("Model build DISABLED but no CoreNeuron data found")
+    config.model_cache_hit = bool(config.model_cache_entry) and not config.build_model
+    if config.model_cache_hit and config.model_cache_lock:
+        config.model_cache_lock.close()  # Only read, no need to lock
+        config.model_cache_lock = None
 
 
 @SimConfig.validator
@@ -969,10 +1210,20 @@ def _keep_coreneuron_data(config: _SimConfig, run_conf):
         elif not config.cli_options.simulate_model or config.save:
             logging.warning("Keeping coreneuron data for CoreNeuron following run")
             keep_core_data = True
-        config.delete_corenrn_data = not keep_core_data
+        config.delete_corenrn_data = not keep_core_data and not config.model_cache_entry
     log_verbose("delete_corenrn_data = %s", config.delete_corenrn_data)
 
 
+@SimConfig.validator
+def _cleanup_mode(config: _SimConfig, run_conf):
+    from ..io.cleanup import CLEANUP_MODES
+    cleanup_mode = str(config.cli_options.cleanup_mode).lower()
+    if cleanup_mode not in CLEANUP_MODES:
+        raise ConfigurationError("Unknown cleanup mode: %s. Valid: %s"
+                                 % (config.cli_options.cleanup_mode, ", ".join(CLEANUP_MODES)))
+    config.cli_options.cleanup_mode = cleanup_mode
+
+
 @SimConfig.validator
 def _model_building_steps(config: _SimConfig, run_conf):
     user_config = config.cli_options
@@ -1031,6 +1282,8 @@ def _report_vars(config: _SimConfig, run_conf):
 @SimConfig.validator
 def _spikes_sort_order(config: _SimConfig, run_conf):
     order = run_conf.get("SpikesSortOrder", "by_time")
+    if order == "by_id" and config.cli_options.parallel_spikes and config.use_neuron:
+        return  # Supported by the parallel spikes writer. CoreNEURON writes its own spikes
     if order not in ["none", "by_time"]:
         raise ConfigurationError("Unsupported spikes sort order %s, " % order +
                                  "BBP supports 'none' and 'by_time'")
@@ -5,6 +5,7 @@ global overlapping
 from contextlib import contextmanager
 import numpy
 from ..utils import compat, WeakList
+from ..utils.bitmap import RoaringBitmap
 from . import MPI
 
 
@@ -142,10 +143,14 @@ class _NodeSetBase:
     Common bits between nodesets, so they can be registered globally and get offsets
     """
 
+    BITMAP_MIN_SIZE = 100_000
+    """Nodesets at least this large are checked for intersection via compressed bitmaps"""
+
     def __init__(self, *_, **_kw):
         self._offset  = 0
         self._max_gid = 0  # maximum raw gid (without offset)
         self._population_group = None  # register in a population so gids can be unique
+        self._bitmap = None  # lazy RoaringBitmap of the raw gids
 
     offset = property(lambda self: self._offset)
     max_gid = property(lambda self: self._max_gid)
@@ -186,12 +191,27 @@ class _NodeSetBase:
     def intersection(self, _other, _raw_gids=False):
         return NotImplemented
 
+    def raw_gids_bitmap(self):
+        """A compressed bitmap of the raw gids, for fast membership and set operations.
+        It is built on first request and kept while the gids don't change
+        """
+        if self._bitmap is None:
+            self._bitmap = RoaringBitmap.from_array(self.raw_gids())
+        return self._bitmap
+
+    def _use_bitmaps(self, other):
+        return min(len(self), len(other)) >= self.BITMAP_MIN_SIZE
+
     def intersects(self, other):
         """Check if the current nodeset intersects another
 
         For nodesets to intersect they must belong to the same population and
         have common gids
         """
+        if self.population_name != other.population_name:
+            return False
+        if self._use_bitmaps(other):
+            return self.raw_gids_bitmap().intersects(other.raw_gids_bitmap())
         return len(self.intersection(other)) > 0
 
 
@@ -225,6 +245,7 @@ class NodeSet(_NodeSetBase):
             self._max_gid = max(self.max_gid, max(gids))
         if gid_info:
             self._gid_info.update(gid_info)
+        self._bitmap = None
         self._check_update_offsets()  # check offsets (uses reduce)
         return self
 
@@ -277,6 +298,11 @@ class SelectionNodeSet(_NodeSetBase):
     def raw_gids(self):
         return numpy.add(self._selection.flatten(), 1, dtype="uint32")
 
+    def raw_gids_bitmap(self):
+        if self._bitmap is None:
+            self._bitmap = RoaringBitmap.from_array(self.raw_gids(), presorted=True)
+        return self._bitmap
+
     def raw_gids_iter(self):
         for r_start, r_end in self._selection.ranges:
             yield from range(r_start + 1, r_end + 1)
@@ -312,6 +338,9 @@ class SelectionNodeSet(_NodeSetBase):
         return numpy.array([], dtype="uint32")
 
     def intersects(self, other):
+        # Ranges are already compact, bitmaps only pay off against large gid lists
+        if not hasattr(other, "_selection") and self._use_bitmaps(other):
+            return _NodeSetBase.intersects(self, other)
         return self.intersection(other, _quick_check=True)
 
 
@@ -321,6 +350,10 @@ def _ranges_overlap(ranges1, ranges2, flattened_out=False, quick_check=False, dt
     This is especially important for nodesets since we can access the ranges in no time
     without the need to flatten and consume GBs of memory
 
+    Both range lists must be sorted and non-overlapping (as in libsonata Selections). The
+    intersection is found with binary searches over the flattened bounds of the opposite list,
+    i.e. O((n1 + n2) log(n1 + n2)) instead of a Python loop over the ranges.
+
     Args:
         ranges1: The first list of ranges
         ranges2: The second list of ranges
@@ -328,43 +361,32 @@ def _ranges_overlap(ranges1, ranges2, flattened_out=False, quick_check=False, dt
         quick_check: Whether to short-circuit and return True if any overlap exists
         dtype: The output dtype in case flattened_out is requested [default: "uint32"]
     """
-
-    if not ranges1 or not ranges2:
-        return []
-
-    all_ranges = []
-    r1_iter = iter(ranges1)
-    r2_iter = iter(ranges2)
-    r1, r2 = next(r1_iter), next(r2_iter)
-
-    while r1 and r2:
-        if r2[0] >= r1[1]:  # r2 past over end r1. Move r1
-            r1 = next(r1_iter, None)
-            continue
-        if r2[1] <= r1[0]:  # r2 before whole range r1. Move r2
-            r2 = next(r2_iter, None)
-            continue
-
-        # Phew, finally some intersection
-        low, high = max(r1[0], r2[0]), min(r1[1], r2[1])
-        if low < high:
-            if quick_check:
-                return True
-            all_ranges.append((low, high))
-
-        # Now move the one that still has potential for more overlap without moving the other
-        if r2[1] > r1[1]:
-            r1 = next(r1_iter, None)
-        else:
-            r2 = next(r2_iter, None)
-
+    if not len(ranges1) or not len(ranges2):
+        return False if quick_check else []
+
+    ranges1 = _as_ranges_array(ranges1)
+    ranges2 = _as_ranges_array(ranges2)
+    bounds1, bounds2 = ranges1.ravel(), ranges2.ravel()
+
+    # An overlap starts at a range start falling inside a range of the other list [start, end)
+    # and finishes at a range end falling inside (start, end]. Odd positions are inner points.
+    # Coincident starts/ends are found from both sides, hence the unique.
+    starts = numpy.unique(numpy.concatenate((
+        ranges1[:, 0][numpy.searchsorted(bounds2, ranges1[:, 0], side="right") % 2 == 1],
+        ranges2[:, 0][numpy.searchsorted(bounds1, ranges2[:, 0], side="right") % 2 == 1],
+    )))
     if quick_check:
-        return False  # We know it's False as quick_check returns True in the loop
+        return len(starts) > 0
+    ends = numpy.unique(numpy.concatenate((
+        ranges1[:, 1][numpy.searchsorted(bounds2, ranges1[:, 1], side="left") % 2 == 1],
+        ranges2[:, 1][numpy.searchsorted(bounds1, ranges2[:, 1], side="left") % 2 == 1],
+    )))
+
     if not flattened_out:
-        return all_ranges
-    if not all_ranges:
+        return list(zip(starts.tolist(), ends.tolist()))
+    if not len(starts):
         return []
-    return numpy.concatenate([numpy.arange(*r, dtype=dtype) for r in all_ranges])
+    return _ranges_flatten(starts, ends, dtype)
 
 
 def _ranges_vec_overlap(ranges1, vector, quick_check=False):
@@ -373,29 +395,43 @@ def _ranges_vec_overlap(ranges1, vector, quick_check=False):
     This is particularly used to know the overlap between a SelectionNodeSet and a list
     of gids, e.g. the list of local gids.
 
+    The ranges must be sorted and non-overlapping. Each value is located with a binary search
+    over the flattened range bounds, so the cost is O(len(vector) * log(len(ranges))).
+    Results are grouped by range, as if each range was tested in turn.
+
     Args:
         ranges1: The list of ranges
         vector: The array of values to intersect with
         quick_check: Whether to short-circuit and return True if any overlap exists
     """
-    if not ranges1 or len(vector) == 0:
-        return []
+    if not len(ranges1) or len(vector) == 0:
+        return False if quick_check else []
     vector = numpy.asarray(vector)
-    all_ranges = []
-
-    for r1 in ranges1:
-        if vector[-1] < r1[0]:  # gids before whole range r1
-            break
-        if vector[0] >= r1[1]:  # r2 past over end r1
-            continue
-        mask = (r1[0] <= vector) & (vector < r1[1])
-        if numpy.any(mask):
-            if quick_check:
-                return True
-            all_ranges.append(vector[mask])
+    bounds = _as_ranges_array(ranges1).ravel()
+    positions = numpy.searchsorted(bounds, vector, side="right")
+    mask = positions % 2 == 1  # odd position: bounds[pos - 1] <= value < bounds[pos]
 
     if quick_check:
-        return False
-    if not all_ranges:
+        return bool(mask.any())
+    if not mask.any():
         return []
-    return numpy.concatenate(all_ranges)
+    positions = positions[mask]
+    selected = vector[mask]
+    if numpy.any(positions[1:] < positions[:-1]):  # Unsorted vector, group by range
+        selected = selected[numpy.argsort(positions, kind="stable")]
+    return selected
+
+
+def _as_ranges_array(ranges):
+    """Convert a list of (start, end) ranges to a 2D int64 array, dropping empty ranges"""
+    ranges = numpy.asarray(ranges, dtype="int64").reshape(-1, 2)
+    return ranges[ranges[:, 0] < ranges[:, 1]]
+
+
+def _ranges_flatten(starts, ends, dtype="uint32"):
+    """Expand ranges given as arrays of starts and ends into a flat array of values"""
+    lengths = ends - starts
+    out_offsets = numpy.cumsum(lengths) - lengths  # where each range starts in the output
+    flat = numpy.arange(lengths.sum(), dtype="int64")
+    flat += numpy.repeat(starts - out_offsets, lengths)
+    return flat.astype(dtype, copy=False)
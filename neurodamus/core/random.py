@@ -54,6 +54,20 @@ class MCellRan4(RNG):
         return rng
 
 
+def skip_ahead(rng, count):
+    """Advances a counter-based RNG stream (Random123, MCellRan4) by `count` numbers.
+
+    The stream is repositioned directly, in constant time, instead of drawing and discarding
+    the numbers. Each uniform variate consumes one position of the stream.
+
+    Note: Normal variates (polar method) consume a variable number of uniforms, so skipping
+    `count` normal variates doesn't land where drawing them would. The result is a different,
+    yet independent, sequence for each stream (e.g. per stimulus and gid), not the same one.
+    """
+    rng.seq(rng.seq() + count)
+    return rng
+
+
 # Gamma-distributed sample generator (not available in NEURON)
 def gamma(rng, a, b, N=1):
     """
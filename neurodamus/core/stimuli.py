@@ -6,6 +6,7 @@ from __future__ import absolute_import
 from . import Neuron
 from .random import RNG, gamma
 import logging
+import numpy
 
 
 class SignalSource:
@@ -219,8 +220,8 @@ class SignalSource:
         ev.where("<", duration)  # remove events exceeding duration
         ev.div(dt)  # divide events by timestep
 
-        nev = Neuron.h.Vector([round(x) for x in ev])  # round to integer timestep index
-        nev.where("<", ntstep)  # remove events exceeding number of timesteps
+        nev = numpy.round(ev.as_numpy()).astype(int)  # round to integer timestep index
+        nev = nev[nev < ntstep]  # remove events exceeding number of timesteps
 
         sign = 1
         # if amplitude mean is negative, invert sign of current
@@ -231,11 +232,10 @@ class SignalSource:
         gamma_scale = amp_var / amp_mean      # scale parameter of gamma distribution
         gamma_shape = amp_mean / gamma_scale  # shape parameter of gamma distribution
         # sample gamma-distributed amplitudes
-        amp = gamma(rng, gamma_shape, gamma_scale, len(nev))
+        amp = gamma(rng, gamma_shape, gamma_scale, len(nev)).as_numpy()
 
-        E = Neuron.h.Vector(ntstep, 0)  # full signal
-        for n, A in zip(nev, amp):
-            E.x[int(n)] += sign * A  # add impulses, may overlap due to rounding to timestep
+        E = numpy.zeros(ntstep)  # full signal
+        numpy.add.at(E, nev, sign * amp)  # add impulses, may overlap due to rounding to timestep
 
         # perform equivalent of convolution with bi-exponential impulse response
         # through a composite autoregressive process with impulse train as innovations
@@ -248,15 +248,13 @@ class SignalSource:
         t_peak = log(R / D) / (R - D)
         A = (a / b - 1) / (a ** t_peak - b ** t_peak)
 
-        P = Neuron.h.Vector(ntstep, 0)
-        B = Neuron.h.Vector(ntstep, 0)
-
         # composite autoregressive process with exact solution
         # P[n] = b * (a ^ n - b ^ n) / (a - b)
         # for unit response B[0] = P[0] = 0, E[0] = 1
-        for n in range(1, ntstep):
-            P.x[n] = a * P[n - 1] + b * B[n - 1]
-            B.x[n] = b * B[n - 1] + E[n - 1]
+        #   B[n] = b * B[n - 1] + E[n - 1]
+        #   P[n] = a * P[n - 1] + b * B[n - 1]
+        B = _ar1_recurrence(_shift_right(E), b)
+        P = Neuron.h.Vector(_ar1_recurrence(b * _shift_right(B), a))
 
         P.mul(A)  # normalize to peak amplitude
 
@@ -289,8 +287,6 @@ class SignalSource:
         tvec.indgen(self._cur_t, self._cur_t + duration, dt)  # time vector
         ntstep = len(tvec)  # total number of timesteps
 
-        svec = Neuron.h.Vector(ntstep, 0)  # stim vector
-
         noise = Neuron.h.Vector(ntstep)  # Gaussian noise
         rng.normal(0.0, 1.0)
         noise.setrand(rng)  # generate Gaussian noise
@@ -303,8 +299,8 @@ class SignalSource:
             noise.mul(A)  # scale noise by amplitude [uS]
 
             # Exact update formula (independent of dt) from Gillespie 1996
-            for n in range(1, ntstep):
-                svec.x[n] = svec[n - 1] * mu + noise[n]  # signal [uS]
+            # svec[n] = svec[n - 1] * mu + noise[n]  # signal [uS]
+            svec = Neuron.h.Vector(_ar1_recurrence(noise.as_numpy(), mu))
 
         svec.add(mean)  # shift signal by mean value [uS]
 
@@ -478,3 +474,30 @@ class ConductanceSource(SignalSource):
 # and then vector.play() it into the currently accessed compartment
 #
 # TODO: 1. more stimulus primitives than step. 2. a dt of 0.1 ms is hardcoded. make this flexible!
+
+
+def _shift_right(vec):
+    """The vector delayed by one step, i.e. out[n] = vec[n - 1] and out[0] = 0"""
+    out = numpy.empty_like(vec)
+    if len(vec):
+        out[0] = 0
+        out[1:] = vec[:-1]
+    return out
+
+
+def _ar1_recurrence(x, coef):
+    """Computes the first-order recurrence y[0] = 0, y[n] = coef * y[n - 1] + x[n]
+
+    scipy.signal.lfilter performs exactly the same floating point operations as the plain loop,
+    so results are bit-identical. If scipy is not available we fall back to a Python loop.
+    """
+    x = numpy.array(x, dtype=float)
+    x[0] = 0  # y[0] = 0
+    try:
+        from scipy.signal import lfilter
+    except ImportError:
+        y = x
+        for n in range(1, len(y)):
+            y[n] = coef * y[n - 1] + x[n]
+        return y
+    return lfilter([1.0], [1.0, -coef], x)
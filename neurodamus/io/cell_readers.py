@@ -285,17 +285,19 @@ def load_sonata(circuit_conf, all_gids, stride=1, stride_offset=0, *,
         CELL_NODE_INFO_LIMIT = 100
         log_verbose("Sonata dry run mode: looking for unique metype instances")
         meinfos = METypeManager()
-        # skip_metypes = set(dry_run_stats.metype_memory.keys())
+        dry_run_stats.import_cell_cache(node_population, node_file, circuit_conf.METypePath,
+                                        circuit_conf.MorphologyPath, circuit_conf.MorphologyType)
         metype_gids, counts = _retrieve_unique_metypes(node_pop, all_gids)
         dry_run_stats.metype_counts += counts
         dry_run_stats.metype_gids = metype_gids
+        dry_run_stats.pop_metype_gids[node_population] = metype_gids
         gid_metype_bundle = list(metype_gids.values())
         gidvec = dry_run_distribution(gid_metype_bundle, stride, stride_offset, total_cells)
 
-        log_verbose("Loading node attributes... (subset of cells from each metype)")
-        for gids in metype_gids.values():
-            if not len(gids):
-                continue
+        log_verbose("Loading node attributes... (subset of cells from each new metype)")
+        for metype, gids in metype_gids.items():
+            if not len(gids) or metype in dry_run_stats.metype_memory:
+                continue  # Measured before, no need to instantiate
             gids = gids[:CELL_NODE_INFO_LIMIT]
             node_sel = libsonata.Selection(gids - 1)  # Load 0-based node ids
             morpho_names = node_pop.get_attribute("morphology", node_sel)
@@ -0,0 +1,80 @@
+"""
+Removal of large data directories (e.g. CoreNEURON input) without keeping all ranks waiting
+for a metadata-heavy `rm -rf` in rank 0
+"""
+import glob
+import logging
+import os
+import shutil
+import subprocess
+import time
+from contextlib import suppress
+
+from ..core import MPI
+
+CLEANUP_MODES = ("sync", "parallel", "background")
+"""Deletion modes: blocking rm in rank 0, split among all ranks, or in a detached process"""
+
+TRASH_SUFFIX = ".trash-"
+"""Suffix of the directories moved out of the way, pending deletion"""
+
+
+def move_to_trash(path):
+    """Atomically renames a directory to a sibling trash directory, freeing its name at once.
+
+    Returns: The new path
+    """
+    trash_path = "{}{}{}".format(path, TRASH_SUFFIX, time.time_ns())
+    os.rename(path, trash_path)
+    return trash_path
+
+
+def pending_trash(path):
+    """The trash directories of a path, including those left behind by previous runs"""
+    return sorted(glob.glob(glob.escape(path) + TRASH_SUFFIX + "*"))
+
+
+def parallel_delete(paths):
+    """Deletes directories with all ranks sharing the work. Must be called by all ranks.
+
+    Rank 0 lists the directories and scatters their entries, so that each rank deletes a subset.
+    Then rank 0 removes the (now empty) directories.
+
+    Args:
+        paths: The directories to delete. Only required in rank 0
+    """
+    entries = []
+    if MPI.rank == 0:
+        for path in paths:
+            with os.scandir(path) as it:
+                entries.extend((entry.path, entry.is_dir(follow_symlinks=False)) for entry in it)
+    if MPI.size > 1:
+        chunks = [entries[rank::MPI.size] for rank in range(MPI.size)] if MPI.rank == 0 else None
+        entries = MPI.py_scatter(chunks, 0)
+
+    for entry_path, is_dir in entries:
+        if is_dir:
+            shutil.rmtree(entry_path, ignore_errors=True)
+        else:
+            with suppress(FileNotFoundError):
+                os.unlink(entry_path)
+
+    if MPI.size > 1:
+        MPI.barrier()
+    if MPI.rank == 0:
+        for path in paths:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def background_delete(paths):
+    """Deletes directories in a detached process, which is not waited for.
+
+    Note: Depending on the job scheduler, the process may be killed when the job ends.
+    Remaining trash directories are deleted by later runs.
+    """
+    if not paths:
+        return
+    logging.info("Deleting %d dir(s) in the background: %s", len(paths), ", ".join(paths))
+    subprocess.Popen(["/bin/rm", "-rf", *paths], start_new_session=True,
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL)
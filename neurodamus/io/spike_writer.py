@@ -0,0 +1,158 @@
+"""
+Parallel writing of spike outputs, where each rank writes its own part of the file
+instead of funneling all the spikes through rank 0
+"""
+import logging
+import os
+import numpy
+
+from ..core import MPI
+from ..utils.logging import log_verbose
+
+SONATA_SORTING = {"none": 0, "by_id": 1, "by_time": 2}
+"""The values of the Sonata spikes `sorting` enum attribute"""
+
+
+def distributed_sort(sort_keys, *arrays):
+    """Sorts arrays by sort_keys globally, across all ranks, with a (regular) sample sort.
+
+    Each rank sorts its data and contributes size-1 samples, from which splitters are chosen.
+    Data is then exchanged so that all the keys of rank r precede those of rank r+1, and each
+    rank sorts (merges) what it received.
+
+    Returns: A tuple with the local (sorted) keys block, followed by the respective arrays
+    """
+    order = numpy.argsort(sort_keys, kind="stable")
+    sort_keys = sort_keys[order]
+    arrays = [arr[order] for arr in arrays]
+    if MPI.size == 1:
+        return (sort_keys, *arrays)
+
+    n_ranks = MPI.size
+    samples = sort_keys[(numpy.arange(1, n_ranks) * len(sort_keys)) // n_ranks] \
+        if len(sort_keys) else sort_keys[:0]
+    all_samples = numpy.sort(numpy.concatenate(MPI.py_allgather(samples)))
+    if len(all_samples):
+        splitters = all_samples[(numpy.arange(1, n_ranks) * len(all_samples)) // n_ranks]
+    else:
+        splitters = numpy.full(n_ranks - 1, numpy.inf)
+    bounds = numpy.concatenate(([0], numpy.searchsorted(sort_keys, splitters, "right"),
+                                [len(sort_keys)]))
+
+    sendlist = [(sort_keys[start:end], [arr[start:end] for arr in arrays])
+                for start, end in zip(bounds[:-1], bounds[1:])]
+    received = MPI.py_alltoall(sendlist)
+    del sendlist
+    sort_keys = numpy.concatenate([keys for keys, _ in received])
+    arrays = [numpy.concatenate([arrs[i] for _, arrs in received]) for i in range(len(arrays))]
+    order = numpy.argsort(sort_keys, kind="stable")  # merge of sorted runs
+    return (sort_keys[order], *(arr[order] for arr in arrays))
+
+
+def _global_offset(local_count):
+    """The offset of the local data in a rank-ordered global array, and the global total"""
+    if MPI.size == 1:
+        return 0, local_count
+    counts = MPI.py_allgather(local_count)
+    return sum(counts[:MPI.rank]), sum(counts)
+
+
+def write_sonata_spikes(filename, populations, sort_order="by_time"):
+    """Writes a Sonata spikes file, each rank writing its spikes as a slice of the datasets.
+
+    With a parallel (MPI-IO) h5py all ranks write concurrently. Otherwise rank 0 creates the
+    datasets and ranks take turns writing their slices. In no case the spikes are gathered.
+    Must be called by all ranks, with the same populations.
+
+    Args:
+        filename: The output Sonata spikes file
+        populations: A list of (population_name, timestamps, node_ids) with the local spikes.
+            node_ids are 0-based Sonata ids
+        sort_order: One of the Sonata spikes sort orders: "none", "by_id", "by_time"
+    """
+    import h5py  # Can be heavy so loaded on demand
+
+    sorting = SONATA_SORTING[sort_order]
+    local_data = []
+    for population, timestamps, node_ids in populations:
+        timestamps = numpy.asarray(timestamps, dtype="float64")
+        node_ids = numpy.asarray(node_ids, dtype="uint64")
+        if sort_order == "by_time":
+            timestamps, node_ids = distributed_sort(timestamps, node_ids)
+        elif sort_order == "by_id":
+            node_ids, timestamps = distributed_sort(node_ids, timestamps)
+        offset, total = _global_offset(len(timestamps))
+        local_data.append((population, timestamps, node_ids, offset, total))
+
+    def create_datasets(h5file):
+        sorting_type = h5py.enum_dtype(SONATA_SORTING, basetype="u1")
+        for population, _, _, _, total in local_data:
+            group = h5file.create_group("spikes/" + population)
+            group.attrs.create("sorting", sorting, dtype=sorting_type)
+            group.create_dataset("timestamps", (total,), dtype="float64").attrs["units"] = "ms"
+            group.create_dataset("node_ids", (total,), dtype="uint64")
+
+    def write_slices(h5file):
+        for population, timestamps, node_ids, offset, _ in local_data:
+            group = h5file["spikes/" + population]
+            group["timestamps"][offset:offset + len(timestamps)] = timestamps
+            group["node_ids"][offset:offset + len(node_ids)] = node_ids
+
+    if MPI.size > 1 and h5py.get_config().mpi:
+        from mpi4py import MPI as MPI4Py
+        log_verbose("Writing spikes to %s with parallel HDF5", filename)
+        with h5py.File(filename, "w", driver="mpio", comm=MPI4Py.COMM_WORLD) as h5file:
+            create_datasets(h5file)  # Metadata ops are collective
+            write_slices(h5file)
+        return
+
+    log_verbose("Writing spikes to %s, one rank at a time", filename)
+    if MPI.rank == 0:
+        with h5py.File(filename, "w") as h5file:
+            create_datasets(h5file)
+    for rank in range(MPI.size):
+        if MPI.size > 1:
+            MPI.barrier()
+        if rank == MPI.rank:
+            with h5py.File(filename, "r+") as h5file:
+                write_slices(h5file)
+    if MPI.size > 1:
+        MPI.barrier()
+
+
+def prepend_header(filename, header, block_size=1 << 26):
+    """Prepends a header to a (large) text file in place, with all ranks sharing the work.
+
+    The file contents are shifted in rounds, from the end. In each round every rank reads a
+    block, and only after all have read the blocks are written back, shifted. Hence no rank
+    ever holds more than `block_size` bytes, and no temporary copy of the file is created.
+    Must be called by all ranks.
+    """
+    header = header.encode()
+    shift = len(header)
+    if MPI.size > 1:
+        MPI.barrier()  # the file must be complete
+    filesize = os.stat(filename).st_size
+    round_size = block_size * MPI.size
+
+    with open(filename, "r+b") as f:
+        for round_end in range(filesize, 0, -round_size):
+            start = max(round_end - round_size + MPI.rank * block_size, 0)
+            end = min(round_end - round_size + (MPI.rank + 1) * block_size, round_end)
+            data = b""
+            if end > start:
+                f.seek(start)
+                data = f.read(end - start)
+            if MPI.size > 1:
+                MPI.barrier()
+            if data:
+                f.seek(start + shift)
+                f.write(data)
+        if MPI.rank == 0:
+            f.seek(0)
+            f.write(header)
+
+    if MPI.size > 1:
+        MPI.barrier()
+    if MPI.rank == 0:
+        logging.info("Prepended header to %s (%d bytes)", filename, filesize)
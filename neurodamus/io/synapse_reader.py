@@ -388,6 +388,21 @@ class SonataReader(SynapseReader):
         values, counts = np.unique(data, return_counts=True)
         return dict(zip(values, counts))
 
+    def get_counts_per_node(self, raw_ids, group_by):
+        """
+        Counts synapses of each of the given nodes, grouped by the given field.
+
+        Returns: A dict raw_id -> {value: count}
+        """
+        edge_ids = self._population.afferent_edges(raw_ids - 1)
+        tgids = self._population.target_nodes(edge_ids).astype("int64") + 1
+        data = self._population.get_attribute(group_by, edge_ids).astype("int64")
+        result = {int(gid): {} for gid in raw_ids}
+        pairs, counts = np.unique(np.stack((tgids, data)), axis=1, return_counts=True)
+        for (gid, value), count in zip(pairs.T.tolist(), counts.tolist()):
+            result[gid][value] = count
+        return result
+
 
 class SynReaderNRN(SynapseReader):
     """ Synapse Reader for NRN format only, using the hdf5_reader mod.
@@ -123,6 +123,7 @@ class NeuroModulationSynapseReader(SonataReader):
 class NeuroModulationManager(SynapseRuleManager):
     conn_factory = NeuroModulationConnection
     SynapseReader = NeuroModulationSynapseReader
+    requires_finalized_params = True
 
     def _finalize_conns(self, tgid, conns, base_seed, sim_corenrn, **kwargs):
         """ Override the function from the base class.
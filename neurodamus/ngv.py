@@ -343,6 +343,7 @@ class NeuroGliaConnManager(ConnectionManagerBase):
     """
 
     CONNECTIONS_TYPE = "NeuroGlial"
+    requires_finalized_params = True
     conn_factory = NeuroGlialConnection
     SynapseReader = NeuroGlialSynapseReader
 
@@ -5,14 +5,16 @@ from __future__ import absolute_import
 import gc
 import glob
 import itertools
+import json
 import logging
 import math
+import numpy
 import os
+import shutil
 import subprocess
 from os import path as ospath
 from collections import namedtuple, defaultdict
 from contextlib import contextmanager
-from shutil import copyfileobj, move
 
 from .core import MPI, mpi_no_errors, return_neuron_timings, run_only_rank0
 from .core import NeurodamusCore as Nd
@@ -20,11 +22,14 @@ from .core.configuration import CircuitConfig, Feature, GlobalConfig, SimConfig
 from .core._engine import EngineBase
 from .core._shmutils import SHMUtil
 from .core.configuration import ConfigurationError, find_input_file, get_debug_cell_gid
+from .core.configuration import MODEL_CACHE_MARKER
 from .core.nodeset import PopulationNodes
 from .cell_distributor import CellDistributor, VirtualCellPopulation, GlobalCellManager
 from .cell_distributor import LoadBalance, LoadBalanceMode
 from .connection_manager import SynapseRuleManager, edge_node_pop_names
 from .gap_junction import GapJunctionManager
+from .io.cleanup import background_delete, move_to_trash, parallel_delete, pending_trash
+from .io.spike_writer import prepend_header, write_sonata_spikes
 from .replay import MissingSpikesPopulationError, SpikeManager
 from .stimulus_manager import StimulusManager
 from .modification_manager import ModificationManager
@@ -33,6 +38,7 @@ from .target_manager import TargetSpec, TargetManager
 from .utils import compat
 from .utils.logging import log_stage, log_verbose, log_all
 from .utils.memory import DryRunStats, trim_memory, pool_shrink, free_event_queues, print_mem_usage
+from .utils.memory import MemoryProfiler
 from .utils.timeit import TimerManager, timeit
 from .core.coreneuron_configuration import CoreConfig
 # Internal Plugins
@@ -269,6 +275,10 @@ class Node:
             self._spike_populations = []
             Nd.execute("cvode = new CVode()")
             SimConfig.init(config_file, options)
+            if SimConfig.cli_options.trace_timers:
+                TimerManager.enable_trace()
+            if SimConfig.cli_options.memory_profile:
+                MemoryProfiler.enable()
             if SimConfig.use_coreneuron:
                 CoreConfig.output_root = SimConfig.output_root
                 CoreConfig.datadir = SimConfig.coreneuron_datadir
@@ -407,6 +417,33 @@ class Node:
 
         return load_balancer
 
+    def _dry_run_cell_complexities(self):
+        """The complexities of the cells from a previous load balance of the (first) circuit,
+        so that dry-run can simulate a WholeCell distribution.
+
+        Returns: A dict population -> {gid: complexity}, or None if not load balancing
+        """
+        if SimConfig.loadbal_mode not in (LoadBalanceMode.WholeCell, LoadBalanceMode.MultiSplit):
+            return None
+        circuit = self._base_circuit
+        if SimConfig.is_sonata_config:
+            circuit = next((c for c in self._extra_circuits.values()
+                            if c.get("PopulationType") != "virtual"), None)
+        if not circuit or not circuit.CircuitPath:
+            return None
+        data_src = (
+            circuit.CircuitPath if SimConfig.is_sonata_config
+            else self._run_conf["nrnPath"] or circuit.CircuitPath
+        )
+        target_spec = TargetSpec(circuit.CircuitTarget)
+        cell_cx = LoadBalance.load_cell_complexities(data_src, target_spec.simple_name)
+        if cell_cx is None:
+            logging.warning("No load balance data for target %s. Planning with Round-Robin",
+                            target_spec.simple_name)
+            return None
+        population = target_spec.population or next(iter(self._dry_run_stats.pop_metype_gids), "")
+        return {population: cell_cx}
+
     # -
     @mpi_no_errors
     @timeit(name="Cell creation")
@@ -426,7 +463,7 @@ class Node:
         if SimConfig.dry_run:
             logging.info("Memory usage after inizialization:")
             print_mem_usage()
-            self._dry_run_stats = DryRunStats()
+            self._dry_run_stats = DryRunStats(SimConfig.dry_run_cache_dir)
             # We load the memory usage rather early since it will be needed at the moment we load
             # the cell ids. This way we can avoid gidvec from having gids of known metype cells.
             self._dry_run_stats.try_import_cell_memory_usage()
@@ -776,13 +813,19 @@ class Node:
         src_target = self.target_manager.get_target(source)
         dst_target = self.target_manager.get_target(target)
 
-        if SimConfig.restore_coreneuron:
+        reuse_model = SimConfig.restore_coreneuron or SimConfig.model_cache_hit
+        if reuse_model:
             pop_offsets, alias_pop = CircuitManager.read_population_offsets(read_virtual_pop=True)
 
         for src_pop in src_target.population_names:
             try:
                 log_verbose("Loading replay spikes for population '%s'", src_pop)
-                spike_manager = SpikeManager(spike_filepath, tshift, src_pop)  # Disposable
+                gid_filter = self._replay_source_gids(src_pop, dst_target, ptype_cls)
+                # CoreNEURON pattern files are written in full. NEURON skips spikes before the
+                # delay. Open-ended since runs may go past tstop (solve(tstop), continuation)
+                time_window = None if SimConfig.use_coreneuron else (delay, None)
+                spike_manager = SpikeManager(spike_filepath, tshift, src_pop,  # Disposable
+                                             gid_filter=gid_filter, time_window=time_window)
             except MissingSpikesPopulationError:
                 logging.info("  > No replay for src population: '%s'", src_pop)
                 continue
@@ -790,7 +833,7 @@ class Node:
             for dst_pop in dst_target.population_names:
                 src_pop_str, dst_pop_str = src_pop or "(base)", dst_pop or "(base)"
 
-                if SimConfig.restore_coreneuron:  # Node and Edges managers not initialized
+                if reuse_model:  # Node and Edges managers not initialized
                     src_pop_offset = pop_offsets[src_pop] if src_pop in pop_offsets \
                         else pop_offsets[alias_pop[src_pop]]
                 else:
@@ -807,6 +850,21 @@ class Node:
                 else:
                     conn_manager.replay(spike_manager, source, target, delay)
 
+    def _replay_source_gids(self, src_pop, dst_target, ptype_cls):
+        """The raw source gids of the local connections which may get replay (distributed mode)
+
+        With NEURON each rank only replays spikes on its own connections, so it only needs the
+        spikes of their source gids. CoreNEURON writes a global pattern file, requiring all.
+
+        Returns: The array of local source gids, or None if all spikes are required
+        """
+        if SimConfig.use_coreneuron:
+            return None
+        conn_managers = (self._circuits.get_edge_manager(src_pop, dst_pop, ptype_cls)
+                         for dst_pop in dst_target.population_names)
+        sgids = [manager.get_source_gids() for manager in conn_managers if manager]
+        return numpy.unique(numpy.concatenate(sgids)) if sgids else numpy.empty(0, "uint32")
+
     def _coreneuron_replay_append(self, spike_manager, gid_offset=None):
         """Write replay spikes in single file for CoreNeuron"""
         # To be loaded as PatternStim, requires final gids (with offset)
@@ -880,7 +938,7 @@ class Node:
                     n_errors += 1
                     continue
 
-            if SimConfig.restore_coreneuron:
+            if SimConfig.restore_coreneuron or SimConfig.model_cache_hit:
                 continue  # we dont even need to initialize reports
 
             report = Nd.Report(*rep_params)
@@ -1150,6 +1208,7 @@ class Node:
 
     # -
     @mpi_no_errors
+    @timeit(name="Sim init")
     def sim_init(self, corenrn_gen=None, **sim_opts):
         """Finalize the model and prepare to run simulation.
 
@@ -1351,12 +1410,12 @@ class Node:
 
     # -
     @timeit(name="corewrite")
-    def _sim_corenrn_write_config(self, corenrn_restore=False):
+    def _sim_corenrn_write_config(self, corenrn_restore=False, reuse_data=False):
         log_stage("Dataset generation for CoreNEURON")
-        CoreConfig.datadir = self._sim_corenrn_configure_datadir(corenrn_restore)
+        CoreConfig.datadir = self._sim_corenrn_configure_datadir(corenrn_restore or reuse_data)
         fwd_skip = self._run_conf.get("ForwardSkip", 0) if not corenrn_restore else 0
 
-        if not corenrn_restore:
+        if not corenrn_restore and not reuse_data:
             Nd.registerMapping(self._circuits.global_manager)
             with self._coreneuron_ensure_all_ranks_have_gids(CoreConfig.datadir):
                 self._pc.nrnbbcore_write(CoreConfig.datadir)
@@ -1545,18 +1604,12 @@ class Node:
     #  output
     # -------------------------------------------------------------------------
 
-    @run_only_rank0
     def adapt_spikes(self, outfile):
         """Prepend /scatter to spikes file after coreneuron sim finishes.
+        The file is shifted in place by all ranks, see `prepend_header`
         """
-        output_root = SimConfig.output_root
-        outfile = ospath.join(output_root, outfile)
-        tmpfile = ospath.join(output_root, 'tmp.out')
-        with open(outfile, 'r') as f_src:
-            with open(tmpfile, 'w') as f_dest:
-                f_dest.write("/scatter\n")
-                copyfileobj(f_src, f_dest)
-        move(tmpfile, outfile)
+        outfile = ospath.join(SimConfig.output_root, outfile)
+        prepend_header(outfile, "/scatter\n")
 
     @mpi_no_errors
     def spike2file(self, outfile):
@@ -1579,6 +1632,8 @@ class Node:
         """ Write the spike events that occured on each node into a single output SONATA file.
         """
         output_root = SimConfig.output_root
+        if SimConfig.cli_options.parallel_spikes:
+            return self._write_sonata_spikes_parallel()
         if hasattr(self._sonatareport_helper, "create_spikefile"):
             # Write spike report for multiple populations if exist
             spike_path = self._run_conf.get("SpikesFile")
@@ -1607,6 +1662,20 @@ class Node:
             extra_args = (population,)
             self._sonatareport_helper.write_spikes(spikevec, idvec, output_root, *extra_args)
 
+    @mpi_no_errors
+    def _write_sonata_spikes_parallel(self):
+        """Write the SONATA spikes file with h5py, every rank writing its own spikes"""
+        spike_path = self._run_conf.get("SpikesFile") or "out.h5"
+        outfile = ospath.join(SimConfig.output_root, ospath.basename(spike_path))
+        logging.info("Writing spikes to %s (parallel)", outfile)
+        populations = []
+        for (population, population_offset), (spikevec, idvec) in zip(self._spike_populations,
+                                                                      self._spike_vecs):
+            # Sonata node ids are 0-based, relative to the population
+            node_ids = idvec.as_numpy().astype("int64") - population_offset - 1
+            populations.append((population or "All", spikevec.as_numpy(), node_ids))
+        write_sonata_spikes(outfile, populations, self._run_conf.get("SpikesSortOrder", "by_time"))
+
     def dump_cell_config(self):
         if not self._pr_cell_gid:
             return
@@ -1657,19 +1726,28 @@ class Node:
 
         if SimConfig.delete_corenrn_data and not SimConfig.dry_run:
             data_folder = SimConfig.coreneuron_datadir
-            logging.info("Deleting intermediate data in %s", data_folder)
+            cleanup_mode = SimConfig.cli_options.cleanup_mode
+            logging.info("Deleting intermediate data in %s (%s)", data_folder, cleanup_mode)
 
             with timeit(name="Delete corenrn data"):
                 if MPI.rank == 0:
                     if ospath.islink(data_folder):
                         # in restore, coreneuron data is a symbolic link
                         os.unlink(data_folder)
-                    else:
+                    elif cleanup_mode == "sync":
                         subprocess.call(['/bin/rm', '-rf', data_folder])
+                    elif ospath.isdir(data_folder):
+                        move_to_trash(data_folder)
                     os.remove(ospath.join(SimConfig.output_root, "sim.conf"))
                     if self._run_conf["EnableReports"]:
                         os.remove(ospath.join(SimConfig.output_root, "report.conf"))
 
+                # Trash dirs include those left behind by previous (background) cleanups
+                if cleanup_mode == "parallel":
+                    parallel_delete(pending_trash(data_folder) if MPI.rank == 0 else None)
+                elif cleanup_mode == "background" and MPI.rank == 0:
+                    background_delete(pending_trash(data_folder))
+
                 # Delete the SHM folder if it was used
                 if self._shm_enabled:
                     data_folder_shm = SHMUtil.get_datadir_shm(data_folder)
@@ -1680,6 +1758,10 @@ class Node:
 
         logging.info("Finished")
         TimerManager.timeit_show_stats()
+        if TimerManager.trace_enabled:
+            TimerManager.export_trace(ospath.join(SimConfig.output_root, "timeit_trace.json"))
+        if MemoryProfiler.enabled:
+            MemoryProfiler.export_report(ospath.join(SimConfig.output_root, "memory_profile.json"))
 
 
 # Helper class
@@ -1736,8 +1818,14 @@ class Neurodamus(Node):
 
         if SimConfig.restore_coreneuron:
             self._coreneuron_restore()
+        elif SimConfig.model_cache_hit:
+            self._coreneuron_reuse_cached_model()
         elif SimConfig.build_model:
+            if SimConfig.model_cache_entry:  # Rebuilding. Entry incomplete until stored
+                self._remove_file(ospath.join(SimConfig.model_cache_entry, MODEL_CACHE_MARKER))
             self._instantiate_simulation()
+            if SimConfig.model_cache_entry and self._sim_ready:
+                self._store_model_cache_entry()
 
         # In case an exception occurs we must prevent the destructor from cleaning
         self._init_ok = True
@@ -1747,6 +1835,7 @@ class Neurodamus(Node):
         self._remove_file(self._success_file)
 
     # -
+    @timeit(name="Build model")
     def _build_model(self):
         log_stage("================ CALCULATING LOAD BALANCE ================")
         load_bal = self.compute_load_balance()
@@ -1775,8 +1864,15 @@ class Neurodamus(Node):
         """
         log_stage("Creating connections in the simulator")
         base_seed = self._run_conf.get("BaseSeed", 0)  # base seed for synapse RNG
-        for syn_manager in self._circuits.all_synapse_managers():
-            syn_manager.finalize(base_seed, SimConfig.use_coreneuron)
+        syn_managers = list(self._circuits.all_synapse_managers())
+        # With CoreNEURON synapse params are not needed once instantiated, unless some manager
+        # attaches to existing synapses (e.g. neuromodulation)
+        release_params = SimConfig.use_coreneuron and not any(
+            manager.requires_finalized_params for manager in syn_managers)
+        with timeit(name="Synapses finalize"):
+            for syn_manager in syn_managers:
+                syn_manager.release_params_on_finalize = release_params
+                syn_manager.finalize(base_seed, SimConfig.use_coreneuron)
         print_mem_usage()
 
         self.enable_stimulus()
@@ -1812,6 +1908,35 @@ class Neurodamus(Node):
 
         logging.info(" => {} files merged successfully".format(ncycles))
 
+    # -
+    def _coreneuron_reuse_cached_model(self):
+        """Simulates a model dataset from the cache, only writing the simulation config files"""
+        log_stage(" ============= CORENEURON MODEL FROM CACHE =============")
+        logging.info("Reusing CoreNEURON data in %s", SimConfig.coreneuron_datadir)
+        if MPI.rank == 0:
+            shutil.copy(ospath.join(SimConfig.model_cache_entry, "populations_offset.dat"),
+                        CircuitManager._pop_offset_file(create=True))
+        MPI.barrier()
+        self.load_targets()
+        self.enable_replay()
+        if self._run_conf["EnableReports"]:
+            self.enable_reports()
+        self._sim_corenrn_write_config(reuse_data=True)
+        self._sim_ready = True
+
+    @run_only_rank0
+    def _store_model_cache_entry(self):
+        """Marks the CoreNEURON dataset in the cache complete, with the data of its fingerprint.
+        Population offsets are kept along, for replay and reports of later runs.
+        """
+        self._circuits.write_population_offsets()
+        shutil.copy(CircuitManager._pop_offset_file(), SimConfig.model_cache_entry)
+        with open(ospath.join(SimConfig.model_cache_entry, MODEL_CACHE_MARKER), "w") as f:
+            json.dump(SimConfig.model_cache_data, f, indent=1, sort_keys=True, default=str)
+        SimConfig.model_cache_lock.close()  # Entry complete, other jobs may use it
+        SimConfig.model_cache_lock = None
+        logging.info("CoreNEURON data stored in the model cache: %s", SimConfig.model_cache_entry)
+
     # -
     def _coreneuron_restore(self):
         log_stage(" =============== CORENEURON RESTORE ===============")
@@ -1960,6 +2085,7 @@ class Neurodamus(Node):
             log_stage("============= DRY RUN (SKIP SIMULATION) =============")
             self._dry_run_stats.display_total()
             self._dry_run_stats.display_node_suggestions()
+            self._dry_run_stats.display_node_plan(self._dry_run_cell_complexities())
             return
         if not SimConfig.simulate_model:
             self.sim_init()
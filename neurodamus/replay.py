@@ -4,7 +4,9 @@ Stimulus implementation where incoming synaptic events are replayed for a single
 from __future__ import absolute_import
 import os
 import logging
+import warnings
 import numpy
+from .core import MPI
 from .utils.logging import log_verbose
 from .utils.multimap import GroupedMultiMap
 from .utils.timeit import timeit
@@ -19,79 +21,186 @@ class SpikeManager:
 
     Internally the spikes are stored in a :py:class:`neurodamus.utils.multimap.GroupedMultiMap`
     """
-    _ascii_spike_dtype = [('time', 'double'), ('gid', 'uint32')]
+    READ_CHUNK_SIZE = 1 << 20
+    """The (approximate) number of spikes read and filtered at once by ascii and binary readers"""
+
+    DUMP_CHUNK_SIZE = 1 << 20
+    """The (approximate) max number of spikes formatted and written at once when dumping"""
 
     @timeit(name="Replay init")
-    def __init__(self, spike_filename, delay=0, population=None):
+    def __init__(self, spike_filename, delay=0, population=None, gid_filter=None,
+                 time_window=None):
         """Constructor for SynapseReplay.
 
         Args:
             spike_filename: path to spike out file.
                 if ext is .bin, interpret as binary file; otherwise, interpret as ascii
             delay: delay to apply to spike times
+            population: The spikes population to read (Sonata spike files only)
+            gid_filter: (Distributed mode) Keep only the spikes of these raw gids, typically
+                the sources of the local connections. Must be called by all ranks, since
+                non-Sonata files are read on rank 0 and their spikes scattered.
+            time_window: A (tstart, tstop) tuple. Keep only spikes within, after the delay.
+                Any of the bounds can be None
         """
         self._gid_fire_events = None
         # Nd.distributedSpikes = 0  # Wonder the effects of this
-        self.open_spike_file(spike_filename, delay, population)
+        self.open_spike_file(spike_filename, delay, population, gid_filter, time_window)
 
     #
-    def open_spike_file(self, filename, delay, population=None):
+    def open_spike_file(self, filename, delay, population=None, gid_filter=None,
+                        time_window=None):
         """Opens a given spike file.
 
+        Files are read and filtered in chunks, so that memory usage is mostly driven by the
+        retained spikes.
+
         Args:
             filename: path to spike out file. Interpret as binary or ascii according to extension
             delay: delay to apply to spike times
+            population: The spikes population to read (Sonata spike files only)
+            gid_filter: (Distributed mode) The raw gids whose spikes shall be loaded
+            time_window: A (tstart, tstop) tuple with the bounds of the spikes to load
         """
         # determine if we have binary or ascii file
         # TODO: filename should be able to handle relative paths,
         # using the Run.CurrentDir as an initial path
-        # _read_spikes_xxx shall return numpy arrays
+        # _iter_spikes_xxx shall yield chunks of numpy arrays
         if filename.endswith(".h5"):
-            tvec, gidvec = self._read_spikes_sonata(filename, population)
+            chunks = [self._read_spikes_sonata(filename, population, gid_filter)]
         elif filename.endswith(".bin"):
-            tvec, gidvec = self._read_spikes_binary(filename)
+            chunks = self._iter_spikes_binary(filename)
         else:
-            tvec, gidvec = self._read_spikes_ascii(filename)
+            chunks = self._iter_spikes_ascii(filename)
 
-        if delay:
-            tvec += delay
+        chunks = self._filter_chunks(chunks, delay, time_window)
+        if gid_filter is not None and not filename.endswith(".h5"):
+            chunks = [self._scatter_chunks(chunks, gid_filter)]
 
-        self._store_events(tvec, gidvec)
+        self._store_events(chunks)
+
+    @staticmethod
+    def _filter_chunks(chunks, delay, time_window=None):
+        """Applies the delay to the spike chunks, keeping only those in the time window"""
+        tstart, tstop = time_window or (None, None)
+        for tvec, gidvec in chunks:
+            if delay:
+                tvec = tvec + delay
+            if tstart is not None or tstop is not None:
+                mask = numpy.ones(len(tvec), dtype=bool)
+                if tstart is not None:
+                    mask &= tvec >= tstart
+                if tstop is not None:
+                    mask &= tvec <= tstop
+                tvec, gidvec = tvec[mask], gidvec[mask]
+            yield tvec, gidvec
 
     @classmethod
-    def _read_spikes_sonata(cls, filename, population):
+    def _read_spikes_sonata(cls, filename, population, gid_filter=None):
+        """Read the spikes of a Sonata population, eventually only of the given (raw) gids.
+        Selecting by node ids lets libsonata use the file index when sorted by id
+        """
         import libsonata
         spikes_file = libsonata.SpikeReader(filename)
         if population not in spikes_file.get_population_names():
             raise MissingSpikesPopulationError("Spikes population not found: " + population)
         spikes = spikes_file[population]
-        spike_dict = spikes.get_dict()
+        if gid_filter is None:
+            spike_dict = spikes.get_dict()
+        else:
+            node_ids = numpy.subtract(gid_filter, 1, dtype="int64")  # Sonata ids are 0-based
+            spike_dict = spikes.get_dict(node_ids=node_ids.tolist())
         return spike_dict["timestamps"], spike_dict["node_ids"] + 1
 
+    @classmethod
+    def _scatter_chunks(cls, chunks, gid_filter):
+        """Distributed filtering of non-Sonata spike chunks.
+
+        Rank 0 reads the file and sends each rank only the spikes of its requested gids,
+        so that memory in the other ranks is proportional to their connections fan-in.
+        Chunks are only consumed on rank 0.
+        """
+        gid_filter = numpy.unique(numpy.asarray(gid_filter, dtype="uint32"))
+        if MPI.size == 1:
+            kept_chunks = []
+            for tvec, gidvec in chunks:
+                mask = numpy.isin(gidvec, gid_filter)
+                kept_chunks.append((tvec[mask], gidvec[mask]))
+            return cls._concat_chunks(kept_chunks)
+
+        all_gid_filters = MPI.py_gather(gid_filter, 0)
+
+        def split_rank_spikes():
+            rank_chunks = [[] for _ in all_gid_filters]
+            for tvec, gidvec in chunks:
+                for rank_gids, rank_list in zip(all_gid_filters, rank_chunks):
+                    mask = numpy.isin(gidvec, rank_gids)
+                    rank_list.append((tvec[mask], gidvec[mask]))
+            return [cls._concat_chunks(rank_list) for rank_list in rank_chunks]
+
+        # Errors reading the file in rank 0 are raised in all ranks
+        tvec, gidvec = MPI.py_scatter_call(split_rank_spikes, 0)
+        log_verbose("Replay: Kept %d spikes for %d local source gids", len(tvec), len(gid_filter))
+        return tvec, gidvec
+
+    @staticmethod
+    def _concat_chunks(chunks):
+        tvecs, gidvecs = [], []
+        for tvec, gidvec in chunks:
+            tvecs.append(tvec)
+            gidvecs.append(gidvec)
+        if not tvecs:
+            return numpy.empty(0, "double"), numpy.empty(0, "uint32")
+        return numpy.concatenate(tvecs), numpy.concatenate(gidvecs)
+
     @classmethod
     def _read_spikes_ascii(cls, filename):
-        log_verbose("Reading ascii spike file %s", filename)
-        # first line is '/scatter'
-        spikes = numpy.loadtxt(filename, dtype=cls._ascii_spike_dtype, skiprows=1, ndmin=1)
+        return cls._concat_chunks(cls._iter_spikes_ascii(filename))
 
-        if len(spikes) > 0:
-            log_verbose("Loaded %d spikes", len(spikes))
+    @classmethod
+    def _iter_spikes_ascii(cls, filename):
+        """Reads an ascii spike file in chunks of lines, parsed by numpy C tokenizer
+        """
+        log_verbose("Reading ascii spike file %s", filename)
+        n_spikes = 0
+        with open(filename) as f:
+            f.readline()  # first line is '/scatter'
+            while True:
+                lines = f.readlines(cls.READ_CHUNK_SIZE * 16)  # ~16 chars per line
+                if not lines:
+                    break
+                with warnings.catch_warnings():
+                    # older numpy warns (instead of raising) when it cant parse the whole string
+                    warnings.simplefilter("error", DeprecationWarning)
+                    try:
+                        data = numpy.fromstring("".join(lines), sep=" ")
+                    except (DeprecationWarning, ValueError):
+                        data = numpy.empty(1)  # fail below
+                if len(data) % 2:
+                    raise ValueError("Invalid entries in spike file " + filename)
+                data = data.reshape(-1, 2)
+                n_spikes += len(data)
+                yield data[:, 0], data[:, 1].astype("uint32")
+
+        if n_spikes > 0:
+            log_verbose("Loaded %d spikes", n_spikes)
         else:
             logging.warning("No spike/gid found in spike file %s", filename)
 
-        return spikes["time"], spikes["gid"]
+    @classmethod
+    def _read_spikes_binary(cls, filename):
+        return cls._concat_chunks(cls._iter_spikes_binary(filename))
 
-    @staticmethod
-    def _read_spikes_binary(filename):
-        """Read in the binary file with spike events.
+    @classmethod
+    def _iter_spikes_binary(cls, filename):
+        """Read in the binary file with spike events, in chunks.
 
         Format notes: The first half of file is interpreted as double precision time values
         followed by an equal number of double precision gid values.
         File must be produced on the same architecture where NEURON will run (i.e. no byte-swapping)
         Read the data on the root node, broadcasting info - This is fine as long as the entire data
-        set fits in a single node's memory. Should it become significantly larger, this could be
-        replaced with a distributed model where each node loads a portion of the file, and exchanges
-        with other nodes so as to ultimately hold data for local gids.
+        set fits in a single node's memory. In distributed mode (see `_scatter_chunks`) the
+        other ranks receive only the spikes of their local source gids.
         """
         log_verbose("Reading Binary spike file %s", filename)
         # there *should* be a number of doubles (8 bytes) such that
@@ -102,25 +211,27 @@ class SpikeManager:
         if not filesize % 16:
             logging.warning("File size doesn't conform to have same number of gids and times")
 
-        with open(filename, "rb") as reader:
-            tvec = numpy.fromfile(reader, "d", n_events)
-            gidvec = numpy.fromfile(reader, "d", n_events).astype("uint32")
+        for start in range(0, n_events, cls.READ_CHUNK_SIZE):
+            count = min(cls.READ_CHUNK_SIZE, n_events - start)
+            tvec = numpy.fromfile(filename, "d", count, offset=start * 8)
+            gidvec = numpy.fromfile(filename, "d", count, offset=(n_events + start) * 8)
+            yield tvec, gidvec.astype("uint32")
 
-        log_verbose("Replay: Loaded %d spikes", len(tvec))
-
-        return tvec, gidvec
+        log_verbose("Replay: Loaded %d spikes", n_events)
 
     #
-    def _store_events(self, tvec, gidvec):
+    def _store_events(self, chunks):
         """Stores the events in the _gid_fire_events GroupedMultiMap.
 
-        tvec and gidvec arguments should be numpy arrays
+        chunks is an iterable of (tvec, gidvec) numpy arrays. Each chunk is grouped by gid as it
+        arrives, and all are merged at the end, in linear time.
         """
-        spike_map = GroupedMultiMap(gidvec, tvec)
-        if self._gid_fire_events is None:
-            self._gid_fire_events = spike_map
-        else:
-            self._gid_fire_events += spike_map
+        spike_maps = [GroupedMultiMap(gidvec, tvec) for tvec, gidvec in chunks]
+        if self._gid_fire_events is not None:
+            spike_maps.insert(0, self._gid_fire_events)
+        if not spike_maps:
+            spike_maps.append(GroupedMultiMap(numpy.empty(0, "uint32"), numpy.empty(0)))
+        self._gid_fire_events = GroupedMultiMap.merge(spike_maps)
 
     def __len__(self):
         return len(self._gid_fire_events)
@@ -139,28 +250,51 @@ class SpikeManager:
         """Returns a raw dict of pre_gid->spikes for the given pre gids."""
         return {key: self._gid_fire_events[key] for key in pre_gids}
 
+    def _iter_chunks(self, gid_offset=None):
+        """Iterates over the spikes as (gids, times) arrays, each with ~DUMP_CHUNK_SIZE spikes.
+        Chunks never split the spikes of a gid, and are only created as they are consumed.
+        """
+        spike_map = self._gid_fire_events
+        keys, offsets, all_times = spike_map.keys(), spike_map.offsets(), spike_map.flat_values()
+        if not len(keys):
+            return
+        chunk_ids = offsets[1:] // self.DUMP_CHUNK_SIZE
+        splits = numpy.flatnonzero(numpy.diff(chunk_ids)) + 1
+        for start, end in zip([0, *splits], [*splits, len(keys)]):
+            gids = numpy.repeat(keys[start:end], numpy.diff(offsets[start:end + 1]))
+            times = all_times[offsets[start]:offsets[end]]
+            if gid_offset:
+                gids = gids + gid_offset
+            yield gids, times
+
     def dump_ascii(self, f, gid_offset=None):
         """Writes the spikes out, in compat ascii format.
 
+        Spikes are formatted and written in chunks, to avoid holding the whole text in memory.
+
         Args:
             f: The file name or handle
+            gid_offset: An offset to add to the gids (e.g. of the population)
         """
-        gids, times = self._gid_fire_events.flatten().data()
-        if gid_offset:
-            log_verbose("dump_ascii: add offset %d to gids", gid_offset)
-            gids += gid_offset
-        expanded_ds = numpy.stack((times, gids), axis=-1)
-
         if isinstance(f, str):
             # If given a filename we assume a new file is wanted, with new header
             with open(f, "w") as fx:
                 fx.write("/scatter\n")
-                numpy.savetxt(fx, expanded_ds, fmt='%.3lf\t%d')
-        else:
-            # If given a file handle, user wants control so we directly dump
-            numpy.savetxt(f, expanded_ds, fmt='%.3lf\t%d')
+                return self.dump_ascii(fx, gid_offset)
 
-        log_verbose("Replay: Written %d entries", len(expanded_ds))
+        # If given a file handle, user wants control so we directly dump
+        if gid_offset:
+            log_verbose("dump_ascii: add offset %d to gids", gid_offset)
+        n_entries = 0
+        for gids, times in self._iter_chunks(gid_offset):
+            # Single formatting operation per chunk, much faster than numpy.savetxt
+            entries = numpy.empty(2 * len(times), dtype=object)
+            entries[0::2] = times.tolist()
+            entries[1::2] = gids.tolist()
+            f.write("%.3f\t%d\n" * len(times) % tuple(entries))
+            n_entries += len(times)
+
+        log_verbose("Replay: Written %d entries", n_entries)
 
 
 class MissingSpikesPopulationError(Exception):
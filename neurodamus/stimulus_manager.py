@@ -19,6 +19,8 @@
 """
 
 import logging
+import numpy
+from operator import attrgetter, methodcaller
 from .core import NeurodamusCore as Nd
 from .utils.logging import log_verbose
 from .core.configuration import SimConfig
@@ -94,6 +96,52 @@ class BaseStim:
     def __init__(self, _target, stim_info: dict, _cell_manager):
         self.duration = float(stim_info["Duration"])  # duration [ms]
         self.delay = float(stim_info["Delay"])        # start time [ms]
+        self._signal_cache = {}
+
+    def shared_source(self, factory, *args, **kw):
+        """Get the signal source built by factory(*args, **kw), reusing the one previously built
+        with the same arguments, so that it's played into all the respective clamps.
+
+        Only for deterministic signals, whose (time, amplitude) series depend solely on the
+        arguments. Memory then depends on the number of distinct signals, not the target size.
+        """
+        key = (factory, args, tuple(sorted(kw.items())))
+        source = self._signal_cache.get(key)
+        if source is None:
+            source = self._signal_cache[key] = factory(*args, **kw)
+            self.stimList.append(source)  # save source
+        return source
+
+    def compute_target_parameters(self, gids, cell_manager):
+        """Computes the cell-dependent stimulus parameters for all the target cells at once.
+
+        Returns: A dict of attribute name -> list of values, one per cell
+        """
+        return {}
+
+    @staticmethod
+    def cells_property(gids, cell_manager, param_name, getter):
+        """Gathers a numeric property of all the given cells into a numpy array.
+        Read in bulk from the nodes dynamics params if available, otherwise from each cell object
+        """
+        get_dynamics_params = getattr(cell_manager, "get_dynamics_params", None)
+        values = get_dynamics_params(param_name, gids) if get_dynamics_params else None
+        if values is None:
+            values = numpy.fromiter((getter(cell_manager.get_cell(gid)) for gid in gids),
+                                    dtype=float, count=len(gids))
+        return values
+
+    def iter_cell_parameters(self, tpoints, cell_manager):
+        """Iterates over the target points, setting the respective cell parameters as attributes.
+        Parameters are computed in bulk for the whole (local) target beforehand.
+        """
+        tpoints = list(tpoints)
+        gids = [tpoint_list.gid for tpoint_list in tpoints]
+        cell_params = self.compute_target_parameters(gids, cell_manager)
+        for i, tpoint_list in enumerate(tpoints):
+            for name, values in cell_params.items():
+                setattr(self, name, values[i])
+            yield tpoint_list
 
 
 @StimulusManager.register_type
@@ -120,11 +168,8 @@ class OrnsteinUhlenbeck(BaseStim):
 
         # apply stim to each point in target
         tpoints = target.getPointList(cell_manager)
-        for tpoint_list in tpoints:
+        for tpoint_list in self.iter_cell_parameters(tpoints, cell_manager):
             gid = tpoint_list.gid
-            cell = cell_manager.get_cell(gid)
-
-            self.compute_parameters(cell)
 
             for sec_id, sc in enumerate(tpoint_list.sclst):
                 # skip sections not in this split
@@ -182,10 +227,6 @@ class OrnsteinUhlenbeck(BaseStim):
 
         return True
 
-    def compute_parameters(self, cell):
-        # nothing to do
-        pass
-
 
 @StimulusManager.register_type
 class RelativeOrnsteinUhlenbeck(OrnsteinUhlenbeck):
@@ -203,26 +244,28 @@ class RelativeOrnsteinUhlenbeck(OrnsteinUhlenbeck):
         self.mean_perc = float(stim_info["MeanPercent"])
         self.sigma_perc = float(stim_info["SDPercent"])
 
-        if stim_info["Mode"] == "Current":
-            self.get_relative = lambda x: x.getThreshold()
-        else:
-            self.get_relative = lambda x: 1.0 / x.input_resistance
+        self.relative_to_threshold = stim_info["Mode"] == "Current"
 
         return True
 
-    def compute_parameters(self, cell):
+    def compute_target_parameters(self, gids, cell_manager):
         # threshold current [nA] or inverse input resistance [uS]
-        rel_prop = self.get_relative(cell)
+        if self.relative_to_threshold:
+            rel_props = self.cells_property(gids, cell_manager, "threshold_current",
+                                            methodcaller("getThreshold"))
+        else:
+            rel_props = 1.0 / self.cells_property(gids, cell_manager, "input_resistance",
+                                                  attrgetter("input_resistance"))
 
-        self.sigma = (self.sigma_perc / 100) * rel_prop  # signal stdev [nA or uS]
-        if self.sigma <= 0:
+        sigma = (self.sigma_perc / 100) * rel_props  # signal stdev [nA or uS]
+        if (sigma <= 0).any():
             raise Exception("%s standard deviation must be positive" % self.__class__.__name__)
 
-        self.mean = (self.mean_perc / 100) * rel_prop    # signal mean [nA or uS]
-        if self.mean < 0 and abs(self.mean) > 2 * self.sigma:
+        mean = (self.mean_perc / 100) * rel_props    # signal mean [nA or uS]
+        if ((mean < 0) & (abs(mean) > 2 * sigma)).any():
             logging.warning("%s signal is mostly zero" % self.__class__.__name__)
 
-        return True
+        return {"sigma": sigma.tolist(), "mean": mean.tolist()}
 
 
 @StimulusManager.register_type
@@ -250,11 +293,8 @@ class ShotNoise(BaseStim):
 
         # apply stim to each point in target
         tpoints = target.getPointList(cell_manager)
-        for tpoint_list in tpoints:
+        for tpoint_list in self.iter_cell_parameters(tpoints, cell_manager):
             gid = tpoint_list.gid
-            cell = cell_manager.get_cell(gid)
-
-            self.compute_parameters(cell)
 
             for sec_id, sc in enumerate(tpoint_list.sclst):
                 # skip sections not in this split
@@ -331,13 +371,10 @@ class ShotNoise(BaseStim):
 
         return self.rate > 0  # no-op if rate == 0
 
-    def compute_parameters(self, cell):
-        # nothing to do
-        pass
-
     def params_from_mean_var(self, mean, var):
         """
         Compute bi-exponential shot noise parameters from desired mean and variance of signal.
+        mean and var can be numpy arrays, computing the parameters of several cells at once.
 
         Analytical result derived from a generalization of Campbell's theorem present in
         Rice, S.O., "Mathematical Analysis of Random Noise", BSTJ 23, 3 Jul 1944.
@@ -389,20 +426,25 @@ class RelativeShotNoise(ShotNoise):
             raise Exception("%s amplitude CV must be positive" % self.__class__.__name__)
         self.cv_square = cv * cv
 
-        if stim_info["Mode"] == "Current":
-            self.get_relative = lambda x: x.getThreshold()
-        else:
-            self.get_relative = lambda x: 1.0 / x.input_resistance
+        self.relative_to_threshold = stim_info["Mode"] == "Current"
 
         return self.mean_perc != 0  # no-op if mean_perc == 0
 
-    def compute_parameters(self, cell):
+    def compute_target_parameters(self, gids, cell_manager):
         # threshold current [nA] or inverse input resistance [uS]
-        rel_prop = self.get_relative(cell)
-        mean = self.mean_perc / 100 * rel_prop  # desired mean [nA or uS]
-        sd = self.sd_perc / 100 * rel_prop      # desired standard deviation [nA or uS]
-        var = sd * sd                           # variance [nA^2 or uS^2]
+        if self.relative_to_threshold:
+            rel_props = self.cells_property(gids, cell_manager, "threshold_current",
+                                            methodcaller("getThreshold"))
+        else:
+            rel_props = 1.0 / self.cells_property(gids, cell_manager, "input_resistance",
+                                                  attrgetter("input_resistance"))
+        mean = self.mean_perc / 100 * rel_props  # desired mean [nA or uS]
+        sd = self.sd_perc / 100 * rel_props      # desired standard deviation [nA or uS]
+        var = sd * sd                            # variance [nA^2 or uS^2]
         super().params_from_mean_var(mean, var)
+        return {"rate": self.rate.tolist(),
+                "amp_mean": self.amp_mean.tolist(),
+                "amp_var": self.amp_var.tolist()}
 
 
 @StimulusManager.register_type
@@ -437,8 +479,9 @@ class AbsoluteShotNoise(ShotNoise):
 
         return True
 
-    def compute_parameters(self, cell):
-        super().params_from_mean_var(self.mean, self.sd * self.sd)
+    def compute_target_parameters(self, gids, cell_manager):
+        super().params_from_mean_var(self.mean, self.sd * self.sd)  # same for all cells
+        return {}
 
 
 @StimulusManager.register_type
@@ -456,23 +499,17 @@ class Linear(BaseStim):
 
         # apply stim to each point in target
         tpoints = target.getPointList(cell_manager)
-        for tpoint_list in tpoints:
-            gid = tpoint_list.gid
-            cell = cell_manager.get_cell(gid)
-
-            self.compute_parameters(cell)
-
+        for tpoint_list in self.iter_cell_parameters(tpoints, cell_manager):
             for sec_id, sc in enumerate(tpoint_list.sclst):
                 # skip sections not in this split
                 if not sc.exists():
                     continue
 
-                # generate ramp current source
-                cs = CurrentSource.ramp(self.amp_start, self.amp_end, self.duration,
-                                        delay=self.delay)
+                # generate ramp current source, shared by points with the same amplitudes
+                cs = self.shared_source(CurrentSource.ramp, self.amp_start, self.amp_end,
+                                        self.duration, delay=self.delay)
                 # attach current source to section
                 cs.attach_to(sc.sec, tpoint_list.x[sec_id])
-                self.stimList.append(cs)  # save CurrentSource
 
     def parse_check_all_parameters(self, stim_info: dict):
         # Amplitude at start
@@ -483,9 +520,6 @@ class Linear(BaseStim):
 
         return self.amp_start != 0 or self.amp_end != 0  # no-op if both 0
 
-    def compute_parameters(self, cell):
-        pass  # nothing to do
-
 
 @StimulusManager.register_type
 class Hyperpolarizing(Linear):
@@ -498,10 +532,10 @@ class Hyperpolarizing(Linear):
     def parse_check_all_parameters(self, stim_info: dict):
         return True
 
-    def compute_parameters(self, cell):
-        hypamp = cell.getHypAmp()
-        self.amp_start = hypamp
-        self.amp_end = hypamp
+    def compute_target_parameters(self, gids, cell_manager):
+        hypamps = self.cells_property(gids, cell_manager, "holding_current",
+                                      methodcaller("getHypAmp")).tolist()
+        return {"amp_start": hypamps, "amp_end": hypamps}
 
 
 @StimulusManager.register_type
@@ -521,11 +555,12 @@ class RelativeLinear(Linear):
 
         return self.perc_start != 0 or self.perc_end != 0  # no-op if both 0
 
-    def compute_parameters(self, cell):
-        threshold = cell.getThreshold()
+    def compute_target_parameters(self, gids, cell_manager):
+        thresholds = self.cells_property(gids, cell_manager, "threshold_current",
+                                         methodcaller("getThreshold"))
         # here we use parentheses to match HOC exactly
-        self.amp_start = threshold * (self.perc_start / 100)
-        self.amp_end = threshold * (self.perc_end / 100)
+        return {"amp_start": (thresholds * (self.perc_start / 100)).tolist(),
+                "amp_end": (thresholds * (self.perc_end / 100)).tolist()}
 
 
 @StimulusManager.register_type
@@ -542,11 +577,12 @@ class SubThreshold(Linear):
 
         return True
 
-    def compute_parameters(self, cell):
-        threshold = cell.getThreshold()
+    def compute_target_parameters(self, gids, cell_manager):
+        thresholds = self.cells_property(gids, cell_manager, "threshold_current",
+                                         methodcaller("getThreshold"))
         # here we use parentheses to match HOC exactly
-        self.amp_start = threshold * (100 - self.perc_less) / 100
-        self.amp_end = self.amp_start
+        amps = (thresholds * (100 - self.perc_less) / 100).tolist()
+        return {"amp_start": amps, "amp_end": amps}
 
 
 @StimulusManager.register_type
@@ -582,16 +618,16 @@ class Noise(BaseStim):
 
         # apply stim to each point in target
         tpoints = target.getPointList(cell_manager)
-        for tpoint_list in tpoints:
+        for tpoint_list in self.iter_cell_parameters(tpoints, cell_manager):
             gid = tpoint_list.gid
-            cell = cell_manager.get_cell(gid)
-
-            self.compute_parameters(cell)
 
             rng = rand(gid)  # setup RNG
             # draw already used numbers
             if rng_mode != SimConfig.rng_info.COMPATIBILITY and self.delay > 0:
-                self.draw_already_used_numbers(rng, sim_dt)
+                if SimConfig.noise_rng_skip_ahead:
+                    random.skip_ahead(rng, sum(self.already_used_numbers(sim_dt)))
+                else:
+                    self.draw_already_used_numbers(rng, sim_dt)
 
             for sec_id, sc in enumerate(tpoint_list.sclst):
                 # skip sections not in this split
@@ -631,15 +667,21 @@ class Noise(BaseStim):
 
         return True
 
-    def compute_parameters(self, cell):
-        if self.is_relative:
-            threshold = cell.getThreshold()  # threshold current [nA]
-            # here threshold MUST be first factor to match HOC exactly
-            self.mean = threshold * self.mean_perc / 100
-            # note that here variance has units of nA, not nA^2
-            self.var = threshold * self.var_perc / 100
-
-    def draw_already_used_numbers(self, rng, dt):
+    def compute_target_parameters(self, gids, cell_manager):
+        if not self.is_relative:
+            return {}
+        # threshold current [nA]
+        thresholds = self.cells_property(gids, cell_manager, "threshold_current",
+                                         methodcaller("getThreshold"))
+        # here threshold MUST be first factor to match HOC exactly
+        # note that here variance has units of nA, not nA^2
+        return {"mean": (thresholds * self.mean_perc / 100).tolist(),
+                "var": (thresholds * self.var_perc / 100).tolist()}
+
+    def already_used_numbers(self, dt):
+        """Yields the amount of random numbers used by each stimulus block before the delay,
+        as in the original HOC implementation, where a noise signal would start at time 0.
+        """
         prev_t = 0
         tstep = self.duration - dt
 
@@ -649,13 +691,20 @@ class Noise(BaseStim):
             else:
                 next_t = self.delay - dt
 
-            tvec = Nd.h.Vector()
-            tvec.indgen(prev_t, next_t, self.dt)
-            stim = Nd.h.Vector(len(tvec))
-            stim.setrand(rng)
+            # Same length as Vector.indgen(prev_t, next_t, self.dt)
+            yield int((next_t - prev_t) / self.dt + 1e-9) + 1
 
             prev_t = next_t + dt
 
+    def draw_already_used_numbers(self, rng, dt):
+        """Advances the RNG by drawing (and discarding) the numbers used before the delay.
+        This is the compatibility behavior. Its cost grows with the delay, therefore the
+        `NoiseRNGSkipAhead` option positions the stream directly instead.
+        """
+        for n_numbers in self.already_used_numbers(dt):
+            stim = Nd.h.Vector(n_numbers)
+            stim.setrand(rng)
+
 
 @StimulusManager.register_type
 class Pulse(BaseStim):
@@ -678,12 +727,11 @@ class Pulse(BaseStim):
                 if not sc.exists():
                     continue
 
-                # generate pulse train current source
-                cs = CurrentSource.train(self.amp, self.freq, self.width,
-                                         self.duration, delay=self.delay)
+                # generate pulse train current source (shared, identical for all points)
+                cs = self.shared_source(CurrentSource.train, self.amp, self.freq, self.width,
+                                        self.duration, delay=self.delay)
                 # attach current source to section
                 cs.attach_to(sc.sec, tpoint_list.x[sec_id])
-                self.stimList.append(cs)  # save CurrentSource
 
     def parse_check_all_parameters(self, stim_info: dict):
         self.amp = float(stim_info["AmpStart"])  # amplitude [nA]
@@ -714,12 +762,11 @@ class Sinusoidal(BaseStim):
                 if not sc.exists():
                     continue
 
-                # generate sinusoidal current source
-                cs = CurrentSource.sin(self.amp, self.duration, self.freq,
-                                       step=self.dt, delay=self.delay)
+                # generate sinusoidal current source (shared, identical for all points)
+                cs = self.shared_source(CurrentSource.sin, self.amp, self.duration, self.freq,
+                                        step=self.dt, delay=self.delay)
                 # attach current source to section
                 cs.attach_to(sc.sec, tpoint_list.x[sec_id])
-                self.stimList.append(cs)  # save CurrentSource
 
     def parse_check_all_parameters(self, stim_info: dict):
         self.dt = float(stim_info.get("Dt", 0.025))  # stimulus timestep [ms]
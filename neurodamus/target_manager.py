@@ -1,8 +1,8 @@
+import hashlib
 import itertools
 import logging
 import os.path
 from abc import ABCMeta, abstractmethod
-from functools import lru_cache
 from typing import List
 
 import libsonata
@@ -12,6 +12,7 @@ from .core import MPI, NeurodamusCore as Nd
 from .core.configuration import ConfigurationError, SimConfig, GlobalConfig, find_input_file
 from .core.nodeset import _NodeSetBase, NodeSet, SelectionNodeSet
 from .utils import compat
+from .utils.bitmap import RoaringBitmap
 from .utils.logging import log_verbose
 
 
@@ -101,6 +102,9 @@ class TargetManager:
             self.parser.isVerbose = 1
         # A list of the local node sets
         self.local_nodes = []
+        # Memoized target overlap queries. Invalidated whenever targets or local nodes change
+        self._intersecting_cache = {}
+        self._pathways_cache = {}
 
     @classmethod
     def _init_nodesets(cls, run_conf):
@@ -111,7 +115,8 @@ class TargetManager:
             if target_file.endswith(".json"):
                 simulation_nodesets_file = target_file
         return (config_nodeset_file or simulation_nodesets_file) and \
-               NodeSetReader(config_nodeset_file, simulation_nodesets_file)
+               NodeSetReader(config_nodeset_file, simulation_nodesets_file,
+                             cache_dir=SimConfig.nodesets_cache_dir)
 
     def load_targets(self, circuit):
         """Provided that the circuit location is known and whether a user.target file has been
@@ -159,6 +164,8 @@ class TargetManager:
         return NodesetTarget(TargetSpec.GLOBAL_TARGET_NAME, [])
 
     def register_target(self, target):
+        if target.name in self._targets:
+            self._clear_overlap_cache()  # Replacing a target, whose overlaps may be memoized
         self._targets[target.name] = target
         hoc_target = target.get_hoc_target()
         if hoc_target:
@@ -168,9 +175,15 @@ class TargetManager:
         """Registers the local nodes so that targets can be scoped to current rank"""
         self.local_nodes.append(local_nodes)
         self.parser.updateTargets(local_nodes.final_gids(), 1)
+        self._clear_overlap_cache()
+
+    def _clear_overlap_cache(self):
+        self._intersecting_cache.clear()
+        self._pathways_cache.clear()
 
     def clear_simulation_data(self):
         self.local_nodes.clear()
+        self._clear_overlap_cache()
         self.parser.updateTargets(Nd.Vector(), 0)
         self.init_hoc_manager(None)  # Init/release cell manager
 
@@ -245,9 +258,17 @@ class TargetManager:
             return hoc_obj.getPointList(cell_manager)
         return target.getPointList(cell_manager, **kw)
 
-    @lru_cache()
     def intersecting(self, target1, target2):
-        """Checks whether two targets intersect"""
+        """Checks whether two targets intersect.
+        Results are memoized (regardless of the arguments order) until targets change
+        """
+        key = frozenset((target1, target2))
+        result = self._intersecting_cache.get(key)
+        if result is None:
+            result = self._intersecting_cache[key] = bool(self._intersecting(target1, target2))
+        return result
+
+    def _intersecting(self, target1, target2):
         target1_spec = TargetSpec(target1)
         target2_spec = TargetSpec(target2)
         if target1_spec.disjoint_populations(target2_spec):
@@ -268,11 +289,21 @@ class TargetManager:
         return t1.intersects(t2)  # Otherwise go with full gid intersection
 
     def pathways_overlap(self, conn1, conn2, equal_only=False):
+        """Checks whether the pathways (Source -> Destination) of two connection blocks overlap.
+        Results are memoized by target names so that connection-block loops remain cheap
+        """
         src1, dst1 = conn1["Source"], conn1["Destination"]
         src2, dst2 = conn2["Source"], conn2["Destination"]
-        if equal_only:
-            return TargetSpec(src1) == TargetSpec(src2) and TargetSpec(dst1) == TargetSpec(dst2)
-        return self.intersecting(src1, src2) and self.intersecting(dst1, dst2)
+        key = (src1, dst1, src2, dst2, equal_only)
+        result = self._pathways_cache.get(key)
+        if result is None:
+            if equal_only:
+                result = (TargetSpec(src1) == TargetSpec(src2)
+                          and TargetSpec(dst1) == TargetSpec(dst2))
+            else:
+                result = self.intersecting(src1, src2) and self.intersecting(dst1, dst2)
+            self._pathways_cache[key] = result
+        return result
 
     def __getattr__(self, item):
         logging.debug("Compat interface to TargetManager::" + item)
@@ -282,24 +313,45 @@ class TargetManager:
 class NodeSetReader:
     """
     Implements reading Sonata Nodesets
+
+    Materialized selections are cached (as ranges) by node sets files hash, node set name and
+    population. They are computed on rank 0 and broadcast, and optionally persisted in a cache
+    directory for reuse in later runs.
     """
 
-    def __init__(self, config_nodeset_file, simulation_nodesets_file):
+    def __init__(self, config_nodeset_file, simulation_nodesets_file, cache_dir=None):
         def _load_nodesets_from_file(nodeset_file):
             if not nodeset_file:
                 return libsonata.NodeSets("{}")
             return libsonata.NodeSets.from_file(nodeset_file)
         self._population_stores = {}
+        self._population_stamps = {}
         self.nodesets = _load_nodesets_from_file(config_nodeset_file)
         simulation_nodesets = _load_nodesets_from_file(simulation_nodesets_file)
         duplicate_nodesets = self.nodesets.update(simulation_nodesets)
         if duplicate_nodesets:
             logging.warning("Some node set rules were replaced from %s", simulation_nodesets_file)
+        self._nodesets_hash = self._hash_files(config_nodeset_file, simulation_nodesets_file)
+        self._cache_dir = cache_dir
+        self._materialized = {}  # cache key -> ranges array (or None when not materializable)
+
+    @staticmethod
+    def _hash_files(*files):
+        digest = hashlib.sha256()
+        for file_name in files:
+            if file_name:
+                with open(file_name, "rb") as f:
+                    digest.update(f.read())
+            digest.update(b"\0")
+        return digest.hexdigest()
 
     def register_node_file(self, node_file):
         storage = libsonata.NodeStorage(node_file)
+        stat = os.stat(node_file)
         for pop_name in storage.population_names:
             self._population_stores[pop_name] = storage
+            self._population_stamps[pop_name] = (os.path.abspath(node_file), stat.st_size,
+                                                 stat.st_mtime_ns)
 
     def __contains__(self, nodeset_name):
         return nodeset_name in self.nodesets.names
@@ -316,33 +368,68 @@ class NodeSetReader:
         if nodeset_name not in self.nodesets.names:
             return None
 
-        def _get_nodeset(pop_name):
-            storage = self._population_stores.get(pop_name)
-            population = storage.open_population(pop_name)
-            # Create NodeSet object with 1-based gids
-            try:
-                node_selection = self.nodesets.materialize(nodeset_name, population)
-            except libsonata.SonataError as e:
-                logging.warning("SonataError for nodeset %s from population \"%s\" : %s, skip"
-                                % (nodeset_name, pop_name, str(e)))
-                return None
-            if node_selection:
+        pop_ranges = MPI.py_broadcast_call(
+            lambda: {pop_name: self._get_ranges(nodeset_name, pop_name)
+                     for pop_name in self._population_stores}
+        )
+
+        nodesets = []
+        for pop_name, ranges in pop_ranges.items():
+            if ranges is not None and len(ranges):
                 logging.debug("Nodeset %s: Appending gis from %s", nodeset_name, pop_name)
-                ns = SelectionNodeSet(node_selection)
+                ns = SelectionNodeSet(libsonata.Selection(ranges))
                 ns.register_global(pop_name)
-                return ns
-            return None
-
-        nodesets = (_get_nodeset(pop_name) for pop_name in self._population_stores)
-        nodesets = [ns for ns in nodesets if ns]
+                nodesets.append(ns)
         return NodesetTarget(nodeset_name, nodesets)
 
+    def _cache_key(self, nodeset_name, pop_name):
+        key = repr((self._nodesets_hash, nodeset_name, pop_name,
+                    self._population_stamps.get(pop_name)))
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _get_ranges(self, nodeset_name, pop_name):
+        """Get the materialized selection ranges, from the cache if available"""
+        key = self._cache_key(nodeset_name, pop_name)
+        if key in self._materialized:
+            return self._materialized[key]
+
+        cache_file = self._cache_dir and os.path.join(self._cache_dir, key + ".npy")
+        if cache_file and os.path.isfile(cache_file):
+            log_verbose("Nodeset %s (%s): Loading cached selection", nodeset_name, pop_name)
+            ranges = numpy.load(cache_file)
+        else:
+            ranges = self._materialize(nodeset_name, pop_name)
+            if cache_file and ranges is not None:
+                os.makedirs(self._cache_dir, exist_ok=True)
+                tmp_file = "{}.{}.tmp.npy".format(cache_file[:-4], os.getpid())
+                numpy.save(tmp_file, ranges)
+                os.replace(tmp_file, cache_file)  # atomic, concurrent runs may share the cache
+
+        self._materialized[key] = ranges
+        return ranges
+
+    def _materialize(self, nodeset_name, pop_name):
+        storage = self._population_stores.get(pop_name)
+        population = storage.open_population(pop_name)
+        try:
+            node_selection = self.nodesets.materialize(nodeset_name, population)
+        except libsonata.SonataError as e:
+            logging.warning("SonataError for nodeset %s from population \"%s\" : %s, skip"
+                            % (nodeset_name, pop_name, str(e)))
+            return None
+        return numpy.array(node_selection.ranges, dtype="int64").reshape(-1, 2)
+
 
 class _TargetInterface(metaclass=ABCMeta):
     """
     Methods that target/target wrappers should implement
     """
 
+    BITMAP_MIN_SIZE = 100_000
+    """Targets at least this large answer membership queries via a compressed gid bitmap"""
+
+    _bitmaps = None  # {raw_gids: (gids_version, RoaringBitmap)}, set on first use
+
     @abstractmethod
     def gid_count(self):
         return NotImplemented
@@ -387,6 +474,10 @@ class _TargetInterface(metaclass=ABCMeta):
         if not self.gid_count():
             return ([False] * len(items)) if hasattr(items, "__len__") else False
 
+        if self.gid_count() >= self.BITMAP_MIN_SIZE:
+            bitmap = self.get_bitmap(raw_gids)
+            return bitmap.contains(items) if numpy.ndim(items) else items in bitmap
+
         gids = self.get_raw_gids() if raw_gids else self.get_gids()
         pos = numpy.searchsorted(gids, items)
         if pos.ndim == 0:
@@ -395,6 +486,24 @@ class _TargetInterface(metaclass=ABCMeta):
             pos[pos == len(gids)] = 0  # arbitrarily change to valid pos
             return gids[pos] == items
 
+    def get_bitmap(self, raw_gids=False):
+        """A compressed bitmap of the target gids (final by default).
+        It's cached until the target gids (or their offsets) change
+        """
+        if self._bitmaps is None:
+            self._bitmaps = {}
+        version = self._gids_version()
+        cached = self._bitmaps.get(raw_gids)
+        if cached is None or cached[0] != version:
+            gids = self.get_raw_gids() if raw_gids else self.get_gids()
+            cached = self._bitmaps[raw_gids] = (version, RoaringBitmap.from_array(gids))
+        return cached[1]
+
+    @abstractmethod
+    def _gids_version(self):
+        """A cheap key which changes whenever the gids of the target change"""
+        return NotImplemented
+
     def intersects(self, other):
         """ Check if two targets intersect. At least one common population has to intersect
         """
@@ -500,6 +609,14 @@ class NodesetTarget(_TargetInterface, _HocTargetInterface):
     def append_nodeset(self, nodeset: NodeSet):
         self.nodesets.append(nodeset)
 
+    def get_bitmap(self, raw_gids=False):
+        if len(self.nodesets) == 1 and (raw_gids or not self.nodesets[0].offset):
+            return self.nodesets[0].raw_gids_bitmap()  # cached in the nodeset itself
+        return super().get_bitmap(raw_gids)
+
+    def _gids_version(self):
+        return tuple((id(ns), ns.offset, len(ns)) for ns in self.nodesets)
+
     @property
     def population_names(self):
         return {ns.population_name for ns in self.nodesets}
@@ -649,6 +766,9 @@ class _HocTarget(_TargetInterface):
     def get_hoc_target(self):
         return self.hoc_target
 
+    def _gids_version(self):
+        return id(self.get_raw_gids()), self.offset
+
     def gids(self):
         """This target gids on this rank, with offset"""
         return self.hoc_target.gids()
@@ -0,0 +1,215 @@
+"""
+A compressed bitmap for sets of gids, following the Roaring layout, in pure NumPy
+"""
+import numpy as np
+
+
+class RoaringBitmap:
+    """A compressed set of unsigned 32-bit integers.
+
+    Values are partitioned in chunks sharing the same 16 high bits. Each chunk keeps its
+    16 low bits either as a sorted array (sparse chunks) or as a 65536-bit bitmap (dense
+    chunks), so that membership is O(1) and union/intersection/cardinality work chunk-wise
+    instead of value-wise.
+    """
+    __slots__ = ("_keys", "_containers", "_cards", "_index")
+
+    ARRAY_MAX_SIZE = 4096
+    """Chunks with more values than this are stored as bitmaps"""
+
+    def __init__(self, keys=(), containers=(), cards=()):
+        """Low-level constructor. Please use `from_array` to build a bitmap from values"""
+        self._keys = np.asarray(keys, dtype="uint32")
+        self._containers = list(containers)
+        self._cards = np.asarray(cards, dtype="int64")
+        self._index = {key: i for i, key in enumerate(self._keys.tolist())}
+
+    @classmethod
+    def from_array(cls, values, presorted=False):
+        """Build a bitmap from an array of values
+
+        Args:
+            values: The values to store. Must fit in uint32
+            presorted: Whether values are known to be sorted and unique (e.g. flattened ranges)
+        """
+        values = np.asarray(values, dtype="uint32")
+        if not presorted:
+            values = np.unique(values)
+        if not len(values):
+            return cls()
+        keys, starts = np.unique(values >> 16, return_index=True)
+        ends = np.append(starts[1:], len(values))
+        lows = (values & 0xFFFF).astype("uint16")
+        containers = [cls._make_container(lows[s:e]) for s, e in zip(starts, ends)]
+        return cls(keys, containers, ends - starts)
+
+    @classmethod
+    def _make_container(cls, lows):
+        return lows if len(lows) <= cls.ARRAY_MAX_SIZE else _as_bitmap(lows)
+
+    @classmethod
+    def _normalize(cls, container, card):
+        """Ensures a container uses the storage adequate for its cardinality"""
+        if _is_bitmap(container) and card <= cls.ARRAY_MAX_SIZE:
+            return _bitmap_values(container)
+        if not _is_bitmap(container) and card > cls.ARRAY_MAX_SIZE:
+            return cls._make_container(container)
+        return container
+
+    def __len__(self):
+        return int(self._cards.sum())
+
+    cardinality = __len__
+
+    def __contains__(self, value):
+        i = self._index.get(int(value) >> 16)
+        if i is None:
+            return False
+        container = self._containers[i]
+        low = int(value) & 0xFFFF
+        if _is_bitmap(container):
+            return bool((int(container[low >> 6]) >> (low & 63)) & 1)
+        pos = np.searchsorted(container, low)
+        return bool(pos < len(container) and container[pos] == low)
+
+    def contains(self, values):
+        """Vectorized membership test. Returns an array of bools, one per value"""
+        values = np.asarray(values, dtype="uint32")
+        result = np.zeros(values.shape, dtype=bool)
+        if not len(self._keys) or not values.size:
+            return result
+        flat_values = values.ravel()
+        flat_result = result.ravel()
+        pos = np.searchsorted(self._keys, flat_values >> 16)
+        pos[pos == len(self._keys)] = 0  # arbitrarily change to valid pos
+        candidates = np.flatnonzero(self._keys[pos] == (flat_values >> 16))
+        order = candidates[np.argsort(pos[candidates], kind="stable")]
+        groups, group_starts = np.unique(pos[order], return_index=True)
+        for i, group_idxs in zip(groups, np.split(order, group_starts[1:])):
+            lows = (flat_values[group_idxs] & 0xFFFF).astype("uint16")
+            flat_result[group_idxs] = _container_contains(self._containers[i], lows)
+        return result
+
+    def intersection(self, other):
+        """Returns a new bitmap with the values present in both bitmaps"""
+        common, idx1, idx2 = np.intersect1d(self._keys, other._keys, assume_unique=True,
+                                            return_indices=True)
+        keys, containers, cards = [], [], []
+        for key, i1, i2 in zip(common, idx1, idx2):
+            container, card = _container_and(self._containers[i1], other._containers[i2])
+            if card:
+                keys.append(key)
+                containers.append(self._normalize(container, card))
+                cards.append(card)
+        return RoaringBitmap(keys, containers, cards)
+
+    def union(self, other):
+        """Returns a new bitmap with the values present in any of the bitmaps"""
+        keys = np.union1d(self._keys, other._keys)
+        containers, cards = [], []
+        for key in keys.tolist():
+            i1, i2 = self._index.get(key), other._index.get(key)
+            if i2 is None:
+                container, card = self._containers[i1], self._cards[i1]
+            elif i1 is None:
+                container, card = other._containers[i2], other._cards[i2]
+            else:
+                container, card = _container_or(self._containers[i1], other._containers[i2])
+                container = self._normalize(container, card)
+            containers.append(container)
+            cards.append(card)
+        return RoaringBitmap(keys, containers, cards)
+
+    __and__ = intersection
+    __or__ = union
+
+    def intersects(self, other):
+        """Checks whether there's at least a common value, stopping at the first found"""
+        common, idx1, idx2 = np.intersect1d(self._keys, other._keys, assume_unique=True,
+                                            return_indices=True)
+        for i1, i2 in zip(idx1, idx2):
+            c1, c2 = self._containers[i1], other._containers[i2]
+            if _is_bitmap(c1) and _is_bitmap(c2):
+                if np.any(c1 & c2):
+                    return True
+            elif _is_bitmap(c1) or _is_bitmap(c2):
+                array, bitmap = (c2, c1) if _is_bitmap(c1) else (c1, c2)
+                if _container_contains(bitmap, array).any():
+                    return True
+            elif len(np.intersect1d(c1, c2, assume_unique=True)):
+                return True
+        return False
+
+    def to_array(self):
+        """The sorted array of values in the bitmap"""
+        if not len(self._keys):
+            return np.empty(0, dtype="uint32")
+        return np.concatenate([
+            (np.uint32(key) << 16) | _container_values(container).astype("uint32")
+            for key, container in zip(self._keys, self._containers)
+        ])
+
+    def __eq__(self, other):
+        return (np.array_equal(self._keys, other._keys)
+                and np.array_equal(self._cards, other._cards)
+                and all(np.array_equal(_container_values(c1), _container_values(c2))
+                        for c1, c2 in zip(self._containers, other._containers)))
+
+    def __repr__(self):
+        return "<RoaringBitmap: %d values in %d chunks>" % (len(self), len(self._keys))
+
+
+# Container helpers. Containers are either uint16 sorted arrays or uint64 bitmaps
+
+def _is_bitmap(container):
+    return container.dtype == np.uint64
+
+
+def _bitmap_values(bitmap):
+    bits = np.unpackbits(bitmap.view("uint8"), bitorder="little")
+    return np.flatnonzero(bits).astype("uint16")
+
+
+def _container_values(container):
+    return _bitmap_values(container) if _is_bitmap(container) else container
+
+
+def _popcount(bitmap):
+    return int(np.unpackbits(bitmap.view("uint8")).sum())
+
+
+def _container_contains(container, lows):
+    if _is_bitmap(container):
+        lows = lows.astype("uint64")
+        return ((container[lows >> 6] >> (lows & 63)) & 1).astype(bool)
+    pos = np.searchsorted(container, lows)
+    pos[pos == len(container)] = 0
+    return container[pos] == lows
+
+
+def _container_and(c1, c2):
+    if _is_bitmap(c1) and _is_bitmap(c2):
+        bitmap = c1 & c2
+        return bitmap, _popcount(bitmap)
+    if _is_bitmap(c1) or _is_bitmap(c2):
+        array, bitmap = (c2, c1) if _is_bitmap(c1) else (c1, c2)
+        values = array[_container_contains(bitmap, array)]
+    else:
+        values = np.intersect1d(c1, c2, assume_unique=True)
+    return values, len(values)
+
+
+def _container_or(c1, c2):
+    if _is_bitmap(c1) or _is_bitmap(c2):
+        bitmap = _as_bitmap(c1) | _as_bitmap(c2)
+        return bitmap, _popcount(bitmap)
+    values = np.union1d(c1, c2)
+    return values, len(values)
+
+
+def _as_bitmap(container):
+    if _is_bitmap(container):
+        return container
+    bits = np.zeros(1 << 16, dtype=bool)
+    bits[container] = True
+    return np.packbits(bits, bitorder="little").view("<u8")
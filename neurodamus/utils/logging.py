@@ -18,9 +18,15 @@ _logging.addLevelName(VERBOSE_LOGLEVEL, "VERB")
 _logging.VERBOSE = VERBOSE_LOGLEVEL
 
 
+_stage_hooks = []
+"""Callables to be invoked with the stage name on every log_stage, e.g. profilers"""
+
+
 def log_stage(msg, *args):
     """Shortcut to log a messge with the STAGE level"""
     _logging.log(STAGE_LOGLEVEL, msg, *args)
+    for hook in _stage_hooks:
+        hook(msg % args if args else msg)
 
 
 def log_verbose(msg, *args):
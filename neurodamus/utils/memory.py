@@ -1,7 +1,7 @@
 """
 Collection of utility functions related to clearing the used memory in neurodamus-py or NEURON
 """
-from collections import Counter
+from collections import Counter, defaultdict
 import ctypes
 import ctypes.util
 import logging
@@ -10,6 +10,11 @@ import os
 import json
 import psutil
 import multiprocessing
+import resource
+import hashlib
+import heapq
+import socket
+import tracemalloc
 
 from ..core import MPI, NeurodamusCore as Nd, run_only_rank0
 
@@ -79,11 +84,6 @@ def print_node_level_mem_usage():
     """Print statistics of the memory usage per compute node."""
     from ..core._shmutils import SHMUtil
 
-    # The association of MPI ranks to compute nodes isn't
-    # always know. If unknown, don't print anything.
-    if not SHMUtil.is_node_id_known():
-        return
-
     rss = SHMUtil.get_nodewise_rss()
 
     min_usage_mb = np.min(rss) / 2**20
@@ -147,6 +147,136 @@ def get_mem_usage_kb():
     return usage_kb
 
 
+class _MemoryProfiler:
+    """Records the memory usage of the rank at stage boundaries and inside long loops.
+
+    For each stage keeps the RSS, peak RSS (VmHWM) and the memory allocated by Python, as
+    traced by tracemalloc (started when enabled). Stages logged with log_stage are recorded
+    both when they start and when they end, i.e. when the next one starts. Recording is local
+    (not collective) and a stage recorded several times, e.g. in a loop, keeps its highest
+    values, so that memory is bounded.
+    Stats across ranks and nodes are only computed in `export_report` (collective).
+    """
+    def __init__(self):
+        self._stages = {}  # stage -> [rss, peak_rss, python_heap] in bytes
+        self._enabled = False
+        self._process = None
+        self._current_stage = None
+
+    enabled = property(lambda self: self._enabled)
+
+    def enable(self):
+        """Start recording memory at every log_stage, as well as on explicit `record` calls.
+
+        Starts tracemalloc to measure the Python heap, which slows down Python allocations
+        and takes some extra memory per allocated block
+        """
+        from .logging import _stage_hooks
+        if not self._enabled:
+            self._enabled = True
+            self._process = psutil.Process(os.getpid())
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            _stage_hooks.append(self._next_stage)
+
+    def _next_stage(self, stage):
+        if self._current_stage is not None:
+            self.record(self._current_stage)
+        self._current_stage = stage.strip(" =")
+        self.record(self._current_stage)
+
+    def record(self, stage):
+        """Records the current memory usage under the given stage name. No-op if disabled"""
+        if not self._enabled:
+            return
+        rss = self._process.memory_info().rss
+        peak_rss = max(get_peak_rss(), rss)  # kernel hwm counters may lag slightly
+        py_heap = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else -1
+        sample = self._stages.get(stage)
+        if sample is None:
+            self._stages[stage] = [rss, peak_rss, py_heap]
+        else:
+            sample[:] = map(max, sample, (rss, peak_rss, py_heap))
+
+    def gather_stats(self):
+        """Aggregates the recorded stages across ranks and nodes. Collective.
+
+        Returns: (in rank 0 only) A dict stage -> stats, ordered by first appearance. Values in MB
+        """
+        local_data = (socket.gethostname(), self._stages)
+        all_data = MPI.py_gather(local_data, 0) if MPI.size > 1 else [local_data]
+        if MPI.rank != 0:
+            return None
+
+        hosts = [host for host, _ in all_data]
+        stage_names = dict.fromkeys(name for _, stages in all_data for name in stages)
+        report = {}
+        for stage in stage_names:
+            ranks = [rank for rank, (_, stages) in enumerate(all_data) if stage in stages]
+            values = np.array([all_data[rank][1][stage] for rank in ranks]) / 2**20
+            stage_stats = {"ranks": len(ranks)}
+            for i, key in enumerate(("rss_mb", "peak_rss_mb", "python_heap_mb")):
+                if key == "python_heap_mb" and (values[:, i] < 0).any():
+                    continue  # tracemalloc stopped (by someone else)
+                stage_stats[key] = _min_max_mean(values[:, i], "max_rank", ranks)
+            node_rss = {}
+            for rank, rss in zip(ranks, values[:, 0]):
+                node_rss[hosts[rank]] = node_rss.get(hosts[rank], 0) + rss
+            stage_stats["node_rss_mb"] = _min_max_mean(
+                np.fromiter(node_rss.values(), float), "max_node", list(node_rss))
+            report[stage] = stage_stats
+        return report
+
+    def export_report(self, filename):
+        """Writes the memory report of all ranks and nodes to a JSON file. Collective.
+        Additionally logs the stages holding the highest node and rank memory.
+        """
+        if self._current_stage is not None:
+            self.record(self._current_stage)  # close the ongoing stage
+        report = self.gather_stats()
+        if MPI.rank != 0 or not report:
+            return
+        node_peak_stage = max(report, key=lambda s: report[s]["node_rss_mb"]["max"])
+        rank_peak_stage = max(report, key=lambda s: report[s]["rss_mb"]["max"])
+        node_peak = report[node_peak_stage]["node_rss_mb"]
+        rank_peak = report[rank_peak_stage]["rss_mb"]
+        summary = {
+            "node_peak": {"stage": node_peak_stage, "node": node_peak["max_node"],
+                          "rss_mb": node_peak["max"]},
+            "rank_peak": {"stage": rank_peak_stage, "rank": rank_peak["max_rank"],
+                          "rss_mb": rank_peak["max"]},
+        }
+        with open(filename, "w") as f:
+            json.dump({"summary": summary, "stages": report}, f, indent=2)
+        logging.info("Memory peak per node: %s at stage '%s' (node %s)",
+                     pretty_printing_memory_mb(node_peak["max"]), node_peak_stage,
+                     node_peak["max_node"])
+        logging.info("Memory peak per rank: %s at stage '%s' (rank %d)",
+                     pretty_printing_memory_mb(rank_peak["max"]), rank_peak_stage,
+                     rank_peak["max_rank"])
+        logging.info("Memory profile written to %s", filename)
+
+
+def _min_max_mean(values, argmax_key, labels):
+    return {"min": float(values.min()), "max": float(values.max()),
+            "mean": float(values.mean()), argmax_key: labels[int(values.argmax())]}
+
+
+MemoryProfiler = _MemoryProfiler()  # singleton
+
+
+def get_peak_rss():
+    """The peak RSS (high-water mark) of the process, in bytes"""
+    try:
+        with open("/proc/self/status") as fd:
+            for line in fd:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # Linux: KB
+
+
 def pretty_printing_memory_mb(memory_mb):
     """
     A simple function that given a memory usage in MB
@@ -174,18 +304,72 @@ class SynapseMemoryUsage:
         "Glue": 0.5
     }
 
+    _helper_synapse_types = {
+        "AMPANMDAHelper": "ProbAMPANMDA",
+        "GABAABHelper": "ProbGABAAB",
+    }
+
     @classmethod
     def get_memory_usage(cls, count, synapse_type):
         return count * cls._synapse_memory_usage[synapse_type]
 
+    @classmethod
+    def get_helper_memory_usage(cls, helper_name):
+        """The (non-measured) memory of a synapse created by the given helper.
+        Mod overrides are assumed to be similar to ProbAMPANMDA
+        """
+        synapse_type = cls._helper_synapse_types.get(helper_name, "ProbAMPANMDA")
+        return cls._synapse_memory_usage[synapse_type]
+
+    @staticmethod
+    def synapse_kind(helper_name, with_minis):
+        """The key of a kind of synapse in the synapse memory usage table"""
+        return helper_name + ("+minis" if with_minis else "")
+
+
+class _SynapseGidCounts(dict):
+    """The synapse counts per gid of an edge population, gid -> {syn_type: count}.
+    Counts added after loading from the cache are also kept in `new`, to export only those
+    """
+    def __init__(self, cached=()):
+        super().__init__(cached)
+        self.new = {}
+
+    def __setitem__(self, gid, counts):
+        super().__setitem__(gid, counts)
+        self.new[gid] = counts
+
+    def update(self, gid_counts):
+        gid_counts = dict(gid_counts)
+        super().update(gid_counts)
+        self.new.update(gid_counts)
+
 
 class DryRunStats:
     _MEMORY_USAGE_FILENAME = "cell_memory_usage.json"
+    _SYNAPSE_MEMORY_USAGE_FILENAME = "synapse_memory_usage.json"
 
-    def __init__(self) -> None:
+    _PLAN_FILENAME = "dry_run_plan.json"
+
+    SYNAPSE_SAMPLE_SIZE = 1000
+    """The number of synapses instantiated to measure the memory of each kind of synapse"""
+
+    PLAN_MAX_EXTRA_NODES = 8
+    """The planner searches up to 2 * min_nodes + PLAN_MAX_EXTRA_NODES nodes"""
+
+    def __init__(self, cache_dir=None) -> None:
+        self.cache_dir = cache_dir
+        self._cell_cache_keys = {}  # population -> cache key of its cells
+        self._synapse_gid_counts = {}  # cache key -> _SynapseGidCounts
         self.metype_memory = {}
         self.metype_counts = Counter()
         self.synapse_counts = Counter()
+        self.synapse_helper_counts = Counter()
+        self.synapse_memory = {}  # Measured, persisted in the synapse memory usage file
+        self.synapse_memory_estimates = {}  # Fallback when measuring fails. Not persisted
+        self.metype_synapse_counts = Counter()
+        self.pop_metype_gids = {}  # population -> metype_gids, for simulating distributions
+        self.synapse_memory_avg = SynapseMemoryUsage.get_helper_memory_usage("AMPANMDAHelper")
         _, _, self.base_memory, _ = get_task_level_mem_usage()
 
     @run_only_rank0
@@ -221,6 +405,90 @@ class DryRunStats:
     def export_cell_memory_usage(self):
         with open(self._MEMORY_USAGE_FILENAME, 'w') as fp:
             json.dump(self.metype_memory, fp, sort_keys=True, indent=4)
+        for population, key in self._cell_cache_keys.items():
+            metypes = self.pop_metype_gids.get(population, ())
+            self._update_cache_file("cells_" + key, {
+                metype: self.metype_memory[metype]
+                for metype in metypes if metype in self.metype_memory
+            })
+
+    @staticmethod
+    def cache_key(*sources):
+        """A short hash identifying the given sources (e.g. file paths) in the cache"""
+        return hashlib.md5("|".join(map(str, sources)).encode()).digest().hex()[:10]
+
+    def _cache_file(self, name):
+        return os.path.join(self.cache_dir, name + ".json")
+
+    def _load_cache_file(self, name):
+        if not self.cache_dir or not os.path.exists(self._cache_file(name)):
+            return {}
+        with open(self._cache_file(name), 'r') as fp:
+            return json.load(fp)
+
+    def _update_cache_file(self, name, entries):
+        """Merges the entries with those in the cache file, if existing"""
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cached = self._load_cache_file(name)
+        cached.update(entries)
+        # Write aside and replace, so that readers never see a partially written file
+        cache_file = self._cache_file(name)
+        tmp_file = "%s.%d.tmp" % (cache_file, os.getpid())
+        with open(tmp_file, 'w') as fp:
+            json.dump(cached, fp, sort_keys=True, indent=1)
+        os.replace(tmp_file, cache_file)
+
+    def import_cell_cache(self, population, *sources):
+        """Loads the memory of the metypes measured by previous dry runs of the same population,
+        identified by the given sources (nodes file, emodels and morphologies path...)
+        """
+        if not self.cache_dir:
+            return
+        key = self.cache_key(population, *sources)
+        self._cell_cache_keys[population] = key
+        cached = self._load_cache_file("cells_" + key)
+        if cached:
+            logging.info("Loaded the memory of %d metypes of %s from the dry-run cache",
+                         len(cached), population)
+            self.metype_memory.update(cached)
+
+    def synapse_gid_counts(self, *sources):
+        """The synapse counts per gid of an edge population identified by the given sources,
+        including those found in the cache. New counts shall be added to the returned dict, and
+        are written to the cache with `export_synapse_cache`.
+
+        Returns: A dict gid -> {syn_type: count}
+        """
+        key = self.cache_key(*sources)
+        if key not in self._synapse_gid_counts:
+            self._synapse_gid_counts[key] = _SynapseGidCounts(
+                (int(gid), {int(syn_type): n for syn_type, n in counts.items()})
+                for gid, counts in self._load_cache_file("synapses_" + key).items()
+            )
+        return self._synapse_gid_counts[key]
+
+    def export_synapse_cache(self):
+        """Gathers the synapse counts newly found by all ranks and adds them to the cache
+        (collective)
+        """
+        if not self.cache_dir:
+            return
+        new_counts = {key: gid_counts.new for key, gid_counts in self._synapse_gid_counts.items()
+                      if gid_counts.new}
+        all_counts = MPI.py_gather(new_counts, 0) if MPI.size > 1 else [new_counts]
+        if MPI.rank != 0:
+            return
+        merged = defaultdict(dict)
+        for rank_counts in all_counts:
+            for key, gid_counts in rank_counts.items():
+                merged[key].update(gid_counts)
+        for key, gid_counts in merged.items():
+            self._update_cache_file("synapses_" + key, {
+                str(gid): {str(syn_type): int(n) for syn_type, n in counts.items()}
+                for gid, counts in gid_counts.items()
+            })
 
     def try_import_cell_memory_usage(self):
         if not os.path.exists(self._MEMORY_USAGE_FILENAME):
@@ -229,8 +497,72 @@ class DryRunStats:
         with open(self._MEMORY_USAGE_FILENAME, 'r') as fp:
             self.metype_memory = json.load(fp)
 
+    def add_synapse_counts(self, counts, mod_override=None):
+        """Adds the counts of synapses per type, which are also accounted per synapse helper,
+        i.e. the mod_override helper or otherwise the default GABAAB / AMPANMDA helpers
+        """
+        self.synapse_counts += counts
+        for syn_type, count in counts.items():
+            if mod_override:
+                helper_name = mod_override + "Helper"
+            else:
+                helper_name = "GABAABHelper" if syn_type < 100 else "AMPANMDAHelper"
+            self.synapse_helper_counts[helper_name] += count
+
+    @staticmethod
+    def _spont_minis_enabled():
+        """Whether spont minis are configured. If so we account them in every synapse"""
+        from ..core.configuration import SimConfig
+        return any(float(conn_conf.get("SpontMinis", 0)) > 0
+                   for conn_conf in (SimConfig.connections or {}).values())
+
+    @property
+    def _synapse_memory_usage_file(self):
+        if self.cache_dir:
+            return self._cache_file(self._SYNAPSE_MEMORY_USAGE_FILENAME[:-5])
+        return self._SYNAPSE_MEMORY_USAGE_FILENAME
+
+    def try_import_synapse_memory_usage(self):
+        if not os.path.exists(self._synapse_memory_usage_file):
+            return
+        logging.info("Loading synapse memory usage from %s...", self._synapse_memory_usage_file)
+        with open(self._synapse_memory_usage_file, 'r') as fp:
+            self.synapse_memory = json.load(fp)
+
+    def export_synapse_memory_usage(self):
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self._synapse_memory_usage_file, 'w') as fp:
+            json.dump(self.synapse_memory, fp, sort_keys=True, indent=4)
+
+    def measure_synapse_memory(self, helper_names, with_minis):
+        """Measures the memory of the kinds of synapses not yet in the synapse memory table.
+        On failure (e.g. a helper is not available) the legacy per-type estimates are used.
+        These are kept apart, so that they are not exported and later runs measure again.
+        """
+        from ..connection import Connection
+        for helper_name in helper_names:
+            kind = SynapseMemoryUsage.synapse_kind(helper_name, with_minis)
+            if kind in self.synapse_memory:
+                continue
+            try:
+                kb = Connection.measure_synapse_memory(helper_name, with_minis,
+                                                       self.SYNAPSE_SAMPLE_SIZE)
+            except Exception as e:
+                logging.warning("Could not measure synapse memory of %s (%s). Using estimate",
+                                kind, e)
+                self.synapse_memory_estimates[kind] = SynapseMemoryUsage.get_helper_memory_usage(
+                    helper_name)
+                continue
+            logging.debug(" * Synapse %s: %.2f KiB", kind, kb)
+            self.synapse_memory[kind] = kb
+
     def collect_display_syn_counts(self):
         master_counter = MPI.py_sum(self.synapse_counts, Counter())
+        helper_counter = MPI.py_sum(self.synapse_helper_counts, Counter())
+        self.metype_synapse_counts = MPI.py_sum(self.metype_synapse_counts, Counter())
+        with_minis = self._spont_minis_enabled()
+        self.export_synapse_cache()
 
         # Done with MPI. Use rank0 to display
         if MPI.rank != 0:
@@ -251,13 +583,26 @@ class DryRunStats:
             else:
                 exc_count += count
         log_verbose("+{:-^68}+".format(""))
-
-        in_mem = SynapseMemoryUsage.get_memory_usage(inh_count, "ProbGABAAB") / 1024
-        ex_mem = SynapseMemoryUsage.get_memory_usage(exc_count, "ProbAMPANMDA") / 1024
-        self.synapse_memory_total = in_mem + ex_mem
-        logging.info("   - Inhibitory: %s", pretty_printing_memory_mb(in_mem))
-        logging.info("   - Excitatory: %s", pretty_printing_memory_mb(ex_mem))
+        logging.info("   - Inhibitory: %d synapses, Excitatory: %d synapses", inh_count, exc_count)
+
+        self.try_import_synapse_memory_usage()
+        self.measure_synapse_memory(sorted(helper_counter), with_minis)
+        self.export_synapse_memory_usage()
+
+        self.synapse_memory_total = 0
+        for helper_name, count in sorted(helper_counter.items()):
+            kind = SynapseMemoryUsage.synapse_kind(helper_name, with_minis)
+            kind_kb = (self.synapse_memory[kind] if kind in self.synapse_memory
+                       else self.synapse_memory_estimates[kind])
+            kind_mem = count * kind_kb / 1024
+            self.synapse_memory_total += kind_mem
+            logging.info("   - %s: %s (%.2f KiB x %d)", kind, pretty_printing_memory_mb(kind_mem),
+                         kind_kb, count)
         logging.info(" - TOTAL : %s", pretty_printing_memory_mb(self.synapse_memory_total))
+        total_count = sum(helper_counter.values())
+        if total_count:
+            self.synapse_memory_avg = self.synapse_memory_total * 1024 / total_count
+        return self.synapse_memory_total
 
     @run_only_rank0
     def display_total(self):
@@ -337,3 +682,158 @@ class DryRunStats:
                      f"{pretty_printing_memory_mb(node_total_memory)} on the current node.")
         logging.info("Please remember that it is suggested to use the same class of nodes "
                      "for both the dryrun and the actual simulation.")
+
+    def cells_memory_by_population(self):
+        """The estimated memory (MB) of every cell, including its synapses, per population.
+
+        Returns: A dict population -> (gids, cells_memory), both sorted by gid
+        """
+        result = {}
+        for population, metype_gids in self.pop_metype_gids.items():
+            gids_list, memory_list = [], []
+            for metype, gids in metype_gids.items():
+                n_cells = self.metype_counts.get(metype) or len(gids)
+                syns_per_cell = self.metype_synapse_counts.get(metype, 0) / n_cells
+                cell_memory = (self.metype_memory.get(metype, 0)
+                               + syns_per_cell * self.synapse_memory_avg) / 1024
+                gids_list.append(np.asarray(gids))
+                memory_list.append(np.full(len(gids), cell_memory))
+            if not gids_list:
+                continue
+            gids = np.concatenate(gids_list)
+            order = np.argsort(gids, kind="stable")
+            result[population] = (gids[order], np.concatenate(memory_list)[order])
+        return result
+
+    @staticmethod
+    def simulate_distribution(cells_memory, n_ranks, n_cycles=1, complexities=None):
+        """Simulates the distribution of cells among ranks and model-building cycles.
+
+        As in the simulation, each population is split round-robin among cycles, and the cells
+        of a cycle round-robin among ranks or, given their complexities, with load balance
+        (greedy largest-first, as the WholeCell balancer)
+
+        Args:
+            cells_memory: A list of arrays with the memory of each cell, one per population
+            n_ranks: The number of ranks
+            n_cycles: The number of model building steps
+            complexities: (optional) A list like cells_memory with the cell complexities.
+                Populations whose entry is None are distributed round-robin
+
+        Returns: The memory of each rank in each cycle, as an array (n_cycles, n_ranks)
+        """
+        loads = np.zeros(n_cycles * n_ranks)
+        for pop_i, cell_memory in enumerate(cells_memory):
+            cell_idx = np.arange(len(cell_memory))
+            cycles = cell_idx % n_cycles
+            cx = complexities[pop_i] if complexities is not None else None
+            if cx is None:
+                ranks = (cell_idx // n_cycles) % n_ranks
+            else:
+                ranks = np.empty(len(cell_idx), dtype=int)
+                for cycle_i in range(n_cycles):
+                    cycle_cells = cell_idx[cycles == cycle_i]
+                    ranks[cycle_cells] = _lpt_assign(cx[cycle_cells], n_ranks)
+            loads += np.bincount(cycles * n_ranks + ranks, weights=cell_memory,
+                                 minlength=n_cycles * n_ranks)
+        return loads.reshape(n_cycles, n_ranks)
+
+    def plan_configurations(self, node_memory, margin=0.3, ranks_per_node_options=None,
+                            steps_options=(1, 2, 4, 8), complexities=None):
+        """Finds, for each (ranks per node, model building steps), the minimum number of nodes
+        whose predicted peak memory per node fits the node memory (MB), with the given margin.
+
+        Args:
+            node_memory: The memory available in each node (MB)
+            margin: The safety margin to add to the estimates, e.g. 0.3 for 30%
+            ranks_per_node_options: The candidate ranks per node. Default: cpu count, 1/2, 1/4
+            steps_options: The candidate model building steps
+            complexities: (optional) A dict population -> {gid: complexity} from existing
+                load balance files. Populations having it are distributed as WholeCell
+
+        Returns: A list of dicts with the feasible configurations and their memory estimates
+        """
+        cells_memory, cells_cx = [], []
+        for population, (gids, memory) in self.cells_memory_by_population().items():
+            pop_cx = (complexities or {}).get(population)
+            cells_memory.append(memory)
+            cells_cx.append(None if not pop_cx else
+                            np.array([pop_cx.get(gid, 0.) for gid in gids.tolist()]))
+        cells_total = sum(memory.sum() for memory in cells_memory)
+        if ranks_per_node_options is None:
+            cpus = os.cpu_count() or multiprocessing.cpu_count()
+            ranks_per_node_options = sorted({max(1, cpus // div) for div in (1, 2, 4)})
+        configurations = []
+        for ranks_per_node in ranks_per_node_options:
+            overhead = self.base_memory * ranks_per_node * (1 + margin)
+            if overhead >= node_memory:
+                continue
+            for n_steps in steps_options:
+                min_nodes = max(1, math.ceil(cells_total / n_steps * (1 + margin)
+                                             / (node_memory - overhead)))
+                # The peak only goes down as nodes are added: binary search the first that fits
+                low, high = min_nodes, 2 * min_nodes + self.PLAN_MAX_EXTRA_NODES - 1
+                best = None
+                while low <= high:
+                    n_nodes = (low + high) // 2
+                    loads = self.simulate_distribution(cells_memory, n_nodes * ranks_per_node,
+                                                       n_steps, cells_cx)
+                    node_loads = loads.reshape(n_steps, n_nodes, ranks_per_node).sum(axis=2)
+                    node_peak = node_loads.max() + self.base_memory * ranks_per_node
+                    if node_peak * (1 + margin) <= node_memory:
+                        best = (n_nodes, loads, node_peak)
+                        high = n_nodes - 1
+                    else:
+                        low = n_nodes + 1
+                if best is None:
+                    continue
+                n_nodes, loads, node_peak = best
+                configurations.append({
+                    "nodes": n_nodes,
+                    "ranks_per_node": ranks_per_node,
+                    "ranks": n_nodes * ranks_per_node,
+                    "modelbuilding_steps": n_steps,
+                    "max_rank_memory_mb": float(loads.max() + self.base_memory),
+                    "max_node_memory_mb": float(node_peak),
+                    "node_memory_usage": float(node_peak / node_memory),
+                })
+        configurations.sort(key=lambda conf: (conf["nodes"], conf["modelbuilding_steps"]))
+        return configurations
+
+    @run_only_rank0
+    def display_node_plan(self, complexities=None, margin=0.3):
+        """Displays and exports (to JSON) the feasible configurations of nodes, ranks per node
+        and model building steps, from simulating the distribution of the cells
+        """
+        node_memory = DryRunStats.total_memory_available()
+        if node_memory is None or not self.pop_metype_gids:
+            return
+        configurations = self.plan_configurations(node_memory, margin, complexities=complexities)
+        distribution = "WholeCell" if complexities else "RoundRobin"
+        logging.info("+{:=^86}+".format(" Feasible Configurations (%s) " % distribution))
+        logging.info("| {:>6s} | {:>10s} | {:>7s} | {:>5s} | {:>15s} | {:>15s} | {:>8s} |".format(
+            "Nodes", "Ranks/Node", "Ranks", "Steps", "Max Rank (MiB)", "Max Node (MiB)", "Usage"))
+        logging.info("+{:-^86}+".format(""))
+        for conf in configurations:
+            logging.info("| {:6d} | {:10d} | {:7d} | {:5d} | {:15.1f} | {:15.1f} | {:7.1f}% |"
+                         .format(conf["nodes"], conf["ranks_per_node"], conf["ranks"],
+                                 conf["modelbuilding_steps"], conf["max_rank_memory_mb"],
+                                 conf["max_node_memory_mb"], conf["node_memory_usage"] * 100))
+        logging.info("+{:-^86}+".format(""))
+        logging.info("Note: modelbuilding_steps > 1 are only available with CoreNEURON")
+        with open(self._PLAN_FILENAME, "w") as fp:
+            json.dump({"node_memory_mb": node_memory, "margin": margin,
+                       "distribution": distribution, "configurations": configurations},
+                      fp, indent=4)
+        logging.info("Configurations written to %s", self._PLAN_FILENAME)
+
+
+def _lpt_assign(weights, n_bins):
+    """Assigns items to bins, largest first to the least loaded bin. Returns the bin indexes"""
+    bins = [(0.0, bin_i) for bin_i in range(n_bins)]
+    assignment = np.empty(len(weights), dtype=int)
+    for item_i in np.argsort(-np.asarray(weights), kind="stable"):
+        load, bin_i = bins[0]
+        assignment[item_i] = bin_i
+        heapq.heapreplace(bins, (load + weights[item_i], bin_i))
+    return assignment
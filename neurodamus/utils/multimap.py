@@ -2,8 +2,6 @@
 A collection of Pure-Python MultiMaps
 """
 import numpy as np
-from functools import reduce
-from operator import add
 from .compat import collections_abc
 
 
@@ -60,6 +58,10 @@ class MultiMap(collections_abc.Mapping):
             return default
         return self._values[idx]
 
+    def get_index(self, idx):
+        """Get the value at a given (key) index, as found by `find` or a searchsorted on keys"""
+        return self._values[idx]
+
     def get_items(self, key):
         """An iterator over all the values of a key
         """
@@ -104,46 +106,117 @@ class MultiMap(collections_abc.Mapping):
 
 
 class GroupedMultiMap(MultiMap):
-    """A Multimap which groups values by key in a list.
+    """A Multimap which groups values by key.
+
+    Data is kept in CSR layout: the unique sorted keys, the offsets of each key's values and
+    the flat values. Getting the values of a key returns a (zero-copy) slice of the latter.
     """
+    __slots__ = ("_offsets",)
+
     def __init__(self, np_keys, values, presorted=False):
         MultiMap.__init__(self, np_keys, values, presorted)
-        self._keys, self._values = self._duplicates_to_list(self._keys, self._values)
+        self._keys, self._offsets = self._group_keys(self._keys)
+
+    @classmethod
+    def _from_csr(cls, keys, offsets, flat_values):
+        obj = cls.__new__(cls)
+        obj._keys, obj._offsets, obj._values = keys, offsets, flat_values
+        return obj
 
     @staticmethod
-    def _duplicates_to_list(np_keys, values):
-        np_keys, indexes = np.unique(np_keys, return_index=True)
-        if len(indexes) == 0:
-            return np_keys, []
-        beg_it = iter(indexes)
-        end_it = iter(indexes)
-        next(end_it)  # Discard first
-        values = [values[next(beg_it):end] for end in end_it] + [values[indexes[-1]:]]  # Last
-        assert len(np_keys) == len(values)
-        return np_keys, values
+    def _group_keys(sorted_keys):
+        """From the sorted keys (with duplicates) get the unique keys and their offsets"""
+        np_keys, indexes = np.unique(sorted_keys, return_index=True)
+        offsets = np.append(indexes, len(sorted_keys)).astype("int64")
+        return np_keys, offsets
 
     def get(self, key, default=()):
-        return MultiMap.get(self, key, default)
+        idx = self.find(key)
+        if idx is None:
+            return default
+        return self.get_index(idx)
+
+    def get_index(self, idx):
+        return self._values[self._offsets[idx]:self._offsets[idx + 1]]
 
     def get_items(self, key):
         return self.get(key)
 
+    def __getitem__(self, key):
+        idx = self.find(key)
+        if idx is None:
+            raise KeyError("{} does not exist".format(key))
+        return self.get_index(idx)
+
+    def values(self):
+        """The list of values of each key"""
+        return [self.get_index(i) for i in range(len(self._keys))]
+
+    def items(self):
+        return zip(self._keys, self.values())
+
+    def data(self):
+        return self._keys, self.values()
+
+    def offsets(self):
+        """The offsets of each key values in `flat_values`, plus the end"""
+        return self._offsets
+
+    def counts(self):
+        """The number of values of each key"""
+        return np.diff(self._offsets)
+
     def size(self):
         """Number of entries"""
-        return reduce(add, (len(v) for v in self._values))
+        return len(self._values)
 
     def __iadd__(self, other):
-        MultiMap.__iadd__(self, other)
-        self._keys, v_list = self._duplicates_to_list(self._keys, self._values)
-        self._values = [reduce(add, subl) for subl in v_list]
+        merged = self.merge([self, other])
+        self._keys, self._offsets, self._values = merged._keys, merged._offsets, merged._values
         return self
 
+    @classmethod
+    def merge(cls, maps):
+        """Merges several GroupedMultiMaps in O(n) (plus sorting the unique keys).
+
+        Values of each key keep the maps order, exactly as a stable sort of the concatenation
+        """
+        maps = [m for m in maps if len(m)] or maps[:1]
+        if len(maps) == 1:
+            return maps[0]
+        keys = np.unique(np.concatenate([m._keys for m in maps]))
+        all_counts = np.zeros(len(keys), dtype="int64")
+        key_idxs = [np.searchsorted(keys, m._keys) for m in maps]
+        for m, idxs in zip(maps, key_idxs):
+            all_counts[idxs] += m.counts()
+        offsets = np.zeros(len(keys) + 1, dtype="int64")
+        np.cumsum(all_counts, out=offsets[1:])
+
+        # Each map values are copied to where their key currently ends (cursor)
+        cursor = offsets[:-1].copy()
+        dests = []
+        for m, idxs in zip(maps, key_idxs):
+            counts = m.counts()
+            shift = np.repeat(cursor[idxs] - m._offsets[:-1], counts)
+            dests.append(shift + np.arange(m.size()))
+            cursor[idxs] += counts
+
+        if all(isinstance(m._values, np.ndarray) for m in maps):
+            values = np.empty(offsets[-1], np.result_type(*(m._values for m in maps)))
+            for m, dest in zip(maps, dests):
+                values[dest] = m._values
+        else:
+            values = [None] * offsets[-1]
+            for m, dest in zip(maps, dests):
+                for i, value in zip(dest.tolist(), m._values):
+                    values[i] = value
+        return cls._from_csr(keys, offsets, values)
+
     def flat_values(self):
-        return reduce(self.concat, self._values)
+        return self._values
 
     def flatten(self):
         """Transform the current Map to a plain Multimap, without groups.
         """
-        keys = np.repeat(self._keys, [len(v) for v in self._values])
-        values = np.concatenate(self._values)
-        return MultiMap(keys, values, presorted=True)
+        keys = np.repeat(self._keys, self.counts())
+        return MultiMap(keys, self._values, presorted=True)
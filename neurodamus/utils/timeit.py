@@ -90,23 +90,21 @@ In case you want to time operations just on rank0, without impacting the STATS,y
 use @timeit_rank0 in a similar manner to @timeit. For example delete_corenrn_data,
 which is happening only on rank0.
 
-PITFALLS:
-    Make sure you avoid data-driven flows for your timeits, otherwise there will be
-    an MPI_Allreduce number of timers mismatch and you will get MPI errors like:
-        MPT: --------stack traceback-------
-        MPT ERROR: rank:3426, function:MPI_ALLREDUCE, Message truncated on receive:
-                        An application bug caused the sender to send too much data
-    Example:
-          for conn in self.get_target_connections(None, target_name):
-            if conn.sgid not in spike_manager:
-                continue
-            # PITFALL: May not be called on some ranks => one less timer
-            with timeit(name="register replay events", verbose=False):
-                conn.replay(spike_manager[conn.sgid], start_delay)
-                replayed_count += 1
+Timers are nested: a timer started while another one is running becomes its child, and
+is shown indented under it in the stats. Stats are reduced by timer name, so ranks may
+have different sets of timers (e.g. data-driven flows). Such timers are marked with (*)
+and their stats consider only the ranks where they were hit.
+
+Every timer hit can also be recorded as a span, per rank, and exported as a Chrome trace
+(to be opened in chrome://tracing or https://ui.perfetto.dev), one process per rank:
+    >>> TimerManager.enable_trace()
+    >>> ...
+    >>> TimerManager.export_trace("timeit_trace.json")  # collective
+    [ INFO ] Timers trace written to timeit_trace.json (1234 spans)
 
 """
 from __future__ import absolute_import
+import json
 import logging
 import time
 
@@ -115,7 +113,7 @@ from itertools import chain
 from math import log, floor
 
 from .logging import log_verbose
-from ..core import NeurodamusCore as Nd, MPI, run_only_rank0
+from ..core import MPI, run_only_rank0
 
 
 def human_readable(num):
@@ -133,6 +131,9 @@ def human_readable(num):
 
 delim = u'\u255a'
 
+_wall_clock_offset = time.time() - time.perf_counter()
+"""Converts perf_counter times to (comparable among ranks) wall-clock times"""
+
 
 class _Timer(object):
     total_time = property(lambda self: self._total_time)
@@ -174,6 +175,18 @@ class _TimerManager(object):
     _timers = dict()
     _timers_sequence = 0
     _archived_timers = {}
+    _trace_events = None  # list of (start, duration, name) when tracing is enabled
+    _trace_dropped = 0
+
+    MAX_TRACE_EVENTS = 1 << 20
+    """Max spans recorded per rank. Further spans are dropped to keep memory bounded"""
+
+    def enable_trace(self):
+        """Start recording every timer hit as a span, for export_trace"""
+        if self._trace_events is None:
+            self._trace_events = []
+
+    trace_enabled = property(lambda self: self._trace_events is not None)
 
     # archive current timers
     def archive(self, archive_name):
@@ -187,7 +200,15 @@ class _TimerManager(object):
     def update(self, name, verbose=True):
         if name not in self._timers.keys():
             raise Exception("{} not initialized in timers dict".format(name))
-        self._timers[name].stop()
+        timer = self._timers[name]
+        start_time = timer._start_time
+        timer.stop()
+        if self._trace_events is not None:
+            if len(self._trace_events) < self.MAX_TRACE_EVENTS:
+                self._trace_events.append((start_time + _wall_clock_offset, timer._last_time,
+                                           name))
+            else:
+                self._trace_dropped += 1
         if verbose:
             self._log_timer(self._timers[name])
 
@@ -202,21 +223,29 @@ class _TimerManager(object):
         current_timers_name = "Final Stats" if len(self._archived_timers) else ""
         for timers_name, timers in chain(self._archived_timers.items(),
                                          ((current_timers_name, self._timers),)):
-            mpi_times = Nd.Vector(tinfo.total_time for tinfo in timers.values())
-            avg_times = mpi_times.c()
-            MPI.pc.allreduce(avg_times, MPI.SUM)
-            min_times = mpi_times.c()
-            MPI.pc.allreduce(min_times, MPI.MIN)
-            max_times = mpi_times.c()
-            MPI.pc.allreduce(max_times, MPI.MAX)
-
-            nof_hits = Nd.Vector(tinfo.hits for tinfo in timers.values())
-            MPI.pc.allreduce(nof_hits, MPI.SUM)
-
-            self._log_stats(timers_name, timers, avg_times, min_times, max_times, nof_hits)
+            stats = self.reduce_stats(timers)
+            self._log_stats(timers_name, timers, stats)
+
+    @staticmethod
+    def reduce_stats(timers):
+        """Reduces the timers stats among ranks, matching timers by name. Collective.
+
+        Returns: (in rank 0 only) A dict of timer name -> (avg, min, max, total hits, n_ranks),
+            where time stats consider only the n_ranks where the timer exists
+        """
+        local_stats = {name: (tinfo.total_time, tinfo.hits) for name, tinfo in timers.items()}
+        all_stats = MPI.py_gather(local_stats, 0) if MPI.size > 1 else [local_stats]
+        if MPI.rank != 0:
+            return None
+        stats = {}
+        for name in dict.fromkeys(chain.from_iterable(all_stats)):  # keep order of appearance
+            times, hits = zip(*(rank_stats[name] for rank_stats in all_stats
+                                if name in rank_stats))
+            stats[name] = (sum(times) / len(times), min(times), max(times), sum(hits), len(times))
+        return stats
 
     @run_only_rank0
-    def _log_stats(self, timers_name, timers, avg_times, min_times, max_times, nof_hits):
+    def _log_stats(self, timers_name, timers, stats):
         stats_name = " TIMEIT STATS {}".format('(' + timers_name + ') ' if timers_name
                                                else timers_name)
         logging.info("+{:=^111s}+".format(stats_name))
@@ -224,16 +253,56 @@ class _TimerManager(object):
             'Event Label', 'Avg.Time', 'Min.Time', 'Max.Time', 'Hits R0 / Total '))
         logging.info("+{:-^111s}+".format('-'))
 
-        for t, (name, tinfo) in enumerate(timers.items()):
+        partial_timers = False
+        for name, (avg_time, min_time, max_time, nof_hits, n_ranks) in stats.items():
             base_name = delim.join('  ') * name.count(delim) + name.split(delim)[-1]
+            if n_ranks < MPI.size:
+                base_name += " (*)"
+                partial_timers = True
+            tinfo = timers.get(name)
             logging.info("| {:<56s} | {:8.2f} | {:8.2f} | {:8.2f} | {:>7s} / {:<7s} |".format(
                 base_name,
-                avg_times.x[t] / MPI.size,
-                min_times.x[t],
-                max_times.x[t],
-                human_readable(tinfo.hits),
-                human_readable(nof_hits.x[t])))
+                avg_time,
+                min_time,
+                max_time,
+                human_readable(tinfo.hits if tinfo else 0),
+                human_readable(nof_hits)))
         logging.info("+{:-^111s}+".format('-'))
+        if partial_timers:
+            logging.info("(*) Not hit in all ranks. Stats consider only the ranks where hit")
+
+    def export_trace(self, filename):
+        """Writes the recorded spans of all ranks to a Chrome trace (JSON) file. Collective.
+
+        Each rank is shown as a process. Nested timers are nested spans, with the full timer
+        path as argument. Times are relative to the earliest span, in microseconds.
+        """
+        events = self._trace_events or []
+        if self._trace_dropped:
+            logging.warning("Timers trace: %d spans dropped in rank %d (max %d)",
+                            self._trace_dropped, MPI.rank, self.MAX_TRACE_EVENTS)
+        all_events = MPI.py_gather(events, 0) if MPI.size > 1 else [events]
+        if MPI.rank != 0:
+            return
+        t0 = min((event[0] for rank_events in all_events for event in rank_events), default=0)
+        trace = []
+        for rank, rank_events in enumerate(all_events):
+            trace.append({"name": "process_name", "ph": "M", "pid": rank, "tid": 0,
+                          "args": {"name": "rank {}".format(rank)}})
+            trace.extend({
+                "name": name.split(delim)[-1],
+                "cat": "timeit",
+                "ph": "X",
+                "ts": (start - t0) * 1e6,
+                "dur": duration * 1e6,
+                "pid": rank,
+                "tid": 0,
+                "args": {"path": " / ".join(name.split(delim))}
+            } for start, duration, name in rank_events)
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        logging.info("Timers trace written to %s (%d spans)",
+                     filename, len(trace) - len(all_events))
 
 
 TimerManager = _TimerManager()  # singleton
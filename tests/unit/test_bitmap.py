@@ -0,0 +1,45 @@
+import numpy
+import numpy.testing as npt
+import pytest
+
+from neurodamus.utils.bitmap import RoaringBitmap
+
+
+def _sample_gids(seed, dense_chunk=True):
+    rng = numpy.random.default_rng(seed)
+    parts = [rng.integers(0, 300_000, 2000)]
+    if dense_chunk:  # more than ARRAY_MAX_SIZE values in a chunk -> bitmap container
+        start = rng.integers(0, 200_000)
+        parts.append(numpy.arange(start, start + 20_000))
+    return numpy.unique(numpy.concatenate(parts)).astype("uint32")
+
+
+@pytest.mark.parametrize("dense", [False, True])
+def test_bitmap_roundtrip(dense):
+    gids = _sample_gids(1, dense)
+    bitmap = RoaringBitmap.from_array(gids[::-1])  # order doesnt matter
+    assert len(bitmap) == len(gids)
+    npt.assert_array_equal(bitmap.to_array(), gids)
+    assert RoaringBitmap.from_array(gids, presorted=True) == bitmap
+
+
+def test_bitmap_membership():
+    gids = _sample_gids(2)
+    bitmap = RoaringBitmap.from_array(gids)
+    queries = numpy.arange(0, 320_000, 7)
+    npt.assert_array_equal(bitmap.contains(queries), numpy.isin(queries, gids))
+    assert gids[10] in bitmap
+    assert 400_000 not in bitmap
+    assert not RoaringBitmap().contains([1, 2]).any()
+
+
+@pytest.mark.parametrize(("dense1", "dense2"), [(False, False), (True, False), (True, True)])
+def test_bitmap_set_operations(dense1, dense2):
+    gids1, gids2 = _sample_gids(3, dense1), _sample_gids(4, dense2)
+    bm1, bm2 = RoaringBitmap.from_array(gids1), RoaringBitmap.from_array(gids2)
+    npt.assert_array_equal((bm1 & bm2).to_array(), numpy.intersect1d(gids1, gids2))
+    npt.assert_array_equal((bm1 | bm2).to_array(), numpy.union1d(gids1, gids2))
+    assert len(bm1 & bm2) == len(numpy.intersect1d(gids1, gids2))
+    assert bm1.intersects(bm2)
+    assert not bm1.intersects(RoaringBitmap.from_array(gids2 + 400_000))
+    assert not bm1.intersects(RoaringBitmap())
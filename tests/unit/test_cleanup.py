@@ -0,0 +1,27 @@
+import os
+
+from neurodamus.io.cleanup import move_to_trash, parallel_delete, pending_trash
+
+
+def _make_data_dir(path, n_files=10):
+    os.makedirs(os.path.join(path, "subdir"))
+    for i in range(n_files):
+        with open(os.path.join(path, "%d_1.dat" % i), "w") as f:
+            f.write("data")
+    with open(os.path.join(path, "subdir", "files.dat"), "w") as f:
+        f.write("data")
+
+
+def test_trash_parallel_delete(tmp_path):
+    data_dir = str(tmp_path / "coreneuron_input")
+    _make_data_dir(data_dir)
+    old_trash = move_to_trash(data_dir)
+    assert not os.path.exists(data_dir)
+
+    _make_data_dir(data_dir)  # A new run, while the previous trash is still there
+    new_trash = move_to_trash(data_dir)
+    assert pending_trash(data_dir) == sorted([old_trash, new_trash])
+
+    parallel_delete(pending_trash(data_dir))
+    assert pending_trash(data_dir) == []
+    assert os.listdir(tmp_path) == []
@@ -137,3 +137,112 @@ def test_population_ids_match():
     assert not pop.ids_match(1, 1)
     assert not pop.ids_match(1, None)
     assert not pop.ids_match(None, 1)
+
+
+def test_replay_shared_vectors(tmp_path):
+    from neurodamus.connection_manager import SynapseRuleManager
+    from neurodamus.replay import SpikeManager
+
+    spikes_file = tmp_path / "out.dat"
+    spikes_file.write_text("/scatter\n0.5\t1\n0.3\t2\n2.0\t1\n0.15\t4\n0.1\t4\n")
+    spike_manager = SpikeManager(str(spikes_file))
+
+    replays = []
+
+    class _ReplayConn(_FakeConn):
+        def add_replay_vector(self, hoc_tvec):
+            replays.append((self.sgid, self.tgid, hoc_tvec))
+
+    conns = [_ReplayConn(sgid, tgid) for sgid, tgid in ((1, 0), (2, 0), (3, 1), (1, 1), (4, 2))]
+    manager = object.__new__(SynapseRuleManager)
+    with mock.patch.object(SynapseRuleManager, "src_pop_offset", 0), \
+            mock.patch.object(SynapseRuleManager, "get_target_connections",
+                              return_value=iter(conns)), \
+            mock.patch("neurodamus.connection_manager.Nd") as nd_mock:
+        nd_mock.t = 0
+        nd_mock.Vector = list
+        assert manager.replay(spike_manager, "src", "dst", start_delay=0.2) == 3
+
+    # sgid 3 has no spikes, sgid 4 none after start_delay. sgid 1 vector is shared
+    assert [(sgid, tgid) for sgid, tgid, _ in replays] == [(1, 0), (2, 0), (1, 1)]
+    assert replays[0][2] == [0.5, 2.0]
+    assert replays[0][2] is replays[2][2]
+    assert replays[1][2] == [0.3]
+
+
+@pytest.mark.parametrize("release", [False, True])
+def test_finalize_release_params(release):
+    from neurodamus.connection_manager import SynapseRuleManager
+
+    class _ParamsConn(_FakeConn):
+        synapse_params = "params"
+
+        def release_synapse_params(self):
+            self.synapse_params = None
+
+    pop = ConnectionSet(0, 0)
+    for sgid, tgid in ((1, 0), (2, 0), (1, 1)):
+        pop.store_connection(_ParamsConn(sgid, tgid))
+    manager = object.__new__(SynapseRuleManager)
+    manager._populations = {(0, 0): pop}
+    manager.release_params_on_finalize = release
+    finalized = []
+
+    def _finalize_conns(tgid, conns, *_, **__):
+        # Params of each tgid must still be available when these are finalized
+        finalized.extend(c.synapse_params for c in conns)
+        return len(conns)
+
+    with mock.patch.object(manager, "_finalize_conns", _finalize_conns, create=True), \
+            mock.patch("neurodamus.connection_manager.MPI") as mpi_mock:
+        mpi_mock.allreduce.side_effect = lambda value, _op: value
+        manager.finalize()
+
+    assert finalized == ["params"] * 3
+    expected = None if release else "params"
+    assert all(conn.synapse_params == expected for conn in pop.all_connections())
+
+
+def test_connection_lazy_members():
+    from neurodamus.connection import Connection
+    conn1 = Connection(1, 0, 2, 3)
+    conn2 = Connection(2, 0, 2, 3)
+    assert conn1.population_id == (2, 3)
+    assert conn1.population_id is conn2.population_id  # shared
+    assert conn1._delay_vec is None and conn1._configurations == ()
+    conn1.add_synapse_configuration("%s.verboseLevel = 1")
+    assert conn1._configurations == ["%s.verboseLevel = 1"]
+    assert conn2._configurations == ()
+
+
+def test_spont_minis_batch_seeds():
+    from neurodamus.connection import ArtificialStim, InhExcSpontMinis, SpontMinis
+
+    with mock.patch("neurodamus.connection.Nd") as nd_mock, \
+            mock.patch.object(SpontMinis, "tbins_vec", None), \
+            mock.patch.object(SpontMinis, "_rng_info", None), \
+            mock.patch.object(SpontMinis, "_shared_rate_vecs", {}), \
+            mock.patch.object(ArtificialStim, "_bbss", mock.Mock()):
+        nd_mock.Vector.side_effect = lambda *_: mock.MagicMock()
+        nd_mock.InhPoissonStim.side_effect = lambda *_, **_kw: mock.MagicMock()
+        minis1 = InhExcSpontMinis(0.1, 0.2)
+        minis2 = SpontMinis(0.2)
+        assert minis1.rate_vec_exc is minis2.rate_vec  # shared by rate
+        rng_info = minis1._rng_info
+        rng_info.getRNGMode.return_value = rng_info.RANDOM123
+        rng_info.getMinisSeed.return_value = 10
+
+        conn = mock.Mock(sgid=1, tgid=5, weight_factor=1, population_id=(1, 0))
+        synapses = [(None, 0.5, mock.Mock(synapseID=syn_id),
+                     mock.Mock(synType=syn_type, weight=1.0))
+                    for syn_id, syn_type in ((0, 100), (3, 0), (7, 100))]
+        minis1.create_on_synapses(conn, synapses, 0)
+
+        assert len(minis1.netstims) == 3
+        assert list(minis1._exc_stims) == [1, 0, 1]
+        ips_rngs = [ips.setRNGs.call_args[0] for ips in minis1.netstims]
+        seed2 = 65536 + 10
+        assert ips_rngs[1] == (203, 255, seed2 + 300, 203, 255, seed2 + 350)
+        assert [ips.setRate.call_args[0][0] for ips in minis1.netstims] == \
+            [minis1.rate_vec_exc, minis1.rate_vec, minis1.rate_vec_exc]
+        rng_info.getRNGMode.assert_called_once()
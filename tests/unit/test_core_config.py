@@ -1,4 +1,5 @@
 import os
+import pytest
 import struct
 
 from neurodamus.core.coreneuron_configuration import CoreConfig
@@ -111,3 +112,88 @@ def test_write_sim_config(tmpdir):
         assert lines[11].strip() == "'model-stats'"
         assert lines[12].strip() == f"report-conf='{report_conf}'"
         assert lines[13].strip() == "mpi=true"
+
+
+def test_model_fingerprint(tmpdir):
+    from types import SimpleNamespace
+    from neurodamus.core.configuration import CliOptions, CircuitConfig, model_fingerprint
+
+    nodes_file = tmpdir.join("nodes.h5")
+    nodes_file.write("nodes")
+    config = SimpleNamespace(
+        base_circuit=CircuitConfig(CircuitPath=str(nodes_file), nrnPath=False),
+        extra_circuits={},
+        projections={},
+        connections={"conn": {"Source": "All", "Destination": "All", "Weight": 1.0}},
+        stimuli={"hypamp": {"Pattern": "Hyperpolarizing"},
+                 "replay": {"Pattern": "SynapseReplay", "SpikeFile": "out.dat"}},
+        injects={"i1": {"Stimulus": "hypamp", "Target": "All"},
+                 "i2": {"Stimulus": "replay", "Target": "All"}},
+        configures={},
+        modifications={},
+        cli_options=CliOptions(),
+    )
+    run_conf = {"Duration": 100, "Dt": 0.025, "BaseSeed": 1}
+    fingerprint, data = model_fingerprint(config, run_conf)
+    assert data["files"][str(nodes_file)] == [5, os.stat(str(nodes_file)).st_mtime_ns]
+    assert all(lib in data["files"] for lib in data["mech_libs"])
+    assert list(data["stimuli"]) == ["hypamp"] and list(data["injects"]) == ["i1"]
+
+    # Run settings and replay don't change the model
+    config.stimuli["replay"]["SpikeFile"] = "other.dat"
+    assert model_fingerprint(config, dict(run_conf, Duration=200))[0] == fingerprint
+    # Seeds, connections and circuit files do
+    assert model_fingerprint(config, dict(run_conf, BaseSeed=2))[0] != fingerprint
+    config.connections["conn"]["Weight"] = 2.0
+    assert model_fingerprint(config, run_conf)[0] != fingerprint
+    config.connections["conn"]["Weight"] = 1.0
+    assert model_fingerprint(config, run_conf)[0] == fingerprint
+    nodes_file.write("changed nodes")
+    assert model_fingerprint(config, run_conf)[0] != fingerprint
+
+    # Files edited in place within referred dirs (e.g. emodels) also change it
+    emodels_dir = tmpdir.mkdir("emodels")
+    emodel_file = emodels_dir.join("cADpyr.hoc")
+    emodel_file.write("begintemplate cADpyr")
+    config.base_circuit = CircuitConfig(CircuitPath=str(nodes_file), nrnPath=False,
+                                        METypePath=str(emodels_dir))
+    fingerprint = model_fingerprint(config, run_conf)[0]
+    dir_mtime = os.stat(str(emodels_dir)).st_mtime_ns
+    emodel_file.write("begintemplate cADpyr2")
+    os.utime(str(emodels_dir), ns=(dir_mtime, dir_mtime))
+    assert model_fingerprint(config, run_conf)[0] != fingerprint
+    # Unless dir scans are disabled
+    config.cli_options = CliOptions(model_cache_no_dir_scan=True)
+    fingerprint = model_fingerprint(config, run_conf)[0]
+    emodel_file.write("begintemplate cADpyr3")
+    assert model_fingerprint(config, run_conf)[0] == fingerprint
+    config.cli_options = CliOptions()
+
+    # Data dirs are identified by the circuit files, not scanned
+    circuit_dir, morph_dir, edges_dir = tmpdir.mkdir("circuit"), tmpdir.mkdir("morph"), \
+        tmpdir.mkdir("edges")
+    circuit_dir.join("circuit.mvd3").write("cells")
+    edges_dir.join("nrn.h5").write("edges")
+    config.base_circuit = CircuitConfig(CircuitPath=str(circuit_dir), nrnPath=str(edges_dir),
+                                        CellLibraryFile="circuit.mvd3",
+                                        MorphologyPath=str(morph_dir))
+    fingerprint, data = model_fingerprint(config, run_conf)
+    assert sorted(data["files"]) == sorted([str(circuit_dir.join("circuit.mvd3")),
+                                            str(edges_dir.join("nrn.h5"))] + data["mech_libs"])
+    morph_dir.join("morph.h5").write("morph")  # Not scanned
+    assert model_fingerprint(config, run_conf)[0] == fingerprint
+    edges_dir.join("nrn.h5").write("new edges")
+    assert model_fingerprint(config, run_conf)[0] != fingerprint
+
+
+def test_spikes_sort_order():
+    from types import SimpleNamespace
+    from neurodamus.core.configuration import CliOptions, ConfigurationError, SimConfig
+    _spikes_sort_order = next(f for f in SimConfig._validators
+                              if f.__name__ == "_spikes_sort_order")
+    config = SimpleNamespace(cli_options=CliOptions(parallel_spikes=True), use_neuron=True)
+    _spikes_sort_order(config, {"SpikesSortOrder": "by_id"})
+    config.use_neuron = False  # CoreNEURON writes the spikes itself
+    with pytest.raises(ConfigurationError):
+        _spikes_sort_order(config, {"SpikesSortOrder": "by_id"})
+    _spikes_sort_order(config, {"SpikesSortOrder": "by_time"})
@@ -1,3 +1,4 @@
+import os
 import pytest
 import numpy as np
 import numpy.testing as npt
@@ -66,3 +67,122 @@ class DummyNodeReader:
             return ["mtype1", "mtype2", "mtype1", "mtype2", "mtype1"]
         else:
             pytest.fail(f"Unsupported attribute: {attr}")
+
+
+def test_synapse_memory_by_helper(tmp_path, monkeypatch):
+    from collections import Counter
+    from neurodamus.connection import Connection
+    from neurodamus.utils.memory import DryRunStats, SynapseMemoryUsage
+
+    def measure_synapse_memory(helper_name, with_minis, n_synapses):
+        if helper_name == "GluSynapseHelper":
+            raise AttributeError("GluSynapseHelper not found")
+        return 3.0 if with_minis else 2.0
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Connection, "measure_synapse_memory", measure_synapse_memory)
+    stats = DryRunStats()
+    stats.add_synapse_counts(Counter({2: 10, 110: 20}))
+    stats.add_synapse_counts(Counter({115: 5}), mod_override="GluSynapse")
+    assert stats.synapse_counts == {2: 10, 110: 20, 115: 5}
+    assert stats.synapse_helper_counts == {"GABAABHelper": 10, "AMPANMDAHelper": 20,
+                                           "GluSynapseHelper": 5}
+
+    stats.measure_synapse_memory(sorted(stats.synapse_helper_counts), with_minis=True)
+    assert stats.synapse_memory == {
+        "AMPANMDAHelper+minis": 3.0,
+        "GABAABHelper+minis": 3.0,
+    }
+    assert stats.synapse_memory_estimates == {
+        "GluSynapseHelper+minis": SynapseMemoryUsage.get_helper_memory_usage("GluSynapseHelper")
+    }
+    stats.export_synapse_memory_usage()
+
+    # measures are reused and only new kinds are measured
+    stats2 = DryRunStats()
+    stats2.try_import_synapse_memory_usage()
+    assert "GluSynapseHelper+minis" not in stats2.synapse_memory  # estimates not exported
+    stats2.measure_synapse_memory(["AMPANMDAHelper", "GABAABHelper"], with_minis=False)
+    assert stats2.synapse_memory["AMPANMDAHelper+minis"] == 3.0
+    assert stats2.synapse_memory["AMPANMDAHelper"] == 2.0
+
+    # a failed measurement is retried by later runs
+    monkeypatch.setattr(Connection, "measure_synapse_memory", lambda *_: 4.0)
+    stats2.measure_synapse_memory(["GluSynapseHelper"], with_minis=True)
+    assert stats2.synapse_memory["GluSynapseHelper+minis"] == 4.0
+
+
+def test_simulate_distribution():
+    from neurodamus.utils.memory import DryRunStats
+
+    cells_memory = [np.arange(1., 9.)]  # 8 cells, 1..8 MB
+    loads = DryRunStats.simulate_distribution(cells_memory, n_ranks=2, n_cycles=2)
+    # cycle = idx % 2, rank = (idx // 2) % 2
+    npt.assert_allclose(loads, [[1 + 5, 3 + 7], [2 + 6, 4 + 8]])
+
+    # Whole-cell: largest complexity first to the least loaded rank
+    loads = DryRunStats.simulate_distribution([np.ones(4)], 2, 1, [np.array([4., 3., 2., 1.])])
+    npt.assert_allclose(loads, [[2, 2]])
+
+
+def test_plan_configurations():
+    from collections import Counter
+    from neurodamus.utils.memory import DryRunStats
+
+    stats = DryRunStats()
+    stats.base_memory = 100
+    stats.metype_memory = {"A": 1024 * 10, "B": 1024 * 30}  # KB
+    stats.metype_counts = Counter({"A": 60, "B": 40})
+    stats.metype_synapse_counts = Counter({"A": 0, "B": 40 * 1024})
+    stats.synapse_memory_avg = 10  # KB -> 10 MB per B cell
+    stats.pop_metype_gids = {"pop": {"A": list(range(1, 61)), "B": list(range(61, 101))}}
+    _, memory = stats.cells_memory_by_population()["pop"]
+    npt.assert_allclose(memory, [10] * 60 + [40] * 40)
+
+    confs = stats.plan_configurations(1000, margin=0, ranks_per_node_options=[4],
+                                      steps_options=(1, 2))
+    assert [(c["modelbuilding_steps"], c["ranks_per_node"]) for c in confs] == [(2, 4), (1, 4)]
+    for conf in confs:
+        assert conf["max_node_memory_mb"] <= 1000
+        assert conf["ranks"] == conf["nodes"] * 4
+    assert confs[0]["nodes"] < confs[1]["nodes"]
+    # The minimum nodes: one less doesn't fit
+    for conf in confs:
+        n_nodes, n_steps = conf["nodes"] - 1, conf["modelbuilding_steps"]
+        loads = stats.simulate_distribution([memory], n_nodes * 4, n_steps)
+        assert loads.reshape(n_steps, n_nodes, 4).sum(axis=2).max() + 4 * 100 > 1000
+
+
+def test_dry_run_cache(tmp_path, monkeypatch):
+    from neurodamus.utils.memory import DryRunStats
+
+    monkeypatch.chdir(tmp_path)
+    cache_dir = str(tmp_path / "cache")
+    stats = DryRunStats(cache_dir)
+    stats.import_cell_cache("pop", "nodes.h5", "emodels")
+    assert stats.metype_memory == {}
+    stats.metype_memory = {"A": 100.0, "B": 200.0, "other_pop": 1.0}
+    stats.pop_metype_gids = {"pop": {"A": [1, 2], "B": [3]}}
+    stats.export_cell_memory_usage()
+    stats.synapse_gid_counts("edges.h5", "pop__pop")[1] = {2: 10, 110: 5}
+    stats.export_synapse_cache()
+
+    stats2 = DryRunStats(cache_dir)
+    stats2.import_cell_cache("pop", "nodes.h5", "emodels")
+    assert stats2.metype_memory == {"A": 100.0, "B": 200.0}
+    assert stats2.synapse_gid_counts("edges.h5", "pop__pop") == {1: {2: 10, 110: 5}}
+    assert stats2.synapse_gid_counts("edges.h5", "other") == {}
+    # Only the counts found in this run are exported, merged with the cached ones
+    gid_counts = stats2.synapse_gid_counts("edges.h5", "pop__pop")
+    assert gid_counts.new == {}
+    gid_counts.update({2: {2: 1}})
+    assert gid_counts.new == {2: {2: 1}}
+    stats2.export_synapse_cache()
+    assert DryRunStats(cache_dir).synapse_gid_counts("edges.h5", "pop__pop") == \
+        {1: {2: 10, 110: 5}, 2: {2: 1}}
+    assert not [f for f in os.listdir(cache_dir) if f.endswith(".tmp")]
+
+    # Different sources are different cache entries
+    stats3 = DryRunStats(cache_dir)
+    stats3.import_cell_cache("pop", "nodes.h5", "other_emodels")
+    assert stats3.metype_memory == {}
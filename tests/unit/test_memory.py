@@ -0,0 +1,51 @@
+import json
+import tracemalloc
+from neurodamus.utils import logging as nd_logging
+from neurodamus.utils.logging import log_stage
+from neurodamus.utils.memory import _MemoryProfiler
+
+
+def test_memory_profiler_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(nd_logging, "_stage_hooks", [])
+    profiler = _MemoryProfiler()
+    profiler.record("Not enabled")
+    assert not profiler._stages
+
+    profiler.enable()
+    assert tracemalloc.is_tracing()
+    log_stage("======== BUILDING %s ========", "CIRCUIT")
+    data = []
+    for i in range(3):
+        data.append(bytearray(1 << 20))
+        profiler.record("Finalize synapses")
+    log_stage("SIMULATION")
+    assert list(profiler._stages) == ["BUILDING CIRCUIT", "Finalize synapses", "SIMULATION"]
+
+    report_file = tmp_path / "memory_profile.json"
+    profiler.export_report(str(report_file))
+    tracemalloc.stop()
+    report = json.loads(report_file.read_text())
+    stages = report["stages"]
+    assert list(stages) == ["BUILDING CIRCUIT", "Finalize synapses", "SIMULATION"]
+    finalize = stages["Finalize synapses"]
+    assert finalize["ranks"] == 1
+    assert finalize["rss_mb"]["max_rank"] == 0
+    assert finalize["peak_rss_mb"]["max"] >= finalize["rss_mb"]["max"]
+    assert finalize["node_rss_mb"]["max"] == finalize["rss_mb"]["max"]  # one rank per node
+    assert finalize["python_heap_mb"]["max"] >= 3  # the bytearrays
+    assert report["summary"]["rank_peak"]["rank"] == 0
+    assert report["summary"]["node_peak"]["stage"] in stages
+
+
+def test_shm_node_info(monkeypatch):
+    import socket
+    from types import SimpleNamespace
+    from neurodamus.core._shmutils import SHMUtil
+
+    hosts = ["n2", "n2", "n1", "n3", "n1"]
+    monkeypatch.setattr(socket, "gethostname", lambda: "n1")
+    monkeypatch.setattr(SHMUtil, "node_id", -1)
+    monkeypatch.setattr(SHMUtil, "nnodes", -1)
+    fake_mpi = SimpleNamespace(size=len(hosts), rank=2, py_allgather=lambda _: hosts)
+    SHMUtil._set_node_info(fake_mpi)
+    assert (SHMUtil.node_id, SHMUtil.nnodes) == (1, 3)
@@ -1,4 +1,5 @@
 import os
+import time
 import pytest
 from neurodamus.core.nodeset import NodeSet, _ranges_overlap, _ranges_vec_overlap
 import numpy
@@ -52,6 +53,9 @@ def test_NodeSet_add():
     ([], [], []),
     ([], [(5, 25)], []),
     ([(0, 10), (20, 30)], [], []),
+    ([(0, 10), (10, 20)], [(5, 15)], numpy.arange(5, 15)),
+    ([(0, 10), (20, 30)], [(0, 10), (20, 30)], numpy.r_[0:10, 20:30]),
+    ([(0, 0), (3, 5)], [(0, 4)], [3]),
 ])
 def test_ranges_overlap(ranges1, ranges2, expected):
     out = _ranges_overlap(ranges1, ranges2, flattened_out=True)
@@ -64,12 +68,40 @@ def test_ranges_overlap(ranges1, ranges2, expected):
     ([], [], []),
     ([], [1, 2, 3], []),
     ([(0, 10), (20, 30)], [], []),
+    ([(0, 10), (10, 20)], [9, 10, 20], [9, 10]),
+    ([(0, 10), (20, 30)], [21, 1, 29, 2], [1, 2, 21, 29]),
 ])
 def test_ranges_vec_overlap(ranges1, vec, expected):
     out = _ranges_vec_overlap(ranges1, vec)
     numpy.testing.assert_array_equal(out, expected)
 
 
+def test_ranges_overlap_quick_check():
+    assert _ranges_overlap([(0, 10)], [(9, 12)], quick_check=True)
+    assert not _ranges_overlap([(0, 10)], [(10, 12)], quick_check=True)
+    assert _ranges_vec_overlap([(0, 10), (20, 30)], [25], quick_check=True)
+    assert not _ranges_vec_overlap([(0, 10), (20, 30)], [10, 30], quick_check=True)
+
+
+def test_ranges_overlap_fragmented_benchmark():
+    """A highly fragmented nodeset (every other gid) intersected with many local gids.
+    A per-range scan over the vector would take minutes here.
+    """
+    n_ranges = 200_000
+    ranges = [(i, i + 1) for i in range(0, 2 * n_ranges, 2)]
+    local_gids = numpy.arange(0, 2 * n_ranges, 3, dtype="uint32")
+    other_ranges = [(i, i + 2) for i in range(0, 2 * n_ranges, 4)]
+
+    start = time.perf_counter()
+    vec_out = _ranges_vec_overlap(ranges, local_gids)
+    ranges_out = _ranges_overlap(ranges, other_ranges, flattened_out=True)
+    elapsed = time.perf_counter() - start
+
+    numpy.testing.assert_array_equal(vec_out, local_gids[local_gids % 2 == 0])
+    numpy.testing.assert_array_equal(ranges_out, numpy.arange(0, 2 * n_ranges, 4))
+    assert elapsed < 5, "Fragmented ranges intersection took %.2fs" % elapsed
+
+
 @pytest.fixture
 def nodeset_files(tmpdir):
     """
@@ -123,3 +155,34 @@ def test_read_nodesets_from_file(nodeset_files):
         "Mosaic": {"population": ["All"]}
     }
     assert json.loads(ns_reader.nodesets.toJSON()) == json.loads(json.dumps(expected_output))
+
+
+@pytest.mark.forked
+def test_read_nodesets_cached(USECASE3, tmpdir):
+    from neurodamus.core.nodeset import PopulationNodes
+    from neurodamus.target_manager import NodeSetReader
+    PopulationNodes.reset()
+    nodesets_file = str(USECASE3 / "nodesets.json")
+    cache_dir = str(tmpdir.join("nodesets_cache"))
+
+    ns_reader = NodeSetReader(None, nodesets_file, cache_dir=cache_dir)
+    ns_reader.register_node_file(str(USECASE3 / "nodes_A.h5"))
+    target = ns_reader.read_nodeset("nodesPopA")
+    expected_gids = target.get_raw_gids()
+    assert len(expected_gids) > 0
+    assert len(os.listdir(cache_dir)) == 1
+
+    # A new reader (later run) must load the selection from disk, never materializing
+    ns_reader2 = NodeSetReader(None, nodesets_file, cache_dir=cache_dir)
+    ns_reader2.register_node_file(str(USECASE3 / "nodes_A.h5"))
+    ns_reader2._materialize = None
+    numpy.testing.assert_array_equal(ns_reader2.read_nodeset("nodesPopA").get_raw_gids(),
+                                     expected_gids)
+
+    # Changing the node sets file invalidates the cache
+    other_nodesets = tmpdir.join("nodesets.json")
+    other_nodesets.write('{"nodesPopA": {"population": "NodeA", "node_id": [0]}}')
+    ns_reader3 = NodeSetReader(None, str(other_nodesets), cache_dir=cache_dir)
+    ns_reader3.register_node_file(str(USECASE3 / "nodes_A.h5"))
+    numpy.testing.assert_array_equal(ns_reader3.read_nodeset("nodesPopA").get_raw_gids(), [1])
+    assert len(os.listdir(cache_dir)) == 2
@@ -103,19 +103,39 @@ def test_merge_grouped():
     vals = ['x', 'y', 'z']
     d += GroupedMultiMap(keys, vals)
     assert d[3] == [1, 3, 'z']
-    logging.info("%s: %s", d._keys, d._values)
+    logging.info("%s: %s", d.keys(), d.values())
 
 
 def test_flatten_grouped():
     keys = numpy.array([4, 3, 4, 3], "i")
     vals = [0, 1, 2, 3]
     d = GroupedMultiMap(keys, vals)
-    assert list(d._keys) == [3, 4]
-    assert list(d._values) == [[1, 3], [0, 2]]
+    assert list(d.keys()) == [3, 4]
+    assert list(d.values()) == [[1, 3], [0, 2]]
     d2 = d.flatten()
     assert list(d2._keys) == [3, 3, 4, 4]
     assert list(d2._values) == [1, 3, 0, 2]
-    logging.info("%s: %s", d._keys, d._values)
+    logging.info("%s: %s", d.keys(), d.values())
+
+
+def test_merge_grouped_csr():
+    keys = numpy.array([3, 4, 3], "i")
+    vals = numpy.array([1., 2., 3.])
+    d1 = GroupedMultiMap(keys, vals)
+    assert d1.offsets().tolist() == [0, 2, 3]
+    assert numpy.shares_memory(d1[3], d1.flat_values())  # zero-copy
+    d2 = GroupedMultiMap(numpy.array([2, 4, 3], "i"), numpy.array([10., 20., 30.]))
+    d3 = GroupedMultiMap(numpy.array([5, 2], "i"), numpy.array([100., 200.]))
+    merged = GroupedMultiMap.merge([d1, d2, d3])
+    expected = GroupedMultiMap(numpy.concatenate([d1.flatten().keys(), [2, 4, 3, 5, 2]]),
+                               numpy.concatenate([[1., 3., 2.], [10., 20., 30., 100., 200.]]))
+    assert merged.keys().tolist() == expected.keys().tolist() == [2, 3, 4, 5]
+    assert merged.offsets().tolist() == expected.offsets().tolist()
+    assert merged.flat_values().tolist() == expected.flat_values().tolist()
+    assert merged[2].tolist() == [10., 200.]
+    assert merged.size() == 8
+    d1 += d2
+    assert d1[3].tolist() == [1., 3., 30.]
 
 
 if __name__ == "__main__":
@@ -128,3 +148,37 @@ if __name__ == "__main__":
     test_merge()
     test_merge_grouped()
     test_flatten_grouped()
+    test_merge_grouped_csr()
+
+
+def test_mpi_broadcast_call_errors():
+    from unittest import mock
+    from neurodamus.core import MPI, OtherRankError
+    from neurodamus.core._mpi import _MPI
+
+    assert MPI.py_broadcast_call(lambda: 42) == 42
+    with pytest.raises(ValueError):
+        MPI.py_broadcast_call(mock.Mock(side_effect=ValueError("bad nodeset")))
+
+    # A non-root rank gets the root error through the broadcast, instead of a result
+    pc = mock.Mock(py_broadcast=mock.Mock(return_value=(None, "ValueError: bad nodeset")))
+    with mock.patch.object(_MPI, "_size", 2), mock.patch.object(_MPI, "_rank", 1), \
+            mock.patch.object(_MPI, "_pc", pc):
+        with pytest.raises(OtherRankError, match="bad nodeset"):
+            MPI.py_broadcast_call(mock.Mock(side_effect=AssertionError("Not root")))
+
+
+def test_mpi_scatter_call_errors():
+    from unittest import mock
+    from neurodamus.core import MPI
+    from neurodamus.core._mpi import _MPI
+
+    assert MPI.py_scatter_call(lambda: [(1, 2)]) == (1, 2)
+
+    # Root sends the error to every rank, in place of its part
+    pc = mock.Mock(py_scatter=mock.Mock(side_effect=lambda objs, _root: objs[1]))
+    with mock.patch.object(_MPI, "_size", 2), mock.patch.object(_MPI, "_pc", pc):
+        with pytest.raises(IOError):
+            MPI.py_scatter_call(mock.Mock(side_effect=IOError("bad spikes")))
+        assert pc.py_scatter.call_args[0][0] == [(None, "OSError: bad spikes")] * 2
+        assert MPI.py_scatter_call(lambda: ["a", "b"]) == "b"
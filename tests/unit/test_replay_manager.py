@@ -1,3 +1,4 @@
+import numpy
 import pytest
 import numpy.testing as npt
 from pathlib import Path
@@ -17,3 +18,62 @@ def test_replay_manager_sonata():
     # We do an internal assertion when the population doesnt exist. Verify it works as expected
     with pytest.raises(MissingSpikesPopulationError, match="Spikes population not found"):
         SpikeManager._read_spikes_sonata(spikes_sonata, "wont-exist")
+
+
+@pytest.mark.forked
+def test_replay_manager_gid_filter(tmp_path):
+    from neurodamus.replay import SpikeManager
+    spikes_sonata = str(SAMPLE_DATA_DIR / "out.h5")
+
+    timestamps, spike_gids = SpikeManager._read_spikes_sonata(spikes_sonata, "NodeA", [1, 3])
+    npt.assert_allclose(timestamps[:4], [0.1, 0.15, 2.275, 3.45])
+    npt.assert_equal(spike_gids[:4], [1, 3, 1, 3])
+    assert set(spike_gids) == {1, 3}
+
+    spikes_ascii = tmp_path / "out.dat"
+    spikes_ascii.write_text("/scatter\n0.1\t1\n0.2\t2\n0.3\t3\n0.4\t1\n")
+    spike_manager = SpikeManager(str(spikes_ascii), gid_filter=[1, 5])
+    assert len(spike_manager) == 1
+    npt.assert_allclose(spike_manager[1], [0.1, 0.4])
+    assert 2 not in spike_manager
+
+
+@pytest.mark.forked
+def test_replay_manager_dump(tmp_path):
+    from neurodamus.replay import SpikeManager
+    spikes_ascii = tmp_path / "in.dat"
+    spikes_ascii.write_text("/scatter\n0.1\t1\n0.2\t2\n0.3\t3\n0.4\t1\n0.5\t4\n")
+    spike_manager = SpikeManager(str(spikes_ascii))
+    spike_manager.DUMP_CHUNK_SIZE = 2
+
+    spike_manager.dump_ascii(str(tmp_path / "out.dat"), 10)
+    assert (tmp_path / "out.dat").read_text() == \
+        "/scatter\n0.100\t11\n0.400\t11\n0.200\t12\n0.300\t13\n0.500\t14\n"
+
+
+@pytest.mark.forked
+def test_replay_manager_chunked_read(tmp_path):
+    from neurodamus.replay import SpikeManager
+    SpikeManager.READ_CHUNK_SIZE = 1  # one line per chunk (readlines hint is in chars)
+    spikes_ascii = tmp_path / "in.dat"
+    spikes_ascii.write_text("/scatter\n0.1\t3\n0.2\t2\n0.3\t3\n0.4\t1\n1.5\t4\n")
+
+    timestamps, spike_gids = SpikeManager._read_spikes_ascii(str(spikes_ascii))
+    npt.assert_allclose(timestamps, [0.1, 0.2, 0.3, 0.4, 1.5])
+    npt.assert_equal(spike_gids, [3, 2, 3, 1, 4])
+
+    # Time window applies after the delay
+    spike_manager = SpikeManager(str(spikes_ascii), delay=1, time_window=(1.2, 2))
+    npt.assert_equal(spike_manager.get_map().keys(), [1, 2, 3])
+    npt.assert_allclose(spike_manager[3], [1.3])
+
+    # Legacy binary files: all times then all gids, as doubles
+    spikes_bin = tmp_path / "in.bin"
+    numpy.concatenate((timestamps, spike_gids)).astype("d").tofile(str(spikes_bin))
+    spike_manager = SpikeManager(str(spikes_bin), gid_filter=[3, 4])
+    npt.assert_equal(spike_manager.get_map().keys(), [3, 4])
+    npt.assert_allclose(spike_manager[3], [0.1, 0.3])
+
+    spikes_ascii.write_text("/scatter\n0.1\t3\n0.2\tx\n")
+    with pytest.raises(ValueError, match="Invalid entries"):
+        SpikeManager._read_spikes_ascii(str(spikes_ascii))
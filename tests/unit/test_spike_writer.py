@@ -0,0 +1,40 @@
+import numpy
+import numpy.testing as npt
+import pytest
+
+
+@pytest.mark.forked
+@pytest.mark.parametrize("sort_order", ["none", "by_id", "by_time"])
+def test_write_sonata_spikes(tmp_path, sort_order):
+    import libsonata
+    from neurodamus.io.spike_writer import write_sonata_spikes
+    spikes_file = str(tmp_path / "out.h5")
+    timestamps = numpy.array([0.5, 0.1, 0.3, 0.2])
+    node_ids = numpy.array([2, 0, 1, 0])
+    write_sonata_spikes(spikes_file, [("NodeA", timestamps, node_ids),
+                                      ("NodeB", numpy.empty(0), numpy.empty(0))], sort_order)
+
+    spikes = libsonata.SpikeReader(spikes_file)
+    assert sorted(spikes.get_population_names()) == ["NodeA", "NodeB"]
+    assert spikes["NodeA"].sorting == sort_order
+    data = spikes["NodeA"].get_dict()
+    if sort_order == "none":
+        npt.assert_allclose(data["timestamps"], timestamps)
+        npt.assert_equal(data["node_ids"], node_ids)
+    elif sort_order == "by_id":
+        npt.assert_allclose(data["timestamps"], [0.1, 0.2, 0.3, 0.5])
+        npt.assert_equal(data["node_ids"], [0, 0, 1, 2])
+    else:
+        npt.assert_allclose(data["timestamps"], [0.1, 0.2, 0.3, 0.5])
+        npt.assert_equal(data["node_ids"], [0, 0, 1, 2])
+    assert len(spikes["NodeB"].get()) == 0
+
+
+@pytest.mark.forked
+def test_prepend_header(tmp_path):
+    from neurodamus.io.spike_writer import prepend_header
+    out_file = tmp_path / "out.dat"
+    content = "".join("%.3f\t%d\n" % (i / 10, i) for i in range(100))
+    out_file.write_text(content)
+    prepend_header(str(out_file), "/scatter\n", block_size=64)
+    assert out_file.read_text() == "/scatter\n" + content
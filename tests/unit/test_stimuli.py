@@ -53,3 +53,111 @@ class TestStimuli:
         assert list(self.stim.time_vec) == [0, 0, 20, 20, 100, 100, 120, 120, 200, 200, 220, 220,
                                             300, 300, 320, 320, 350]
         assert list(self.stim.stim_vec) == [0, 1.2, 1.2, 0] * 4 + [0]
+
+
+@pytest.mark.parametrize("coef", [0.3, 0.9, 0.99999])
+def test_ar1_recurrence_bit_identical(coef):
+    # Vectorized recurrences must reproduce exactly the original per-element loops
+    import numpy
+    from neurodamus.core.stimuli import _ar1_recurrence, _shift_right
+    rng = numpy.random.default_rng(1)
+    E = rng.normal(size=1000) * rng.choice([0, 1, -3], 1000)
+    a, b = 0.94, coef
+    P, B = [0.0] * len(E), [0.0] * len(E)
+    for n in range(1, len(E)):
+        P[n] = a * P[n - 1] + b * B[n - 1]
+        B[n] = b * B[n - 1] + E[n - 1]
+    B_vec = _ar1_recurrence(_shift_right(E), b)
+    assert numpy.array_equal(B_vec, B)
+    assert numpy.array_equal(_ar1_recurrence(b * _shift_right(B_vec), a), P)
+    assert len(_shift_right(numpy.empty(0))) == 0
+
+
+def test_shared_signal_sources():
+    from unittest import mock
+    from neurodamus.stimulus_manager import Hyperpolarizing, Pulse
+
+    class _PointList:
+        def __init__(self, gid):
+            self.gid = gid
+            self.sclst = [mock.Mock(exists=lambda: True)] * 2
+            self.x = [0.5, 0.5]
+
+    target = mock.Mock(getPointList=lambda _: [_PointList(gid) for gid in range(1, 5)])
+    cell_manager = mock.Mock(get_dynamics_params=lambda *_: None)
+    cell_manager.get_cell = lambda gid: mock.Mock(getHypAmp=lambda: -0.1 * (gid % 2))
+    stim_info = {"Duration": 100, "Delay": 10, "AmpStart": 1.5, "Frequency": 10, "Width": 2}
+
+    with mock.patch.object(CurrentSource, "attach_to") as attach_to:
+        pulse = Pulse(target, stim_info, cell_manager)
+        assert len(pulse.stimList) == 1  # a single signal for the whole target
+        assert attach_to.call_count == 8
+        hyperpolarizing = Hyperpolarizing(target, stim_info, cell_manager)
+        assert len(hyperpolarizing.stimList) == 2  # two distinct amplitudes
+        assert sorted(cs.stim_vec[2] for cs in hyperpolarizing.stimList) == [-0.1, 0]
+
+
+def test_relative_target_parameters():
+    from unittest import mock
+    from neurodamus.stimulus_manager import RelativeLinear, SubThreshold
+
+    class _PointList:
+        def __init__(self, gid):
+            self.gid = gid
+            self.sclst = [mock.Mock(exists=lambda: True)]
+            self.x = [0.5]
+
+    target = mock.Mock(getPointList=lambda _: [_PointList(gid) for gid in range(1, 4)])
+    cells = {gid: mock.Mock(getThreshold=mock.Mock(return_value=0.1 * gid)) for gid in range(1, 4)}
+    # cell manager without dynamics params, falling back to the cell objects
+    cell_manager = mock.Mock(get_cell=cells.__getitem__, get_dynamics_params=lambda *_: None)
+    stim_info = {"Duration": 100, "Delay": 0, "PercentStart": 80, "PercentEnd": 120,
+                 "PercentLess": 20}
+
+    with mock.patch.object(CurrentSource, "attach_to"):
+        linear = RelativeLinear(target, stim_info, cell_manager)
+        subthreshold = SubThreshold(target, stim_info, cell_manager)
+
+    for cell in cells.values():
+        assert cell.getThreshold.call_count == 2  # once per stimulus
+    # amplitudes match the per-cell (HOC) formulas exactly
+    ramps = sorted((cs.stim_vec[1], cs.stim_vec[2]) for cs in linear.stimList)
+    assert ramps == [(0.1 * gid * (80 / 100), 0.1 * gid * (120 / 100)) for gid in range(1, 4)]
+    steps = sorted(cs.stim_vec[1] for cs in subthreshold.stimList)
+    assert steps == [0.1 * gid * (100 - 20) / 100 for gid in range(1, 4)]
+
+    # with the nodes dynamics params the cell objects aren't queried
+    from neurodamus.cell_distributor import CellManagerBase
+    from neurodamus.core.nodeset import NodeSet
+    from neurodamus.metype import METypeItem
+    manager = CellManagerBase.__new__(CellManagerBase)
+    manager._dynamics_params = None
+    manager._local_nodes = NodeSet([3, 1, 2], {gid: METypeItem("morph", threshold_current=0.1 * gid)
+                                               for gid in range(1, 4)})
+    manager._store_dynamics_params()
+    manager.get_cell = mock.Mock(side_effect=AssertionError("Cell queried"))
+    assert manager.get_dynamics_params("threshold_current", [2, 3]).tolist() == [0.2, 0.1 * 3]
+    assert manager.get_dynamics_params("input_resistance", [2, 3]) is None
+    assert manager.get_dynamics_params("threshold_current", [4]) is None
+
+    with mock.patch.object(CurrentSource, "attach_to"):
+        linear = RelativeLinear(target, stim_info, manager)
+    assert sorted((cs.stim_vec[1], cs.stim_vec[2]) for cs in linear.stimList) == ramps
+
+
+def test_noise_skip_ahead():
+    from unittest import mock
+    from neurodamus.core.random import skip_ahead
+    from neurodamus.stimulus_manager import Noise
+
+    noise = Noise.__new__(Noise)
+    noise.duration, noise.delay, noise.dt = 100, 250, 0.5
+    # blocks of the stimulus duration until the delay: [0, 99.975], [100, 199.975], [200, 249.975]
+    assert list(noise.already_used_numbers(0.025)) == [200, 200, 100]
+    noise.delay = 0
+    assert list(noise.already_used_numbers(0.025)) == []
+
+    rng = mock.Mock()
+    rng.seq.return_value = 7
+    skip_ahead(rng, 500)
+    rng.seq.assert_called_with(507)
@@ -118,3 +118,56 @@ def test_nodeset_gids():
     )
     gids = t4.gids()
     npt.assert_array_equal(gids, [])
+
+
+@pytest.mark.forked
+def test_target_bitmap_queries(monkeypatch):
+    from neurodamus.core.nodeset import _NodeSetBase
+    from neurodamus.target_manager import NodesetTarget, _TargetInterface
+    monkeypatch.setattr(_NodeSetBase, "BITMAP_MIN_SIZE", 2)
+    monkeypatch.setattr(_TargetInterface, "BITMAP_MIN_SIZE", 2)
+    nodes_popA = NodeSet([1, 2, 5]).register_global("pop_A")
+    nodes2_popA = NodeSet([5, 6]).register_global("pop_A")
+    nodes3_popA = NodeSet([11, 12]).register_global("pop_A")
+    nodes_popB = NodeSet([1, 2]).register_global("pop_B")
+
+    t1 = NodesetTarget("t1", [nodes_popA, nodes_popB])
+    assert t1.intersects(NodesetTarget("t2", [nodes2_popA]))
+    assert not t1.intersects(NodesetTarget("t3", [nodes3_popA]))
+    npt.assert_array_equal(t1.contains([1, 3, 5, 1001, 1003]), [True, False, True, True, False])
+    assert 1002 in t1
+    assert 1003 not in t1
+
+    # Bitmaps follow changes to the gids
+    nodes_popA.add_gids([3])
+    assert t1.contains(3)
+    npt.assert_array_equal(NodesetTarget("t4", [nodes_popA]).contains([3, 4], raw_gids=True),
+                           [True, False])
+
+
+def test_target_manager_overlap_memoized():
+    from neurodamus.target_manager import TargetManager
+    tm = object.__new__(TargetManager)  # avoid creating the hoc target parser
+    tm._targets = {}
+    tm._intersecting_cache = {}
+    tm._pathways_cache = {}
+    tm.local_nodes = []
+    computed = []
+
+    def fake_intersecting(t1, t2):
+        computed.append((t1, t2))
+        return t1 == t2
+    tm._intersecting = fake_intersecting
+
+    conn1 = {"Source": "pA:A1", "Destination": "pA:A2"}
+    conn2 = {"Source": "pA:A3", "Destination": "pB:B1"}
+    for _ in range(3):
+        assert tm.pathways_overlap(conn1, conn1)
+        assert not tm.pathways_overlap(conn2, conn1)
+        assert not tm.pathways_overlap(conn1, conn2)
+    assert not tm.intersecting("pA:A1", "pA:A3")  # symmetric, from cache
+    assert sorted(computed) == [("pA:A1", "pA:A1"), ("pA:A2", "pA:A2"), ("pA:A3", "pA:A1")]
+
+    tm._clear_overlap_cache()  # e.g. registering local nodes
+    assert tm.pathways_overlap(conn1, conn1)
+    assert len(computed) == 5
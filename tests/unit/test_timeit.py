@@ -0,0 +1,32 @@
+import json
+from neurodamus.utils.timeit import TimerManager, delim, timeit
+
+
+def test_nested_timers_trace(tmp_path, monkeypatch):
+    monkeypatch.setattr(TimerManager, "_timers", {})
+    monkeypatch.setattr(TimerManager, "_trace_events", None)
+    TimerManager.enable_trace()
+
+    with timeit(name="build", verbose=False):
+        for _ in range(3):
+            with timeit(name="cells", verbose=False):
+                pass
+
+    stats = TimerManager.reduce_stats(TimerManager._timers)
+    assert list(stats) == ["build", "build" + delim + "cells"]  # parents first
+    avg_time, min_time, max_time, hits, n_ranks = stats["build" + delim + "cells"]
+    assert hits == 3 and n_ranks == 1
+    assert avg_time == min_time == max_time
+
+    trace_file = tmp_path / "trace.json"
+    TimerManager.export_trace(str(trace_file))
+    events = json.loads(trace_file.read_text())["traceEvents"]
+    assert events[0]["ph"] == "M"
+    spans = events[1:]
+    assert [span["name"] for span in spans] == ["cells"] * 3 + ["build"]
+    assert spans[0]["args"]["path"] == "build / cells"
+    parent = spans[-1]
+    assert parent["ts"] == 0
+    for child in spans[:-1]:  # children are contained in the parent span
+        assert child["ts"] >= parent["ts"]
+        assert child["ts"] + child["dur"] <= parent["ts"] + parent["dur"] + 1e-3